@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# mayapyでシーンファイルのメッシュの頂点カラーのチャンネルを書き出すバッチ処理
+# ファイルをいくつかずつにまとめて、複数のmayapyのプロセスで並列に処理し、ファイルごとの処理時間と失敗をJSONで出力する
+#
+# scriptsフォルダで以下のように実行する (Alphaを"alphaMask"に、Rを"mask"のGに書き出して別フォルダに保存)
+#   mayapy -m kkDisplayVertexColorSeparately.batch "assets/*.ma" --extract A:alphaMask --pack R:mask.G --output-dir out --workers 4
+#
+# --workerを付けた場合は親プロセスから起動されたワーカーとして、渡されたファイルを順番に処理して1ファイル1行のJSONを出力する
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import traceback
+from multiprocessing.pool import ThreadPool
+
+from . import colorBuffer
+from .profiler import perfCounter
+
+
+# ワーカーが出力する結果の行の先頭 (Mayaのログと区別するため)
+RESULT_PREFIX = "kkDisplayVertexColorSeparately.batch:"
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# "A:alphaMask" → ("extract", "A", "alphaMask", None)
+# "R:mask.G"    → ("pack", "R", "mask", "G")
+def parseOperation(kind, spec):
+	channel, _, target = spec.partition(":")
+	if not channel in colorBuffer.CHANNELS or target == "":
+		raise ValueError("invalid --%s value : %s"%(kind, spec))
+
+	if kind == "extract":
+		return ("extract", channel, target, None)
+
+	colorSet, _, targetChannel = target.rpartition(".")
+	if colorSet == "" or not targetChannel in colorBuffer.CHANNELS:
+		raise ValueError("invalid --pack value (expected CH:colorSet.CH) : %s"%spec)
+	return ("pack", channel, colorSet, targetChannel)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 引数のファイルとglobを展開し、重複を除いたシーンファイルのリストにする
+# "@list.txt" の場合はテキストファイルに1行ずつ書かれたパスを読み込む
+def expandSceneFiles(patterns):
+	sceneFiles = []
+	for pattern in patterns:
+		if pattern.startswith("@"):
+			with open(pattern[1:]) as f:
+				paths = [line.strip() for line in f if line.strip() != ""]
+		elif glob.has_magic(pattern):
+			paths = sorted(glob.glob(pattern))
+		else:
+			paths = [pattern]
+
+		for path in paths:
+			path = os.path.abspath(path)
+			if not path in sceneFiles:
+				sceneFiles.append(path)
+	return sceneFiles
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 保存先のパス (outputDirがNoneの場合は上書き)
+def outputPath(sceneFile, outputDir):
+	if outputDir is None:
+		return sceneFile
+	return os.path.join(os.path.abspath(outputDir), os.path.basename(sceneFile))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (ワーカー) 開いているシーンのメッシュにoperationsを実行し、処理したメッシュ数を返す
+# チャンネルの読み書きはウィンドウと同じChannelEngineとMayaMeshBackendで行う
+def processOpenScene(operations):
+	import maya.cmds as mc
+	import maya.api.OpenMaya as om2
+
+	from .engine import ChannelEngine
+	from .mayaBackend import MayaMeshBackend
+
+	meshCount = 0
+	for meshPath in mc.ls(type="mesh", noIntermediate=True, long=True) or []:
+		curColorSetList = mc.polyColorSet(meshPath, q=True, currentColorSet=True)
+		if curColorSetList == None:
+			continue
+
+		baseColorSet    = curColorSetList[0]
+		baseColorSerRep = mc.polyColorSet(meshPath, q=True, currentColorSet=True, representation=True)
+
+		selList = om2.MSelectionList()
+		selList.add(meshPath)
+		mfnMesh = om2.MFnMesh(selList.getDagPath(0))
+
+		historyList = mc.bakePartialHistory(meshPath, q=True, prePostDeformers=True) or []
+		engine = ChannelEngine(MayaMeshBackend(mfnMesh, len(historyList) > 0), baseColorSet, baseColorSerRep)
+
+		for kind, channel, colorSet, targetChannel in operations:
+			# ベースのcolorSetに含まれないチャンネルは書き出さない
+			if not channel in engine.channels:
+				continue
+
+			if kind == "extract":
+				engine.extractChannel(channel, colorSet)
+			else:
+				engine.packChannel(channel, colorSet, targetChannel)
+
+		meshCount += 1
+
+	return meshCount
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (ワーカー) シーンファイルを1つずつ開いて処理し、保存する
+def runWorker(sceneFiles, operations, outputDir):
+	import maya.standalone
+	maya.standalone.initialize(name="python")
+
+	import maya.cmds as mc
+
+	for sceneFile in sceneFiles:
+		result = {"file": sceneFile, "status": "ok", "meshes": 0, "seconds": 0.0, "error": None}
+		start = perfCounter()
+		try:
+			mc.file(sceneFile, open=True, force=True)
+			result["meshes"] = processOpenScene(operations)
+
+			savePath = outputPath(sceneFile, outputDir)
+			if not os.path.isdir(os.path.dirname(savePath)):
+				os.makedirs(os.path.dirname(savePath))
+
+			fileType = "mayaBinary" if savePath.lower().endswith(".mb") else "mayaAscii"
+			mc.file(rename=savePath)
+			mc.file(save=True, force=True, type=fileType)
+			result["output"] = savePath
+
+		except Exception:
+			result["status"] = "failed"
+			result["error"]  = traceback.format_exc()
+
+		result["seconds"] = perfCounter() - start
+
+		print(RESULT_PREFIX + json.dumps(result))
+		sys.stdout.flush()
+
+	maya.standalone.uninitialize()
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (親) ファイルのまとまりを1つのmayapyのワーカーで処理して、ファイルごとの結果を返す
+# ワーカーが途中で落ちた場合、結果のないファイルは失敗として返す
+def runChunk(mayapy, sceneFiles, args):
+	command = [mayapy, "-m", "kkDisplayVertexColorSeparately.batch", "--worker"] + sceneFiles
+	for spec in args.extract:
+		command += ["--extract", spec]
+	for spec in args.pack:
+		command += ["--pack", spec]
+	if args.output_dir:
+		command += ["--output-dir", args.output_dir]
+
+	# ワーカーからもこのパッケージをimportできるようにscriptsフォルダをPYTHONPATHに追加する
+	env = dict(os.environ)
+	scriptsDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	env["PYTHONPATH"] = os.pathsep.join([scriptsDir] + [p for p in [env.get("PYTHONPATH")] if p])
+
+	start = perfCounter()
+	process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, universal_newlines=True)
+	stdout, stderr = process.communicate()
+	elapsed = perfCounter() - start
+
+	results = {}
+	for line in stdout.splitlines():
+		if line.startswith(RESULT_PREFIX):
+			result = json.loads(line[len(RESULT_PREFIX):])
+			results[result["file"]] = result
+
+	for sceneFile in sceneFiles:
+		if not sceneFile in results:
+			results[sceneFile] = {
+				"file"   : sceneFile,
+				"status" : "failed",
+				"meshes" : 0,
+				"seconds": elapsed,
+				"error"  : "worker exited with code %s\n%s"%(process.returncode, stderr[-4000:]),
+			}
+
+	return [results[sceneFile] for sceneFile in sceneFiles]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 実行中のmayapy、または$MAYA_LOCATION/bin/mayapyを返す
+def defaultMayapy():
+	if os.path.basename(sys.executable).lower().startswith("mayapy"):
+		return sys.executable
+
+	mayaLocation = os.environ.get("MAYA_LOCATION")
+	if mayaLocation:
+		return os.path.join(mayaLocation, "bin", "mayapy.exe" if sys.platform == "win32" else "mayapy")
+	return "mayapy"
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Extract or pack vertex color channels in Maya scene files")
+	parser.add_argument("scenes", nargs="+", help="scene files, glob patterns or @list.txt")
+	parser.add_argument("--extract", action="append", default=[], metavar="CH:colorSet",
+		help="write channel CH as greyscale into colorSet")
+	parser.add_argument("--pack", action="append", default=[], metavar="CH:colorSet.CH",
+		help="write channel CH into one channel of colorSet")
+	parser.add_argument("--output-dir", help="save results here (default: overwrite the input files)")
+	parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() if hasattr(os, "cpu_count") else 2) // 2))
+	parser.add_argument("--files-per-worker", type=int, default=8, help="files processed by one mayapy process")
+	parser.add_argument("--mayapy", default=defaultMayapy())
+	parser.add_argument("--report", help="write the JSON report to this file instead of stdout")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	operations = [parseOperation("extract", spec) for spec in args.extract] + [parseOperation("pack", spec) for spec in args.pack]
+	if len(operations) == 0:
+		parser.error("nothing to do : specify --extract and/or --pack")
+
+	if args.worker:
+		runWorker(args.scenes, operations, args.output_dir)
+		return 0
+
+	sceneFiles = expandSceneFiles(args.scenes)
+	chunks = [sceneFiles[i:i + args.files_per_worker] for i in range(0, len(sceneFiles), args.files_per_worker)]
+
+	# 各ワーカーは別プロセスなので、親はスレッドで起動して終了を待つだけ
+	start = perfCounter()
+	pool = ThreadPool(max(1, min(args.workers, len(chunks))))
+	try:
+		chunkResults = pool.map(lambda chunk: runChunk(args.mayapy, chunk, args), chunks)
+	finally:
+		pool.close()
+		pool.join()
+
+	results = [result for chunk in chunkResults for result in chunk]
+	failedCount = len([r for r in results if r["status"] != "ok"])
+
+	report = {
+		"files"     : len(results),
+		"failed"    : failedCount,
+		"workers"   : args.workers,
+		"seconds"   : perfCounter() - start,
+		"operations": [list(op) for op in operations],
+		"results"   : results,
+	}
+
+	text = json.dumps(report, indent=2)
+	if args.report:
+		with open(args.report, "w") as f:
+			f.write(text)
+	else:
+		print(text)
+
+	for result in results:
+		if result["status"] != "ok":
+			print("FAILED : %s"%result["file"], file=sys.stderr)
+
+	return 1 if failedCount > 0 else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# ChannelEngineの分割・ストローク同期・revertの処理時間とメモリを計測するベンチマーク
+# MemoryMeshBackendを使うのでMaya無しで実行できる
+#
+# scriptsフォルダで以下のように実行し、結果をJSONで出力する
+#   python -m kkDisplayVertexColorSeparately.benchmark --sizes 10000 100000 1000000 --out result.json
+
+import argparse
+from array import array
+import json
+import platform
+import random
+import sys
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+from . import colorBuffer
+from .engine import ChannelEngine
+from .memoryBackend import MemoryMeshBackend
+from .profiler import perfCounter
+
+
+BENCHMARK_VERSION = 1
+
+DEFAULT_SIZES           = [10000, 100000, 1000000, 10000000]
+DEFAULT_REPRESENTATIONS = ["RGB", "RGBA", "A"]
+DEFAULT_CASES           = ["split", "stroke", "revert"]
+
+BASE_COLOR_SET = "colorSet"
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# seedで決まるランダムな頂点カラーのバッファを作る (RGBの場合Alphaは1.0)
+def syntheticColors(count, representation, seed=0):
+	if colorBuffer.np is not None:
+		buf = colorBuffer.np.random.RandomState(seed).rand(count, 4).astype(colorBuffer.np.float32)
+	else:
+		rand = random.Random(seed).random
+		buf = array(colorBuffer.TYPECODE, (rand() for _ in range(count * 4)))
+
+	if representation == "RGB":
+		colorBuffer.setChannel(buf, "A", colorBuffer.channelValues(colorBuffer.filled(count), "A"))
+
+	return buf
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ストロークで塗られる連続した頂点番号 (メッシュの真ん中あたり)
+def strokeIndices(count, strokeRatio):
+	strokeCount = min(count, max(1, int(count * strokeRatio)))
+	start = (count - strokeCount) // 2
+	if colorBuffer.np is not None:
+		return colorBuffer.np.arange(start, start + strokeCount, dtype=colorBuffer.np.int32)
+	return range(start, start + strokeCount)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 計測する1ケース分のsetupとrunをまとめたもの
+# setupは計測に含めず、runの戻り値をその処理で扱った頂点数とする
+class BenchmarkCase(object):
+
+	def __init__(self, name, count, representation, baseColors, strokeRatio):
+		self.name           = name
+		self.count          = count
+		self.representation = representation
+		self.baseColors     = baseColors
+		self.strokeRatio    = strokeRatio
+
+		self.backend = None
+		self.engine  = None
+		self.channel = colorBuffer.channelsOfRepresentation(representation)[0]
+
+
+	#==============================================================================================
+	def setup(self):
+		self.backend = MemoryMeshBackend(self.count, self.baseColors, BASE_COLOR_SET, self.representation)
+		self.engine  = ChannelEngine(self.backend, BASE_COLOR_SET, self.representation)
+		self.engine.saveBeforeEdit()
+		self.engine.ensureChannelColorSets()
+
+		if self.name == "split":
+			return
+
+		self.engine.split()
+		self.engine.setActiveChannel(self.channel)
+
+		if self.name == "stroke":
+			# ペイントツールで塗った状態を再現しておく
+			self.backend.paint(self.engine.channelColorSetName(self.channel), strokeIndices(self.count, self.strokeRatio), 0.5)
+
+		elif self.name == "revert":
+			self.engine.mergeChannel(self.channel, colorBuffer.channelValues(colorBuffer.filled(self.count, (0.5, 0.5, 0.5, 1.0)), "R"))
+
+
+	#==============================================================================================
+	def run(self):
+		if self.name == "split":
+			self.engine.split()
+			return self.count
+
+		elif self.name == "stroke":
+			return self.engine.syncChannel(self.channel)
+
+		elif self.name == "revert":
+			return self.engine.revert()
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# repeat回計測した処理時間と、tracemallocでもう1回計測したピークメモリを返す
+# tracemallocは処理時間に影響するので時間の計測とは分けて行う
+def measure(case, repeat):
+	times = []
+	vertices = 0
+	for _ in range(repeat):
+		case.setup()
+		writtenBefore = case.backend.writtenVtxCount
+		start = perfCounter()
+		vertices = case.run()
+		times.append(perfCounter() - start)
+		written = case.backend.writtenVtxCount - writtenBefore
+
+	peakBytes = None
+	if tracemalloc is not None:
+		case.setup()
+		tracemalloc.start()
+		try:
+			case.run()
+			peakBytes = tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+
+	times.sort()
+	median = times[len(times) // 2]
+
+	return {
+		"case"           : case.name,
+		"representation" : case.representation,
+		"meshVertices"   : case.count,
+		"vertices"       : vertices,
+		"writtenVertices": written,
+		"repeat"         : repeat,
+		"minSec"         : times[0],
+		"medianSec"      : median,
+		"maxSec"         : times[-1],
+		"vtxPerSec"      : vertices / median if median > 0 else None,
+		"peakBytes"      : peakBytes,
+	}
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 全ケースを計測して、結果をまとめたdictを返す
+def runBenchmarks(sizes=None, representations=None, cases=None, repeat=3, strokeRatio=0.01, seed=0, log=None):
+	sizes           = sizes or DEFAULT_SIZES
+	representations = representations or DEFAULT_REPRESENTATIONS
+	cases           = cases or DEFAULT_CASES
+
+	results = []
+	for count in sizes:
+		for representation in representations:
+			baseColors = syntheticColors(count, representation, seed)
+
+			for name in cases:
+				result = measure(BenchmarkCase(name, count, representation, baseColors, strokeRatio), repeat)
+				results.append(result)
+
+				if not log is None:
+					log("%-6s %-4s %10d vtx : %9.4f sec  %14.0f vtx/sec"%(
+						name, representation, count, result["medianSec"], result["vtxPerSec"] or 0))
+
+	return {
+		"benchmarkVersion": BENCHMARK_VERSION,
+		"python"          : platform.python_version(),
+		"numpy"           : colorBuffer.np.__version__ if colorBuffer.np is not None else None,
+		"platform"        : platform.platform(),
+		"strokeRatio"     : strokeRatio,
+		"seed"            : seed,
+		"results"         : results,
+	}
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="kkDisplayVertexColorSeparately channel engine benchmark")
+	parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+	parser.add_argument("--representations", nargs="+", default=DEFAULT_REPRESENTATIONS, choices=DEFAULT_REPRESENTATIONS)
+	parser.add_argument("--cases", nargs="+", default=DEFAULT_CASES, choices=DEFAULT_CASES)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--stroke-ratio", type=float, default=0.01, help="ratio of vertices painted by one stroke")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--out", help="write the JSON report to this file instead of stdout")
+	args = parser.parse_args(argv)
+
+	if args.repeat < 1:
+		parser.error("--repeat must be 1 or more")
+
+	log = lambda message: print(message, file=sys.stderr)
+	report = runBenchmarks(args.sizes, args.representations, args.cases, args.repeat, args.stroke_ratio, args.seed, log)
+
+	text = json.dumps(report, indent=2, sort_keys=True)
+	if args.out:
+		with open(args.out, "w") as f:
+			f.write(text)
+	else:
+		print(text)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# 分割したチャンネルをファイルに書き出し・読み込みする
+#
+# .kvc : 32byteのヘッダ (マジック、バージョン、チャンネル数、頂点数、representation、チャンネル名) の後に
+#        チャンネルごとのfloat32 (little endian) の平面を頂点数分ずつ並べたもの
+# .npy : shape=(チャンネル数, 頂点数)のfloat32の配列 (representationはチャンネル数から決める)
+#
+# 読み込みはnumpyがあればmemmapで行い、Pythonのリストを作らずにバッファへコピーする
+
+import struct
+import sys
+from array import array
+
+from . import colorBuffer
+from .colorBuffer import np
+
+
+MAGIC   = b"KVCS"
+VERSION = 1
+
+# マジック, バージョン, チャンネル数, 頂点数, representation, チャンネル名, 予約
+HEADER_FORMAT = str("<4sHHQ8s4s4x")
+HEADER_SIZE   = struct.calcsize(HEADER_FORMAT)
+
+REPRESENTATION_OF_CHANNEL_COUNT = {1: "A", 3: "RGB", 4: "RGBA"}
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 読み込んだファイルの内容 (planeはチャンネル名をキーにした長さNの値)
+class ChannelFile(object):
+
+	def __init__(self, representation, vertexCount, planes):
+		self.representation = representation
+		self.vertexCount    = vertexCount
+		self.planes         = planes
+
+	@property
+	def channels(self):
+		return [c for c in colorBuffer.CHANNELS if c in self.planes]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def isNpyPath(filePath):
+	return filePath.lower().endswith(".npy")
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# bufのrepresentationに含まれるチャンネルをファイルに書き出す
+def exportChannels(filePath, buf, representation):
+	channels    = colorBuffer.channelsOfRepresentation(representation)
+	vertexCount = colorBuffer.vertexCount(buf)
+
+	if isNpyPath(filePath):
+		if np is None:
+			raise RuntimeError(".npy export needs numpy")
+
+		planes = np.empty((len(channels), vertexCount), dtype="<f4")
+		for i, channel in enumerate(channels):
+			planes[i] = colorBuffer.channelValues(buf, channel)
+		np.save(filePath, planes)
+		return filePath
+
+	header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(channels), vertexCount,
+		representation.encode("ascii"), "".join(channels).encode("ascii"))
+
+	with open(filePath, "wb") as f:
+		f.write(header)
+		for channel in channels:
+			values = colorBuffer.channelValues(buf, channel)
+			if np is not None and isinstance(values, np.ndarray):
+				values.astype("<f4").tofile(f)
+			else:
+				values = array(colorBuffer.TYPECODE, values)
+				if sys.byteorder == "big":
+					values.byteswap()
+				values.tofile(f)
+
+	return filePath
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ファイルを読み込む (numpyがある場合はmemmapなので、planeはファイルを直接参照している)
+def importChannels(filePath):
+	if isNpyPath(filePath):
+		if np is None:
+			raise RuntimeError(".npy import needs numpy")
+
+		data = np.load(filePath, mmap_mode="r")
+		if not data.ndim == 2 or not data.shape[0] in REPRESENTATION_OF_CHANNEL_COUNT:
+			raise ValueError("unexpected .npy shape %s : %s"%(data.shape, filePath))
+
+		representation = REPRESENTATION_OF_CHANNEL_COUNT[data.shape[0]]
+		channels = colorBuffer.channelsOfRepresentation(representation)
+		return ChannelFile(representation, data.shape[1], dict((c, data[i]) for i, c in enumerate(channels)))
+
+	with open(filePath, "rb") as f:
+		header = f.read(HEADER_SIZE)
+		if len(header) < HEADER_SIZE:
+			raise ValueError("not a channel file : %s"%filePath)
+
+		magic, version, channelCount, vertexCount, representation, channelNames = struct.unpack(HEADER_FORMAT, header)
+		if not magic == MAGIC or version > VERSION:
+			raise ValueError("not a channel file (or newer version) : %s"%filePath)
+
+		representation = representation.rstrip(b"\0").decode("ascii")
+		channels = list(channelNames.rstrip(b"\0").decode("ascii"))[:channelCount]
+
+		if np is not None:
+			data = np.memmap(filePath, dtype="<f4", mode="r", offset=HEADER_SIZE, shape=(channelCount, vertexCount))
+			return ChannelFile(representation, vertexCount, dict((c, data[i]) for i, c in enumerate(channels)))
+
+		planes = {}
+		for channel in channels:
+			values = array(colorBuffer.TYPECODE)
+			values.fromfile(f, vertexCount)
+			if sys.byteorder == "big":
+				values.byteswap()
+			planes[channel] = values
+		return ChannelFile(representation, vertexCount, planes)
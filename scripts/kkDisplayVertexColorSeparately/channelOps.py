@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# 長さNのチャンネル値に対する一括の操作 (fill / invert / levels / clamp / remap)
+# どれも新しいバッファを返し、元のvaluesは書き換えない
+# numpyがあればndarray、なければarray('f')で計算する
+
+import bisect
+from array import array
+
+from . import colorBuffer
+from .colorBuffer import np, isNdarray
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 全頂点をvalueにする
+def fill(values, value):
+	if isNdarray(values):
+		return np.full(values.shape, value, dtype=np.float32)
+	return array(colorBuffer.TYPECODE, [value]) * len(values)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1.0 - value
+def invert(values):
+	if isNdarray(values):
+		return (1.0 - values).astype(np.float32)
+	return array(colorBuffer.TYPECODE, [1.0 - v for v in values])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# low～highに収める
+def clamp(values, low=0.0, high=1.0):
+	if isNdarray(values):
+		return np.clip(values, low, high).astype(np.float32)
+	return array(colorBuffer.TYPECODE, [min(max(v, low), high) for v in values])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# Photoshopのレベル補正と同じく、inLow～inHighを0～1にしてgammaをかけ、outLow～outHighに変換する
+def levels(values, inLow=0.0, inHigh=1.0, gamma=1.0, outLow=0.0, outHigh=1.0):
+	if inHigh == inLow:
+		raise ValueError("levels : inLow and inHigh must differ")
+	if gamma <= 0.0:
+		raise ValueError("levels : gamma must be positive")
+
+	inScale  = 1.0 / (inHigh - inLow)
+	invGamma = 1.0 / gamma
+	outScale = outHigh - outLow
+
+	if isNdarray(values):
+		t = np.clip((values - inLow) * inScale, 0.0, 1.0)
+		return (np.power(t, invGamma) * outScale + outLow).astype(np.float32)
+
+	return array(colorBuffer.TYPECODE,
+		[min(max((v - inLow) * inScale, 0.0), 1.0) ** invGamma * outScale + outLow for v in values])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (入力, 出力) の点を直線でつないだカーブで変換する (範囲外は端の点の値)
+def remap(values, points):
+	points = sorted((float(x), float(y)) for x, y in points)
+	if len(points) == 0:
+		raise ValueError("remap : at least one point is required")
+
+	xs = [p[0] for p in points]
+	ys = [p[1] for p in points]
+
+	if isNdarray(values):
+		return np.interp(values, xs, ys).astype(np.float32)
+
+	def evaluate(v):
+		i = bisect.bisect_right(xs, v)
+		if i == 0:
+			return ys[0]
+		if i == len(xs):
+			return ys[-1]
+		x0, x1 = xs[i - 1], xs[i]
+		t = (v - x0) / (x1 - x0) if x1 > x0 else 0.0
+		return ys[i - 1] + (ys[i] - ys[i - 1]) * t
+
+	return array(colorBuffer.TYPECODE, [evaluate(v) for v in values])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# "0:0, 0.5:1, 1:0" のような文字列からremapの点のリストを作る
+def parseCurve(text):
+	points = []
+	for item in text.replace(";", ",").split(","):
+		if item.strip() == "":
+			continue
+		x, _, y = item.partition(":")
+		points.append((float(x), float(y)))
+	return points
+
+
+# 名前から呼び出せるようにした操作 (fillなど引数の必要なものはargsで渡す)
+OPERATIONS = {
+	"fill"  : fill,
+	"invert": invert,
+	"clamp" : clamp,
+	"levels": levels,
+	"remap" : remap,
+}
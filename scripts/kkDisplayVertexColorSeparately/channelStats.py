@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# チャンネルの値の統計 (最小・最大・平均、0と1の頂点数) と0～1を256分割したヒストグラム
+# 最初に全頂点から計算しておき、同期のたびに変更のあった頂点の前後の値だけで更新する
+# numpyがあればndarray、なければarray('f')で計算する
+
+from .colorBuffer import np, isNdarray
+
+
+HISTOGRAM_BINS = 256
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 値ごとのヒストグラムのbin (0未満は最初、1以上は最後のbin)
+def histogramBins(values):
+	if isNdarray(values):
+		return np.clip((values * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+	return [min(max(int(v * HISTOGRAM_BINS), 0), HISTOGRAM_BINS - 1) for v in values]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# valuesのヒストグラム (HISTOGRAM_BINS個の頂点数のリスト)
+def histogram(values):
+	if isNdarray(values):
+		return np.bincount(histogramBins(values), minlength=HISTOGRAM_BINS).tolist()
+
+	counts = [0] * HISTOGRAM_BINS
+	for b in histogramBins(values):
+		counts[b] += 1
+	return counts
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (合計, 0以下の頂点数, 1以上の頂点数)
+def sums(values):
+	if isNdarray(values):
+		return float(np.sum(values, dtype=np.float64)), int(np.count_nonzero(values <= 0.0)), int(np.count_nonzero(values >= 1.0))
+	return float(sum(values)), sum(1 for v in values if v <= 0.0), sum(1 for v in values if v >= 1.0)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# (最小, 最大) (頂点がない場合は(None, None))
+def valueRange(values):
+	if len(values) == 0:
+		return None, None
+	if isNdarray(values):
+		return float(np.min(values)), float(np.max(values))
+	return float(min(values)), float(max(values))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1チャンネル分の統計
+class ChannelStats(object):
+
+	def __init__(self, values=None):
+		self.count     = 0
+		self.total     = 0.0
+		self.minimum   = None
+		self.maximum   = None
+		self.zeroCount = 0
+		self.oneCount  = 0
+		self.histogram = [0] * HISTOGRAM_BINS
+
+		# 最小・最大の頂点の値が変わり、全頂点から求め直す必要がある
+		self.isRangeDirty = False
+
+		if not values is None:
+			self.reset(values)
+
+
+	#==============================================================================================
+	# 全頂点から計算し直す
+	def reset(self, values):
+		self.count = len(values)
+		self.total, self.zeroCount, self.oneCount = sums(values)
+		self.minimum, self.maximum = valueRange(values)
+		self.histogram = histogram(values)
+		self.isRangeDirty = False
+
+
+	#==============================================================================================
+	# 変更のあった頂点の前の値oldValuesと新しい値newValuesで更新する
+	# 最小・最大の値だった頂点が変わった場合だけ、次にrangeを呼んだときにvalues (更新後の全頂点の値) から求め直す
+	def update(self, oldValues, newValues):
+		if len(newValues) == 0:
+			return
+
+		oldTotal, oldZeroCount, oldOneCount = sums(oldValues)
+		newTotal, newZeroCount, newOneCount = sums(newValues)
+		self.total     += newTotal - oldTotal
+		self.zeroCount += newZeroCount - oldZeroCount
+		self.oneCount  += newOneCount - oldOneCount
+
+		for b, count in enumerate(histogram(oldValues)):
+			self.histogram[b] -= count
+		for b, count in enumerate(histogram(newValues)):
+			self.histogram[b] += count
+
+		oldMin, oldMax = valueRange(oldValues)
+		newMin, newMax = valueRange(newValues)
+		if self.minimum is None or (oldMin <= self.minimum and newMin > oldMin) or (oldMax >= self.maximum and newMax < oldMax):
+			self.isRangeDirty = True
+		else:
+			self.minimum = min(self.minimum, newMin)
+			self.maximum = max(self.maximum, newMax)
+
+
+	#==============================================================================================
+	# (最小, 最大) を返す (valuesは求め直す場合に使う全頂点の値)
+	def range(self, values):
+		if self.isRangeDirty == True:
+			self.minimum, self.maximum = valueRange(values)
+			self.isRangeDirty = False
+		return self.minimum, self.maximum
+
+
+	#==============================================================================================
+	@property
+	def mean(self):
+		if self.count == 0:
+			return None
+		return self.total / self.count
+
+	# 全頂点が同じ値か (rangeで最小・最大を確定させてから使う)
+	@property
+	def isConstant(self):
+		return self.count > 0 and not self.isRangeDirty and self.minimum == self.maximum
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 複数メッシュの統計をまとめる (最小・最大は確定させておくこと)
+def merged(statsList):
+	result = ChannelStats()
+	for stats in statsList:
+		if stats.count == 0:
+			continue
+
+		result.count     += stats.count
+		result.total     += stats.total
+		result.zeroCount += stats.zeroCount
+		result.oneCount  += stats.oneCount
+		result.histogram  = [a + b for a, b in zip(result.histogram, stats.histogram)]
+		result.minimum    = stats.minimum if result.minimum is None else min(result.minimum, stats.minimum)
+		result.maximum    = stats.maximum if result.maximum is None else max(result.maximum, stats.maximum)
+	return result
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# 頂点カラーをN×4 (RGBA) の連続したfloat32バッファとして扱うための関数群
+# numpyがあればndarray (shape=(N, 4))、なければarray('f') (長さ4N) を使う
+
+from array import array
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+# py2のarrayはunicodeの型コードを受け付けないのでstrにしておく
+TYPECODE = str("f")
+
+CHANNELS      = ("R", "G", "B", "A")
+CHANNEL_INDEX = {"R": 0, "G": 1, "B": 2, "A": 3}
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# numpyのndarrayか (numpyがない場合は常にFalse)
+def isNdarray(values):
+	return np is not None and isinstance(values, np.ndarray)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 順番を保ったまま重複を取り除いたリスト (チャンネル名やcolorSet名などの短い並び用)
+def uniqueList(items):
+	result = []
+	for item in items:
+		if not item in result:
+			result.append(item)
+	return result
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# colorSetのrepresentationから扱うチャンネルのリストを返す
+def channelsOfRepresentation(representation):
+	channels = []
+	if representation == "RGB" or representation == "RGBA":
+		channels.extend(["R", "G", "B"])
+
+	if representation == "RGBA" or representation == "A":
+		channels.append("A")
+
+	return channels
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# MColorArrayなど4要素の色の並びからバッファを作る
+def fromColors(colors):
+	if np is not None:
+		if len(colors) == 0:
+			return np.zeros((0, 4), dtype=np.float32)
+		return np.array(colors, dtype=np.float32).reshape(-1, 4)
+
+	buf = array(TYPECODE)
+	for color in colors:
+		buf.extend((color[0], color[1], color[2], color[3]))
+	return buf
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# バッファの頂点数
+def vertexCount(buf):
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf.shape[0]
+	return len(buf) // 4
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 指定チャンネルの値をRGBにコピーしたグレースケールのバッファを返す (Alphaは元の値のまま)
+def greyscale(buf, channel):
+	idx = CHANNEL_INDEX[channel]
+
+	if np is not None and isinstance(buf, np.ndarray):
+		out = np.empty_like(buf)
+		out[:, :3] = buf[:, idx, None]
+		out[:, 3]  = buf[:, 3]
+		return out
+
+	out = array(TYPECODE, buf)
+	values = buf[idx::4]
+	out[0::4] = values
+	out[1::4] = values
+	out[2::4] = values
+	return out
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# MColorArrayに渡せるように1頂点ごとの(r, g, b, a)の並びにする
+def toRows(buf):
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf.tolist()
+	return list(zip(buf[0::4], buf[1::4], buf[2::4], buf[3::4]))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 指定チャンネルの値だけを取り出す (長さNの連続したバッファ)
+def channelValues(buf, channel):
+	idx = CHANNEL_INDEX[channel]
+
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf[:, idx].copy()
+	return buf[idx::4]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 指定チャンネルをvaluesで上書きする (bufをそのまま書き換える)
+def setChannel(buf, channel, values):
+	idx = CHANNEL_INDEX[channel]
+
+	if np is not None and isinstance(buf, np.ndarray):
+		buf[:, idx] = values
+	else:
+		buf[idx::4] = values
+	return buf
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 0～count-1の頂点番号の並び
+def allIndices(count):
+	if np is not None:
+		return np.arange(count, dtype=np.int32)
+	return range(count)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# グレースケールで書かれているはずのbufのRGBが、前回同期したvaluesと違う頂点の番号を返す
+def changedIndices(buf, values):
+	if np is not None and isinstance(buf, np.ndarray):
+		return np.flatnonzero((buf[:, :3] != np.asarray(values)[:, None]).any(axis=1)).astype(np.int32)
+
+	return [i for i, (r, g, b, v) in enumerate(zip(buf[0::4], buf[1::4], buf[2::4], values))
+		if r != v or g != v or b != v]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 指定した頂点の行だけを取り出したバッファを返す
+def takeRows(buf, indices):
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf[indices]
+
+	out = array(TYPECODE)
+	for i in indices:
+		out.extend(buf[i * 4:i * 4 + 4])
+	return out
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 長さNのチャンネル値のうち、指定した頂点だけnewValuesで書き換える
+def putValues(values, indices, newValues):
+	if np is not None and isinstance(values, np.ndarray):
+		values[indices] = newValues
+		return values
+
+	for i, v in zip(indices, newValues):
+		values[i] = v
+	return values
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# setVertexColorsに渡せる頂点番号のリストにする
+def indexList(indices):
+	if np is not None and isinstance(indices, np.ndarray):
+		return indices.tolist()
+	return list(indices)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# itemsのうち指定したindexの要素だけを並べたリストを返す
+def takeItems(items, indices):
+	if np is not None:
+		return np.asarray(items)[np.asarray(indices, dtype=np.int64)].tolist()
+	return [items[i] for i in indices]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# フェースごとの頂点数の並びから、フェース頂点ごとのフェース番号のリストを作る
+def repeatIndices(counts):
+	if np is not None:
+		return np.repeat(np.arange(len(counts), dtype=np.int32), np.asarray(counts, dtype=np.int32)).tolist()
+
+	result = []
+	for i, count in enumerate(counts):
+		result.extend([i] * count)
+	return result
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 長さNのチャンネル値からRGBにその値、Alphaに1.0を入れたグレースケールのバッファを作る
+def fromChannelValues(values):
+	if np is not None and isinstance(values, np.ndarray):
+		out = np.empty((values.shape[0], 4), dtype=np.float32)
+		out[:, :3] = values[:, None]
+		out[:, 3]  = 1.0
+		return out
+
+	out = array(TYPECODE, [1.0]) * (len(values) * 4)
+	out[0::4] = values
+	out[1::4] = values
+	out[2::4] = values
+	return out
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 同じ頂点数の2つのバッファで、RGBAのどれかが違う頂点の番号を返す
+def changedRowIndices(buf, otherBuf):
+	if np is not None and isinstance(buf, np.ndarray):
+		return np.flatnonzero((buf != otherBuf).any(axis=1)).astype(np.int32)
+
+	return [i for i in range(len(buf) // 4) if not buf[i * 4:i * 4 + 4] == otherBuf[i * 4:i * 4 + 4]]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 指定した頂点の行をrowsで書き換える (bufをそのまま書き換える)
+def putRows(buf, indices, rows):
+	if np is not None and isinstance(buf, np.ndarray):
+		buf[indices] = rows
+		return buf
+
+	for n, i in enumerate(indices):
+		buf[i * 4:i * 4 + 4] = rows[n * 4:n * 4 + 4]
+	return buf
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# バッファのコピー
+def copy(buf):
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf.copy()
+	return array(TYPECODE, buf)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 全頂点が同じ色のバッファを作る
+def filled(count, color=(0.0, 0.0, 0.0, 1.0)):
+	if np is not None:
+		out = np.empty((count, 4), dtype=np.float32)
+		out[:] = color
+		return out
+
+	return array(TYPECODE, color) * count
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 頂点番号の並びを重複のない昇順にする
+def uniqueIndices(indices):
+	if np is not None:
+		return np.unique(np.asarray(indices, dtype=np.int32))
+	return sorted(set(indices))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 長さNのチャンネル値から指定した頂点の値だけを取り出す
+def takeValues(values, indices):
+	if np is not None and isinstance(values, np.ndarray):
+		return values[indices]
+	return array(TYPECODE, [values[i] for i in indices])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# indicesのうちposition番目の頂点番号だけを取り出す (changedIndicesなどで部分のバッファから求めた位置を頂点番号に戻す)
+def selectIndices(indices, positions):
+	if np is not None and isinstance(indices, np.ndarray):
+		return indices[positions]
+	return [indices[i] for i in positions]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# indicesのうちothersにも含まれる頂点番号の、indicesでの位置を返す
+def memberPositions(indices, others):
+	if np is not None:
+		return np.flatnonzero(np.isin(np.asarray(indices), np.asarray(others)))
+
+	others = set(others)
+	return [i for i, index in enumerate(indices) if index in others]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 0～count-1の頂点番号を、firstの頂点を先にして並べる (残りは番号順)
+def prioritizedIndices(count, first):
+	first = uniqueIndices(first)
+
+	if np is not None:
+		rest = np.ones(count, dtype=bool)
+		rest[first] = False
+		return np.concatenate([first, np.flatnonzero(rest).astype(np.int32)])
+
+	firstSet = set(first)
+	return first + [i for i in range(count) if not i in firstSet]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 0～countをchunkSizeずつに区切った (start, stop) の並び (chunkSizeがNoneの場合は1つだけ)
+def chunkRanges(count, chunkSize=None):
+	if chunkSize is None or chunkSize <= 0:
+		chunkSize = max(count, 1)
+	return [(start, min(start + chunkSize, count)) for start in range(0, count, chunkSize)]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# start～stop-1の頂点番号の並び
+def indexRange(start, stop):
+	if np is not None:
+		return np.arange(start, stop, dtype=np.int32)
+	return list(range(start, stop))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# start～stop-1の頂点の行 (numpyの場合はコピーせずにビューを返す)
+def rowSlice(buf, start, stop):
+	if np is not None and isinstance(buf, np.ndarray):
+		return buf[start:stop]
+	return buf[start * 4:stop * 4]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# MColorArrayなど4要素の色の並びから、chunkSizeずつ変換してバッファを作る
+# fromColorsと違い、一度に全頂点分のPythonのオブジェクトを作らない
+def fromColorsChunked(colors, chunkSize):
+	count = len(colors)
+	if np is not None:
+		out = np.empty((count, 4), dtype=np.float32)
+		for start, stop in chunkRanges(count, chunkSize):
+			out[start:stop] = fromColors([colors[i] for i in range(start, stop)])
+		return out
+
+	out = array(TYPECODE)
+	for start, stop in chunkRanges(count, chunkSize):
+		out.extend(fromColors([colors[i] for i in range(start, stop)]))
+	return out
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 複数のバッファ (頂点番号やチャンネルの値) を1つにつなげる
+def concatenate(parts):
+	if np is not None and len(parts) > 0 and isinstance(parts[0], np.ndarray):
+		return np.concatenate(parts)
+
+	out = array(parts[0].typecode) if len(parts) > 0 and isinstance(parts[0], array) else []
+	for part in parts:
+		out.extend(part)
+	return out
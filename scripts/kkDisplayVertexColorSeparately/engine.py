@@ -0,0 +1,908 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# 頂点カラーをRGBAのチャンネルごとのtmpColorSetに分割・書き戻しする処理
+# MayaやQtには依存せず、メッシュの頂点カラーの読み書きはMeshColorBackendを通して行う
+
+from . import colorBuffer
+from . import channelIO
+from . import channelOps
+from .channelStats import ChannelStats
+from .profiler import Profiler
+from .snapshotStore import SnapshotStore
+
+
+# 各チャンネル表示用のtmpColorSetと、previewModeで使う共有のtmpColorSet
+TMP_COLOR_SET_PREVIEW = "tmpColorSet_Preview"
+TMP_COLOR_SET_LIST    = ["tmpColorSet_R", "tmpColorSet_G", "tmpColorSet_B", "tmpColorSet_A", TMP_COLOR_SET_PREVIEW]
+
+# revertで戻す編集前のチェックポイント名
+BEFORE_EDIT_SNAPSHOT = "Before Edit"
+
+# 分割・同期・書き戻しを区切って処理する頂点数
+# 1回の処理で一時的に使うメモリは、メッシュの頂点数に関係なくおおよそ chunkSize × 200byte 以下になる
+# (グレースケールと値のバッファが1チャンネルあたり20byte/頂点、MColorArrayに渡すPythonのリストが約180byte/頂点)
+# ベースのミラー (16byte/頂点) とチャンネルごとの同期用の値 (4byte/頂点) は常に保持している分として別になる
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# メッシュの頂点カラーの読み書きを行うバックエンドのインターフェース
+# Mayaで使うmayaBackend.MayaMeshBackendと、Maya無しで動くmemoryBackend.MemoryMeshBackendがある
+class MeshColorBackend(object):
+
+	# 頂点数 (フェース頂点ごとに扱うバックエンドの場合はフェース頂点数)
+	def vertexCount(self):
+		raise NotImplementedError
+
+	# colorSet名のリスト
+	def colorSetNames(self):
+		raise NotImplementedError
+
+	def createColorSet(self, colorSet, representation="RGB"):
+		raise NotImplementedError
+
+	def deleteColorSet(self, colorSet):
+		raise NotImplementedError
+
+	def currentColorSet(self):
+		raise NotImplementedError
+
+	# colorSetの全頂点の色をcolorBufferのバッファで返す
+	def readColors(self, colorSet):
+		raise NotImplementedError
+
+	# colorSetの指定した頂点の色だけをcolorBufferのバッファで返す
+	# 部分的に読み込めるバックエンドはオーバーライドする
+	def readColorsAt(self, colorSet, indices):
+		return colorBuffer.takeRows(self.readColors(colorSet), indices)
+
+	# colorSetの色をchunkSize頂点ずつ (先頭の頂点番号, バッファ) で返す
+	# 全頂点をまとめて変換せずに済むバックエンドはオーバーライドする
+	def readColorChunks(self, colorSet, chunkSize):
+		buf = self.readColors(colorSet)
+		for start, stop in colorBuffer.chunkRanges(colorBuffer.vertexCount(buf), chunkSize):
+			yield start, colorBuffer.rowSlice(buf, start, stop)
+
+	# 書き込みを溜めておく (indicesがNoneの場合は全頂点)
+	def write(self, colorSet, buf, indices=None):
+		raise NotImplementedError
+
+	# 溜めた書き込みを実行し、最後にactiveColorSetを現在のcolorSetにする
+	def flush(self, activeColorSet=None):
+		raise NotImplementedError
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ChannelEngine.computeSplitの結果 (applySplitでまとめて書き込む)
+class SplitResult(object):
+
+	def __init__(self, dirtyIdx=None, dirtyIdxList=None):
+		# 書き込む頂点 (Noneの場合は全頂点)
+		self.dirtyIdx     = dirtyIdx
+		self.dirtyIdxList = dirtyIdxList
+
+		# チャンネル名をキーにしたtmpColorSetに書き込むグレースケールのバッファと、キャッシュするチャンネルの値
+		self.greyscales    = {}
+		self.channelValues = {}
+
+		# ベースのcolorSetにも書き込む場合の色と頂点 (Noneの場合は全頂点)
+		self.baseBuffer  = None
+		self.baseIdxList = None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 少しずつ書き込んでいる途中のtmpColorSetの状態
+class FillState(object):
+
+	def __init__(self, order, vertexCount):
+		# 書き込む頂点の順番と、次に書き込むorderの位置
+		self.order       = order
+		self.position    = 0
+		self.vertexCount = vertexCount
+
+	def remaining(self):
+		return len(self.order) - self.position
+
+	# 書き込み済みの頂点番号
+	def filledIndices(self):
+		return self.order[:self.position]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ベースのcolorSetをチャンネルごとのtmpColorSetに分割し、tmpColorSetの変更をベースへ書き戻す
+class ChannelEngine(object):
+
+	def __init__(self, backend, baseColorSet, representation="RGBA", previewMode=False, profiler=None, snapshots=None,
+			chunkSize=DEFAULT_CHUNK_SIZE, strokeHistory=None):
+		self.backend        = backend
+		self.baseColorSet   = baseColorSet
+		self.representation = representation
+
+		# 分割・同期・書き戻しを区切って処理する頂点数 (Noneの場合は区切らない)
+		self.chunkSize = chunkSize
+
+		# Trueの場合、チャンネルごとのtmpColorSetを作らずtmpColorSet_Previewの1つだけを使い、
+		# 表示するチャンネルが切り替わったらメモリ上のsyncedChannelValuesから書き直す
+		self.previewMode = previewMode
+
+		# ベースのcolorSetの種類に含まれるチャンネル
+		self.channels = colorBuffer.channelsOfRepresentation(representation)
+
+		# ベースのcolorSetのN×4のミラー
+		# 自身の書き込みで更新し、外部からの変更を検知したときだけ読み込み直す
+		self.baseMirror = None
+
+		# Trueの場合、refreshBaseMirrorで作業対象の頂点だけを読み込み直したので、それ以外の頂点のミラーは古いかもしれない
+		self.isMirrorPartial = False
+
+		# revert用に残しておくベースの色のチェックポイント
+		self.snapshots = snapshots or SnapshotStore()
+
+		# 同期で書き戻した差分を記録するStrokeHistory (Noneの場合は記録しない。複数のメッシュで共有してもよい)
+		# ストローク以外でベースが変わった場合は、差分を戻すと食い違うので記録を削除する
+		self.strokeHistory = strokeHistory
+
+		# チャンネル名をキーにした前回同期したtmpColorSetの値
+		self.syncedChannelValues = {}
+
+		# チャンネル名をキーにしたsyncedChannelValuesのChannelStats
+		# 最初に取得したときに全頂点から計算し、以降はsyncedChannelValuesの更新に合わせて変更のあった頂点だけで更新する
+		self.channelStats = {}
+
+		# tmpColorSetを生成済みのチャンネル
+		self.materializedChannels = set()
+
+		# 表示中のチャンネルと、tmpColorSet_Previewに現在書き込まれているチャンネル
+		self.activeChannel  = None
+		self.previewChannel = None
+
+		# 作業対象の頂点番号 (昇順)。Noneでない場合、分割・同期・チャンネル操作・revertはこの頂点だけを読み書きする
+		# (tmpColorSetをまだ全頂点書いていないチャンネルは、最初の分割だけ全頂点で行う)
+		self.workingIndices = None
+
+		# チャンネル名をキーにした、少しずつ書き込んでいる途中のtmpColorSetのFillState
+		# 書き込みが終わるまでは、書き込み済みの頂点だけを同期の対象にする
+		self.fillQueue = {}
+
+		# デバッグ用 : 直前の同期と累計で書き戻した頂点数
+		self.lastSyncVtxCount  = 0
+		self.totalSyncVtxCount = 0
+		self.printSyncVtxCount = False
+
+		# 各フェーズの処理時間を記録するProfiler (指定しない場合は記録しない)
+		self.profiler = profiler or Profiler()
+
+
+	#==============================================================================================
+	# バックエンドからの読み込みと書き込みの実行 (プロファイラにフェーズとして記録する)
+	def readColors(self, colorSet, indices=None):
+		with self.profiler.phase("readColors", 0 if indices is None else len(indices)):
+			if indices is None:
+				return self.backend.readColors(colorSet)
+			return self.backend.readColorsAt(colorSet, indices)
+
+	def flush(self):
+		with self.profiler.phase("flush"):
+			self.backend.flush(self.displayedColorSetName())
+
+
+	#==============================================================================================
+	# チャンネルを表示するtmpColorSetの名前
+	def channelColorSetName(self, channel):
+		if self.previewMode == True:
+			return TMP_COLOR_SET_PREVIEW
+		return "tmpColorSet_%s"%channel
+
+
+	#==============================================================================================
+	# 現在表示しているcolorSetの名前 (チャンネルを表示していない場合はベースのcolorSet)
+	def displayedColorSetName(self):
+		if self.activeChannel is None:
+			return self.baseColorSet
+		return self.channelColorSetName(self.activeChannel)
+
+
+	#==============================================================================================
+	# ベースのcolorSetのN×4のミラーを返す
+	# 自身の書き込みはミラーにも反映しているので、ない場合か頂点数が変わった場合だけ読み込む
+	def getBaseMirror(self):
+		if self.baseMirror is None or not colorBuffer.vertexCount(self.baseMirror) == self.backend.vertexCount():
+			self.baseMirror = self.readColors(self.baseColorSet)
+			self.isMirrorPartial = False
+
+		return self.baseMirror
+
+
+	#==============================================================================================
+	# 作業対象の頂点を設定する (Noneの場合は全頂点)
+	# 作業対象の頂点だけでミラーを読み込み直していた場合は、ここで全頂点を読み込み直して
+	# 外部で変わっていた頂点のtmpColorSetを書き直す (書き込みがあった場合は変わった頂点番号かNone(全頂点)を返す)
+	def setWorkingIndices(self, indices):
+		if not indices is None:
+			indices = colorBuffer.uniqueIndices(indices)
+
+		dirtyIdx = []
+		if self.isMirrorPartial == True and not self.baseMirror is None:
+			self.workingIndices = None
+			dirtyIdx = self.baseChanged()
+
+		self.workingIndices = indices
+		return dirtyIdx
+
+
+	#==============================================================================================
+	# indicesのうち作業対象の頂点だけを返す (indicesがNoneの場合は作業対象の頂点、どちらもNoneならNone)
+	def restrictIndices(self, indices):
+		if self.workingIndices is None:
+			return indices
+		if indices is None:
+			return self.workingIndices
+		return colorBuffer.selectIndices(indices, colorBuffer.memberPositions(indices, self.workingIndices))
+
+
+	#==============================================================================================
+	# 外部でベースのcolorSetが変更された場合にミラーを読み込み直し、変更のあった頂点番号を返す
+	# 頂点数が変わった場合など比較できない場合はNone
+	# 作業対象の頂点がある場合は、その頂点だけを読み込んで比べる
+	def refreshBaseMirror(self):
+		indices = self.workingIndices
+		if not indices is None and not self.baseMirror is None and colorBuffer.vertexCount(self.baseMirror) == self.backend.vertexCount():
+			newRows  = self.readColors(self.baseColorSet, indices)
+			changed  = colorBuffer.changedRowIndices(newRows, colorBuffer.takeRows(self.baseMirror, indices))
+			dirtyIdx = colorBuffer.selectIndices(indices, changed)
+			colorBuffer.putRows(self.baseMirror, dirtyIdx, colorBuffer.takeRows(newRows, changed))
+			self.isMirrorPartial = True
+		elif self.baseMirror is None or not colorBuffer.vertexCount(self.baseMirror) == self.backend.vertexCount():
+			self.baseMirror = None
+			self.getBaseMirror()
+			dirtyIdx = None
+		else:
+			self.isMirrorPartial = False
+			dirtyIdx = self.refreshBaseMirrorChunks()
+
+		if dirtyIdx is None or len(dirtyIdx) > 0:
+			self.discardStrokeHistory()
+		return dirtyIdx
+
+
+	#==============================================================================================
+	# ベースのcolorSetをchunkSize頂点ずつ読み込んでミラーと比べ、変わった頂点だけミラーを書き換えてその頂点番号を返す
+	# 新しいミラーを丸ごと作らないので、一時的なメモリはchunkSize頂点分と変わった頂点の番号だけで済む
+	def refreshBaseMirrorChunks(self):
+		dirtyIdxList = []
+
+		with self.profiler.phase("readColors", colorBuffer.vertexCount(self.baseMirror)):
+			for start, rows in self.backend.readColorChunks(self.baseColorSet, self.chunkSize):
+				stop = start + colorBuffer.vertexCount(rows)
+				changed = colorBuffer.changedRowIndices(rows, colorBuffer.rowSlice(self.baseMirror, start, stop))
+				if len(changed) == 0:
+					continue
+
+				chunkDirtyIdx = colorBuffer.selectIndices(colorBuffer.indexRange(start, stop), changed)
+				colorBuffer.putRows(self.baseMirror, chunkDirtyIdx, colorBuffer.takeRows(rows, changed))
+				dirtyIdxList.append(chunkDirtyIdx)
+
+		return colorBuffer.concatenate(dirtyIdxList)
+
+
+	#==============================================================================================
+	# ストローク以外でベースが変わったので、このメッシュへの記録した差分を削除する (ほかのメッシュの記録は残す)
+	def discardStrokeHistory(self):
+		if not self.strokeHistory is None:
+			self.strokeHistory.discard(self)
+
+
+	#==============================================================================================
+	# revert用に現在のベースの色を残しておく (編集前のチェックポイントは容量オーバーでも削除しない)
+	def saveBeforeEdit(self):
+		self.snapshots.save(BEFORE_EDIT_SNAPSHOT, self.getBaseMirror(), pinned=True)
+
+
+	#==============================================================================================
+	# 現在のベースの色をnameのチェックポイントとして残しておく
+	def saveCheckpoint(self, name):
+		self.snapshots.save(name, self.getBaseMirror())
+
+
+	#==============================================================================================
+	# チャンネルのtmpColorSetがなければ生成する (channelsを指定しない場合は全チャンネル)
+	def ensureChannelColorSets(self, channels=None):
+		if channels is None or self.previewMode == True:
+			channels = self.channels
+
+		allColorSetList = self.backend.colorSetNames()
+
+		for channel in channels:
+			tmpColorSet = self.channelColorSetName(channel)
+			if not tmpColorSet in allColorSetList:
+				self.backend.createColorSet(tmpColorSet, "RGB")
+				allColorSetList.append(tmpColorSet)
+
+			self.materializedChannels.add(channel)
+
+
+	#==============================================================================================
+	# チャンネルのtmpColorSetを削除する (次に表示するときに作り直す)
+	def dropChannel(self, channel):
+		tmpColorSet = self.channelColorSetName(channel)
+		if self.previewMode == False and tmpColorSet in self.backend.colorSetNames():
+			self.backend.deleteColorSet(tmpColorSet)
+
+		self.materializedChannels.discard(channel)
+		self.fillQueue.pop(channel, None)
+		if self.previewMode == False:
+			self.syncedChannelValues.pop(channel, None)
+			self.channelStats.pop(channel, None)
+
+
+	#==============================================================================================
+	# チャンネルのtmpColorSetをfillStepで少しずつ書き込むように準備する (tmpColorSetは生成済みであること)
+	# firstIndicesを指定した場合はその頂点から先に書き込む
+	def startProgressiveFill(self, channels, firstIndices=None):
+		baseBuffer = self.getBaseMirror()
+		vtxCount   = colorBuffer.vertexCount(baseBuffer)
+
+		if firstIndices is None:
+			order = colorBuffer.allIndices(vtxCount)
+		else:
+			order = colorBuffer.prioritizedIndices(vtxCount, firstIndices)
+
+		for channel in channels:
+			self.materializedChannels.add(channel)
+
+			# 書き込み後の値を先にキャッシュしておく (書き込み済みの頂点の同期にはこの値を使う)
+			self.syncedChannelValues[channel] = colorBuffer.channelValues(baseBuffer, channel)
+			self.channelStats.pop(channel, None)
+			self.fillQueue[channel] = FillState(order, vtxCount)
+
+
+	#==============================================================================================
+	# 書き込み途中のtmpColorSetに次のcount頂点を書き込み、残りの頂点数を返す
+	# 途中で頂点数が変わった場合は残りをまとめて分割し直す
+	def fillStep(self, channel, count):
+		state = self.fillQueue.get(channel)
+		if state is None:
+			return 0
+
+		if not state.vertexCount == self.backend.vertexCount():
+			del self.fillQueue[channel]
+			self.split([channel])
+			return 0
+
+		indices = state.order[state.position:state.position + count]
+		self.profiler.addVertices(len(indices))
+
+		with self.profiler.phase("fillStep", len(indices)):
+			rows = colorBuffer.takeRows(self.getBaseMirror(), indices)
+			self.backend.write(self.channelColorSetName(channel), colorBuffer.greyscale(rows, channel), colorBuffer.indexList(indices))
+		self.flush()
+
+		state.position += len(indices)
+		if state.remaining() == 0:
+			del self.fillQueue[channel]
+		return state.remaining()
+
+
+	#==============================================================================================
+	# 書き込み途中のtmpColorSetの残りの頂点数の合計
+	def fillRemaining(self):
+		return sum(state.remaining() for state in self.fillQueue.values())
+
+
+	#==============================================================================================
+	# syncChannelで調べる頂点 (Noneの場合は全頂点)
+	# 書き込み途中のチャンネルは書き込み済みの頂点だけ (まだ書いていない頂点は編集されたとみなさない)
+	def syncIndices(self, channel):
+		state = self.fillQueue.get(channel)
+		if state is None:
+			return self.workingIndices
+		return self.restrictIndices(state.filledIndices())
+
+
+	#==============================================================================================
+	# ベースの色を元に各チャンネルのtmpColorSetをグレースケールで書き直す
+	# channelsを指定しない場合は生成済みの全チャンネル、dirtyIdxを指定した場合はその頂点だけ
+	# includeBaseがTrueの場合はベースのcolorSetも同じ色で書き直す
+	# 作業対象の頂点がある場合はその頂点だけ (全頂点をまだ書いていないチャンネルがある場合を除く)
+	def split(self, channels=None, dirtyIdx=None, includeBase=False):
+		self.getBaseMirror()
+		channels, dirtyIdx = self.splitTargets(channels, dirtyIdx, includeBase)
+
+		vtxCount = colorBuffer.vertexCount(self.baseMirror) if dirtyIdx is None else len(dirtyIdx)
+		self.profiler.addVertices(vtxCount)
+
+		with self.profiler.phase("split", vtxCount):
+			if self.isChunked(vtxCount) == False:
+				self.applySplit(self.computeSplit(channels, dirtyIdx, includeBase))
+			else:
+				# 全頂点の場合は同期用の値を先に全頂点分作っておき、区切ったそれぞれの書き込みで上書きしていく
+				if dirtyIdx is None:
+					for channel in (self.channels if self.previewMode == True else channels):
+						self.syncedChannelValues[channel] = colorBuffer.channelValues(self.baseMirror, channel)
+						self.channelStats.pop(channel, None)
+
+				for chunkIdx in self.chunkIndices(dirtyIdx, vtxCount):
+					self.applySplit(self.computeSplit(channels, chunkIdx, includeBase))
+					self.flush()
+
+		self.flush()
+
+
+	#==============================================================================================
+	# vtxCount頂点の処理を区切って行うか
+	def isChunked(self, vtxCount):
+		return not self.chunkSize is None and vtxCount > self.chunkSize
+
+
+	#==============================================================================================
+	# indicesをchunkSizeずつに区切った頂点番号の並び (indicesがNoneの場合は0～vtxCount-1)
+	def chunkIndices(self, indices, vtxCount):
+		for start, stop in colorBuffer.chunkRanges(vtxCount, self.chunkSize):
+			if indices is None:
+				yield colorBuffer.indexRange(start, stop)
+			else:
+				yield indices[start:stop]
+
+
+	#==============================================================================================
+	# splitで書き直すチャンネルと頂点を決める
+	def splitTargets(self, channels=None, dirtyIdx=None, includeBase=False):
+		if channels is None:
+			channels = [c for c in colorBuffer.CHANNELS if c in self.materializedChannels]
+
+		# 共有のtmpColorSet_Previewの場合は全チャンネルの値をキャッシュするので全チャンネルを確認する
+		cachedChannels = self.channels if self.previewMode == True else channels
+		if includeBase == False and all(c in self.syncedChannelValues for c in cachedChannels):
+			dirtyIdx = self.restrictIndices(dirtyIdx)
+
+		return channels, dirtyIdx
+
+
+	#==============================================================================================
+	# splitの計算だけを行う (バックエンドには触らないので、getBaseMirrorを済ませておけば別スレッドで実行できる)
+	# rowsを指定した場合はミラーの代わりにその色 (dirtyIdxの頂点の行) を使う
+	def computeSplit(self, channels, dirtyIdx=None, includeBase=False, rows=None):
+		if not rows is None:
+			dirtyBuffer = rows
+		elif dirtyIdx is None:
+			dirtyBuffer = self.baseMirror
+		else:
+			dirtyBuffer = colorBuffer.takeRows(self.baseMirror, dirtyIdx)
+
+		result = SplitResult(dirtyIdx, None if dirtyIdx is None else colorBuffer.indexList(dirtyIdx))
+
+		# 共有のtmpColorSet_Previewの場合は全チャンネルの値をキャッシュしておき、表示中のチャンネルだけを書き込む
+		if self.previewMode == True:
+			for channel in self.channels:
+				result.channelValues[channel] = colorBuffer.channelValues(dirtyBuffer, channel)
+			if not self.activeChannel is None and self.activeChannel in self.materializedChannels:
+				result.greyscales[self.activeChannel] = colorBuffer.greyscale(dirtyBuffer, self.activeChannel)
+
+		else:
+			for channel in channels:
+				result.greyscales[channel]    = colorBuffer.greyscale(dirtyBuffer, channel)
+				result.channelValues[channel] = colorBuffer.channelValues(dirtyBuffer, channel)
+
+		if includeBase == True:
+			result.baseBuffer  = dirtyBuffer
+			result.baseIdxList = result.dirtyIdxList
+		return result
+
+
+	#==============================================================================================
+	# computeSplitの結果をtmpColorSetに書き込む (書き込みを溜めるだけなので最後にflushが必要)
+	def applySplit(self, result):
+		dirtyIdx = result.dirtyIdx
+
+		# syncChannelで変更された頂点を調べるために書き込んだ値を残しておく
+		for channel in colorBuffer.CHANNELS:
+			if channel in result.channelValues:
+				self.storeSyncedChannelValues(channel, dirtyIdx, result.channelValues[channel])
+
+		if self.previewMode == True:
+			# 表示中のチャンネルが書き込まれている場合は変更のあった頂点だけ書き直す
+			if self.activeChannel is None or not self.activeChannel in self.materializedChannels:
+				self.previewChannel = None
+			elif not dirtyIdx is None and self.previewChannel == self.activeChannel:
+				self.backend.write(TMP_COLOR_SET_PREVIEW, result.greyscales[self.activeChannel], result.dirtyIdxList)
+			else:
+				self.writePreviewChannel(self.activeChannel)
+		else:
+			for channel in colorBuffer.CHANNELS:
+				if channel in result.greyscales:
+					self.backend.write(self.channelColorSetName(channel), result.greyscales[channel], result.dirtyIdxList)
+
+		if not result.baseBuffer is None:
+			self.backend.write(self.baseColorSet, result.baseBuffer, result.baseIdxList)
+
+
+	#==============================================================================================
+	# 表示するチャンネルを切り替える (Noneの場合はベースのcolorSetを表示)
+	def setActiveChannel(self, channel):
+		self.activeChannel = channel
+
+		if not channel is None:
+			if not channel in self.materializedChannels:
+				self.ensureChannelColorSets([channel])
+				self.split([channel])
+
+			# 共有のtmpColorSet_Previewの場合は、キャッシュから表示するチャンネルの値を書き込む
+			if self.previewMode == True and not self.previewChannel == channel:
+				self.writePreviewChannel(channel)
+
+		self.flush()
+
+
+	#==============================================================================================
+	# キャッシュしているチャンネルの値をグレースケールでtmpColorSet_Previewに書き込む
+	# 読み込みは行わず、メモリ上のバッファを書き込むだけで表示を切り替える
+	def writePreviewChannel(self, channel):
+		values = self.syncedChannelValues.get(channel)
+		if values is None:
+			return
+
+		vtxCount = len(values)
+		if self.isChunked(vtxCount) == False:
+			self.backend.write(TMP_COLOR_SET_PREVIEW, colorBuffer.fromChannelValues(values))
+		else:
+			for start, stop in colorBuffer.chunkRanges(vtxCount, self.chunkSize):
+				self.backend.write(TMP_COLOR_SET_PREVIEW, colorBuffer.fromChannelValues(values[start:stop]), colorBuffer.indexList(colorBuffer.indexRange(start, stop)))
+				self.flush()
+		self.previewChannel = channel
+
+
+	#==============================================================================================
+	# tmpColorSetで変更された頂点を調べて、そのチャンネルの値をベースへ書き戻す
+	# 作業対象の頂点がある場合はその頂点だけを読み込んで調べる。書き戻した頂点数を返す
+	def syncChannel(self, channel):
+		tmpColorSet  = self.channelColorSetName(channel)
+		syncedValues = self.syncedChannelValues.get(channel)
+		indices      = self.syncIndices(channel)
+
+		# 頂点数が変わっていたら前回の値は使えないので全頂点を対象にする
+		# (書き込み途中のチャンネルは編集されていない頂点まで書き戻さないように分割し直す)
+		isAllVertices = syncedValues is None or not len(syncedValues) == self.backend.vertexCount()
+		if isAllVertices == True and channel in self.fillQueue:
+			del self.fillQueue[channel]
+			self.split([channel])
+			return 0
+		# 全頂点を調べる場合はchunkSizeずつ読み込んで比べ、変更のあった頂点だけを残す
+		if isAllVertices == False and indices is None and self.isChunked(len(syncedValues)) == True:
+			vtxCount = len(syncedValues)
+			dirtyIdx, dirtyValues = self.changedChannelChunks(tmpColorSet, syncedValues)
+
+		else:
+			if isAllVertices == True or indices is None:
+				tmpBuffer = self.readColors(tmpColorSet)
+				vtxCount  = colorBuffer.vertexCount(tmpBuffer)
+			else:
+				tmpBuffer = self.readColors(tmpColorSet, indices)
+				vtxCount  = len(indices)
+
+			with self.profiler.phase("changedIndices", vtxCount):
+				if isAllVertices == True:
+					dirtyIdx = colorBuffer.allIndices(vtxCount)
+					changed  = dirtyIdx
+				elif indices is None:
+					dirtyIdx = colorBuffer.changedIndices(tmpBuffer, syncedValues)
+					changed  = dirtyIdx
+				else:
+					changed  = colorBuffer.changedIndices(tmpBuffer, colorBuffer.takeValues(syncedValues, indices))
+					dirtyIdx = colorBuffer.selectIndices(indices, changed)
+
+			dirtyValues = colorBuffer.channelValues(colorBuffer.takeRows(tmpBuffer, changed), "R")
+
+		self.lastSyncVtxCount = len(dirtyIdx)
+		self.profiler.addVertices(self.lastSyncVtxCount)
+		self.totalSyncVtxCount += self.lastSyncVtxCount
+		if self.printSyncVtxCount == True:
+			print("syncChannel %s : %d / %d vertices"%(channel, self.lastSyncVtxCount, vtxCount))
+
+		if self.lastSyncVtxCount > 0:
+			# 頂点数が変わった場合は前の値がないので差分を記録できない
+			if isAllVertices == True:
+				self.discardStrokeHistory()
+				self.mergeChannel(channel, dirtyValues)
+			else:
+				oldValues = colorBuffer.takeValues(syncedValues, dirtyIdx)
+				self.mergeChannel(channel, dirtyValues, dirtyIdx)
+				if not self.strokeHistory is None:
+					self.strokeHistory.record(self, channel, dirtyIdx, oldValues, dirtyValues)
+
+		return self.lastSyncVtxCount
+
+
+	#==============================================================================================
+	# StrokeHistoryのundo/redoで、記録した頂点のチャンネルの値を書き戻す。書き戻した頂点数を返す
+	# 記録した後に頂点数が変わっている場合は書き戻さない
+	def applyStrokeValues(self, channel, indices, values):
+		if not colorBuffer.vertexCount(self.getBaseMirror()) == self.backend.vertexCount():
+			return 0
+
+		self.mergeChannel(channel, values, indices)
+		return len(indices)
+
+
+	#==============================================================================================
+	# tmpColorSetをchunkSize頂点ずつ読み込んでsyncedValuesと比べ、変更のあった頂点番号とその値を返す
+	def changedChannelChunks(self, tmpColorSet, syncedValues):
+		dirtyIdxList    = []
+		dirtyValuesList = []
+
+		with self.profiler.phase("changedIndices", len(syncedValues)):
+			for start, rows in self.backend.readColorChunks(tmpColorSet, self.chunkSize):
+				stop = start + colorBuffer.vertexCount(rows)
+				changed = colorBuffer.changedIndices(rows, syncedValues[start:stop])
+				if len(changed) == 0:
+					continue
+
+				dirtyIdxList.append(colorBuffer.selectIndices(colorBuffer.indexRange(start, stop), changed))
+				dirtyValuesList.append(colorBuffer.channelValues(colorBuffer.takeRows(rows, changed), "R"))
+
+		return colorBuffer.concatenate(dirtyIdxList), colorBuffer.concatenate(dirtyValuesList)
+
+
+	#==============================================================================================
+	# チャンネルの値をベースへ書き込み、表示中のtmpColorSetもグレースケールで書き直す
+	# indicesを指定しない場合は全頂点。chunkSizeを超える場合は区切って書き込む
+	def mergeChannel(self, channel, values, indices=None):
+		if self.isChunked(len(values)) == True:
+			if indices is None:
+				indices = colorBuffer.allIndices(len(values))
+				self.storeSyncedChannelValues(channel, None, values)
+
+			for start, stop in colorBuffer.chunkRanges(len(values), self.chunkSize):
+				self.mergeChannelRows(channel, values[start:stop], indices[start:stop])
+			return
+
+		self.mergeChannelRows(channel, values, indices)
+
+
+	#==============================================================================================
+	def mergeChannelRows(self, channel, values, indices=None):
+		baseBuffer = self.getBaseMirror()
+
+		with self.profiler.phase("merge", len(values)):
+			if indices is None:
+				dirtyBaseBuffer = colorBuffer.setChannel(colorBuffer.copy(baseBuffer), channel, values)
+				indexList = None
+			else:
+				dirtyBaseBuffer = colorBuffer.setChannel(colorBuffer.takeRows(baseBuffer, indices), channel, values)
+				indexList = colorBuffer.indexList(indices)
+
+			if channel in self.materializedChannels and (self.previewMode == False or self.previewChannel == channel):
+				self.backend.write(self.channelColorSetName(channel), colorBuffer.fromChannelValues(values), indexList)
+
+			self.backend.write(self.baseColorSet, dirtyBaseBuffer, indexList)
+		self.flush()
+
+		if indices is None:
+			self.baseMirror = dirtyBaseBuffer
+		else:
+			colorBuffer.putRows(baseBuffer, indices, dirtyBaseBuffer)
+		self.storeSyncedChannelValues(channel, indices, values)
+
+
+	#==============================================================================================
+	# 外部でベースのcolorSetが変更された場合に、変更のあった頂点だけtmpColorSetを書き直す
+	def baseChanged(self):
+		dirtyIdx = self.refreshBaseMirror()
+		if dirtyIdx is None or len(dirtyIdx) > 0:
+			self.split(dirtyIdx=dirtyIdx)
+
+		return dirtyIdx
+
+
+	#==============================================================================================
+	# ベースの色をチェックポイントに戻し、tmpColorSetも書き直す (nameを指定しない場合は編集前)
+	# 現在の色と違う頂点だけを書き込み (作業対象の頂点がある場合はそのうちの頂点だけ)、書き込んだ頂点数を返す
+	def revert(self, name=BEFORE_EDIT_SNAPSHOT):
+		self.getBaseMirror()
+		return self.applyRevert(self.computeRevert(name))
+
+
+	#==============================================================================================
+	# revertの計算 (チェックポイントとの比較とtmpColorSetの色) だけを行う
+	# バックエンドには触らないので、getBaseMirrorを済ませておけば別スレッドで実行できる
+	# チェックポイントがない場合はNone
+	def computeRevert(self, name=BEFORE_EDIT_SNAPSHOT):
+		if not name in self.snapshots:
+			return None
+
+		dirtyIdx, dirtyRows = self.snapshots.restoreRows(name, self.baseMirror)
+
+		if not dirtyIdx is None and not self.workingIndices is None:
+			positions = colorBuffer.memberPositions(dirtyIdx, self.workingIndices)
+			dirtyIdx  = colorBuffer.selectIndices(dirtyIdx, positions)
+			dirtyRows = colorBuffer.takeRows(dirtyRows, positions)
+
+		channels = [c for c in colorBuffer.CHANNELS if c in self.materializedChannels]
+		result = self.computeSplit(channels, dirtyIdx, rows=dirtyRows)
+		result.baseBuffer  = dirtyRows
+		result.baseIdxList = result.dirtyIdxList
+		return result
+
+
+	#==============================================================================================
+	# computeRevertの結果をベースとtmpColorSetに書き込み、書き込んだ頂点数を返す
+	def applyRevert(self, result):
+		if result is None:
+			return 0
+
+		# 頂点数が変わっている場合は全頂点
+		if result.dirtyIdx is None:
+			self.baseMirror = result.baseBuffer
+		elif len(result.dirtyIdx) == 0:
+			return 0
+		else:
+			colorBuffer.putRows(self.baseMirror, result.dirtyIdx, result.baseBuffer)
+
+		self.discardStrokeHistory()
+
+		self.applySplit(result)
+		self.flush()
+		return colorBuffer.vertexCount(result.baseBuffer)
+
+
+	#==============================================================================================
+	# colorSetがなければ生成する (生成した場合はTrue)
+	def ensureColorSet(self, colorSet, representation):
+		if colorSet in self.backend.colorSetNames():
+			return False
+
+		self.backend.createColorSet(colorSet, representation)
+		return True
+
+
+	#==============================================================================================
+	# ベースのチャンネルをグレースケールでcolorSetに書き出す (なければ生成する)
+	def extractChannel(self, channel, colorSet, representation="RGB"):
+		self.ensureColorSet(colorSet, representation)
+		self.backend.write(colorSet, colorBuffer.greyscale(self.getBaseMirror(), channel))
+		self.flush()
+
+
+	#==============================================================================================
+	# ベースのチャンネルをcolorSetのtargetChannelに書き込む (colorSetの他のチャンネルはそのまま)
+	# colorSetがない場合は黒 (Alphaは1.0) で生成してから書き込む
+	def packChannel(self, channel, colorSet, targetChannel, representation="RGBA"):
+		baseBuffer = self.getBaseMirror()
+
+		if self.ensureColorSet(colorSet, representation) == True:
+			targetBuffer = colorBuffer.filled(colorBuffer.vertexCount(baseBuffer))
+		else:
+			targetBuffer = self.readColors(colorSet)
+
+		colorBuffer.setChannel(targetBuffer, targetChannel, colorBuffer.channelValues(baseBuffer, channel))
+		self.backend.write(colorSet, targetBuffer)
+		self.flush()
+
+
+	#==============================================================================================
+	# ベースの各チャンネルをファイル (.kvc / .npy) に書き出す
+	def exportChannels(self, filePath):
+		return channelIO.exportChannels(filePath, self.getBaseMirror(), self.representation)
+
+
+	#==============================================================================================
+	# ファイルのチャンネルをベースに書き込み、変更のあった頂点だけtmpColorSetも書き直す
+	# channelsを指定した場合はそのチャンネルだけ読み込む。書き込んだ頂点数を返す
+	def importChannels(self, filePath, channels=None):
+		channelFile = channelIO.importChannels(filePath)
+		baseBuffer  = self.getBaseMirror()
+
+		if not channelFile.vertexCount == colorBuffer.vertexCount(baseBuffer):
+			raise ValueError("vertex count mismatch : file %d / mesh %d"%(channelFile.vertexCount, colorBuffer.vertexCount(baseBuffer)))
+
+		return self.setBaseChannels(dict((c, channelFile.planes[c]) for c in channelFile.channels
+			if channels is None or c in channels))
+
+
+	#==============================================================================================
+	# チャンネル名をキーにした長さNの値でベースのチャンネルを置き換える
+	# 変更のあった頂点だけベースに書き込み、書き換えたチャンネルのtmpColorSetだけを書き直す
+	# ベースのcolorSetの種類に含まれないチャンネルは無視する。書き込んだ頂点数を返す
+	# 作業対象の頂点がある場合は、その頂点の値だけを比べて書き込む
+	# 作業対象の頂点をchunkSize頂点ずつ比べて書き込むので、ベースの色の全頂点分のコピーは作らない
+	def setBaseChannels(self, channelValues):
+		channels   = [c for c in colorBuffer.CHANNELS if c in channelValues and c in self.channels]
+		baseBuffer = self.getBaseMirror()
+		indices    = self.workingIndices
+		vtxCount   = colorBuffer.vertexCount(baseBuffer) if indices is None else len(indices)
+
+		dirtyIdxList = []
+		for chunkIdx in self.chunkIndices(indices, vtxCount):
+			baseRows = colorBuffer.takeRows(baseBuffer, chunkIdx)
+			newRows  = colorBuffer.copy(baseRows)
+			for channel in channels:
+				colorBuffer.setChannel(newRows, channel, colorBuffer.takeValues(channelValues[channel], chunkIdx))
+
+			changed = colorBuffer.changedRowIndices(newRows, baseRows)
+			if len(changed) == 0:
+				continue
+
+			if len(dirtyIdxList) == 0:
+				self.discardStrokeHistory()
+
+			chunkDirtyIdx = colorBuffer.selectIndices(chunkIdx, changed)
+			dirtyRows     = colorBuffer.takeRows(newRows, changed)
+			colorBuffer.putRows(baseBuffer, chunkDirtyIdx, dirtyRows)
+			self.backend.write(self.baseColorSet, dirtyRows, colorBuffer.indexList(chunkDirtyIdx))
+			if self.isChunked(vtxCount) == True:
+				self.flush()
+			dirtyIdxList.append(chunkDirtyIdx)
+
+		if len(dirtyIdxList) == 0:
+			return 0
+
+		dirtyIdx = colorBuffer.concatenate(dirtyIdxList)
+		self.split([c for c in channels if c in self.materializedChannels], dirtyIdx)
+		return len(dirtyIdx)
+
+
+	#==============================================================================================
+	# channelOpsの操作 (fill / invert / levels / clamp / remap) をベースのチャンネルにかける
+	# 例 : applyChannelOp("A", "invert")、applyChannelOp("R", "levels", 0.1, 0.9, 1.2)
+	# 作業対象の頂点がある場合は、その頂点の値だけに操作をかける
+	def applyChannelOp(self, channel, operation, *args, **kargs):
+		values = colorBuffer.channelValues(self.getBaseMirror(), channel)
+		function = channelOps.OPERATIONS[operation]
+
+		if self.workingIndices is None:
+			values = function(values, *args, **kargs)
+		else:
+			colorBuffer.putValues(values, self.workingIndices, function(colorBuffer.takeValues(values, self.workingIndices), *args, **kargs))
+		return self.setBaseChannels({channel: values})
+
+
+	#==============================================================================================
+	# sourceChannelの値をtargetChannelにコピーする
+	def copyChannel(self, sourceChannel, targetChannel):
+		return self.setBaseChannels({targetChannel: colorBuffer.channelValues(self.getBaseMirror(), sourceChannel)})
+
+
+	#==============================================================================================
+	# 2つのチャンネルの値を入れ替える
+	def swapChannels(self, channelA, channelB):
+		baseBuffer = self.getBaseMirror()
+		return self.setBaseChannels({
+			channelA: colorBuffer.channelValues(baseBuffer, channelB),
+			channelB: colorBuffer.channelValues(baseBuffer, channelA)})
+
+
+	#==============================================================================================
+	# syncedChannelValuesを更新する (indicesがNoneの場合は全頂点を置き換える)
+	def storeSyncedChannelValues(self, channel, indices, values):
+		syncedValues = self.syncedChannelValues.get(channel)
+		if indices is None:
+			self.syncedChannelValues[channel] = colorBuffer.copy(values)
+			self.channelStats.pop(channel, None)
+
+		# 一部の頂点だけでは全体の値にならないので、次のsyncChannelで全頂点を対象にさせる
+		elif syncedValues is None:
+			return
+
+		else:
+			stats = self.channelStats.get(channel)
+			if not stats is None:
+				stats.update(colorBuffer.takeValues(syncedValues, indices), values)
+			colorBuffer.putValues(syncedValues, indices, values)
+
+
+	#==============================================================================================
+	# チャンネルのChannelStatsを返す
+	# 分割済みのチャンネルはキャッシュしておき、まだのチャンネルはベースのミラーからその都度計算する
+	def getChannelStats(self, channel):
+		values = self.syncedChannelValues.get(channel)
+		if values is None:
+			return ChannelStats(colorBuffer.channelValues(self.getBaseMirror(), channel))
+
+		stats = self.channelStats.get(channel)
+		if stats is None:
+			with self.profiler.phase("channelStats", len(values)):
+				stats = self.channelStats[channel] = ChannelStats(values)
+
+		# 最小・最大の頂点が変わっていた場合はここで求め直す
+		stats.range(values)
+		return stats
@@ -1,26 +1,39 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, unicode_literals
 
-import os, sys, traceback
-from functools import wraps
+import os, sys, time, traceback
+from functools import wraps, partial
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 import maya.cmds as mc
 import maya.mel as mel
+import maya.utils
 import maya.api.OpenMaya as om2
 import maya.OpenMayaUI as omUI
 
 from maya.app.general.mayaMixin import MayaQWidgetBaseMixin
 
+from . import colorBuffer
+from . import channelOps
+from . import channelStats
+from .engine import ChannelEngine, TMP_COLOR_SET_LIST, BEFORE_EDIT_SNAPSHOT
+from .mayaBackend import MayaMeshBackend
+from .profiler import Profiler, formatDuration
+from .snapshotStore import SnapshotStore
+from .strokeHistory import StrokeHistory
+
 try:
-	from PySide2.QtWidgets import QMainWindow, QApplication
-	from PySide2.QtGui import QPainterPath, QRegion, QIcon
+	from PySide2.QtWidgets import QMainWindow, QApplication, QLabel, QMenu, QFileDialog, QInputDialog, QProgressBar, QWidget, QShortcut
+	from PySide2.QtGui import QPainterPath, QRegion, QIcon, QPainter, QColor, QKeySequence
 	from PySide2.QtUiTools import QUiLoader
-	from PySide2.QtCore import Qt, QPoint, QRect
+	from PySide2.QtCore import Qt, QPoint, QRect, QTimer
 	from shiboken2 import wrapInstance
 except ImportError:
-	from PySide.QtGui import QMainWindow, QApplication, QPainterPath, QRegion, QIcon
+	from PySide.QtGui import QMainWindow, QApplication, QLabel, QMenu, QFileDialog, QInputDialog, QProgressBar, QWidget, QShortcut
+	from PySide.QtGui import QPainterPath, QRegion, QIcon, QPainter, QColor, QKeySequence
 	from PySide.QtUiTools import QUiLoader
-	from PySide.QtCore import Qt, QPoint, QRect
+	from PySide.QtCore import Qt, QPoint, QRect, QTimer
 	from shiboken import wrapInstance
 
 
@@ -43,43 +56,636 @@ def openCloseChunk(func):
 	return wrapper
 
 
+#----------------------------------------------------------------------------------------------------------------------
+# undoInfoの記録を一時的に止める (すでにundoのキューに積まれているものは消さない)
+# enabledがFalseの場合や、もともと記録が止まっている場合は何もしない
+@contextmanager
+def undoSuspended(enabled=True):
+	if enabled == False or mc.undoInfo(q=True, stateWithoutFlush=True) == False:
+		yield
+		return
+
+	mc.undoInfo(stateWithoutFlush=False)
+	try:
+		yield
+	finally:
+		mc.undoInfo(stateWithoutFlush=True)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ツール自身の頂点カラーの書き込みでSyncDispatcherの同期が走らないようにするデコレーター
+# 書き込みの前に、まだ同期していない変更通知をすぐに同期しておく (ペイントした結果が上書きされて失われないように)
+def suspendSync(func):
+	@wraps(func)
+	def wrapper(self, *args, **kargs):
+		self.syncDispatcher.flushPending()
+		with self.syncDispatcher.suspended():
+			return func(self, *args, **kargs)
+
+	return wrapper
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# バックグラウンドの計算中は実行しないデコレーター
+# 計算の結果を書き込む前にベースやtmpColorSetが変わると、古い計算結果で上書きされてしまうため
+def skipWhileBusy(func):
+	@wraps(func)
+	def wrapper(self, *args, **kargs):
+		if self.backgroundTasks.isBusy() == True:
+			mc.warning("kkDisplayVertexColorSeparately : previous operation is still running")
+			return None
+		return func(self, *args, **kargs)
+
+	return wrapper
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 処理時間をself.profilerに関数名の操作として記録するデコレータ
+def profileOperation(func):
+	@wraps(func)
+	def wrapper(self, *args, **kargs):
+		with self.profiler.operation(func.__name__):
+			return func(self, *args, **kargs)
+
+	return wrapper
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# メッシュやpolyColorPerVertexノードのattributeChangedコールバックを1つのオブジェクトでまとめて管理し、
+# ペイント中に連続して届く変更通知はアイドル時に1回の同期にまとめて実行する
+class SyncDispatcher(object):
+
+	def __init__(self, handler):
+		# 同期を行う関数 (通知のあったノードのkeyのsetを受け取る)
+		self.handler = handler
+
+		# MObjectHandleのhashCodeをキーにした (MObjectHandle, callbackID)
+		self.watchedNodes = {}
+
+		# 通知のあったノードのkey (watchで指定しなかった場合はノード名) のset
+		self.pendingNodes = set()
+		self.isScheduled  = False
+
+		# 0より大きい間は自分自身の書き込みとみなして通知を無視する
+		self.suspendCount = 0
+
+		# 0より大きい間は通知を溜めるだけにして、同期はreleaseまで待つ (バックグラウンドの計算中など)
+		self.holdCount = 0
+
+		# デバッグ用 : 受け取った通知の数と実際に同期を実行した数
+		self.notifyCount   = 0
+		self.dispatchCount = 0
+
+
+	#==============================================================================================
+	# ノードの頂点カラー関係のアトリビュートの変更を監視する
+	# keyを指定した場合、変更通知はノード名の代わりにkeyでまとめてhandlerに渡す
+	def watch(self, mObj, key=None):
+		handle = om2.MObjectHandle(mObj)
+		if handle.hashCode() in self.watchedNodes:
+			return
+
+		callbackID = om2.MNodeMessage.addAttributeChangedCallback(mObj, self.attributeChangedCallback, key)
+		self.watchedNodes[handle.hashCode()] = (handle, callbackID)
+
+	def watchByName(self, nodeName, key=None):
+		if not mc.objExists(nodeName):
+			return
+
+		selList = om2.MSelectionList()
+		selList.add(nodeName)
+		self.watch(selList.getDependNode(0), key)
+
+
+	#==============================================================================================
+	# 登録したコールバックをすべて解除する
+	def removeCallbacks(self):
+		for _, callbackID in self.watchedNodes.values():
+			om2.MMessage.removeCallback(callbackID)
+		self.watchedNodes = {}
+		self.pendingNodes = set()
+
+
+	#==============================================================================================
+	# withで囲んだ間の変更通知を無視する
+	@contextmanager
+	def suspended(self):
+		self.suspendCount += 1
+		try:
+			yield
+		finally:
+			self.suspendCount -= 1
+
+
+	#==============================================================================================
+	# 同期を止めて通知を溜めておく / 再開して溜まった通知を同期する
+	def hold(self):
+		self.holdCount += 1
+
+	def release(self):
+		self.holdCount = max(0, self.holdCount - 1)
+		if self.holdCount == 0 and len(self.pendingNodes) > 0 and self.isScheduled == False:
+			self.isScheduled = True
+			maya.utils.executeDeferred(self.flush)
+
+
+	#==============================================================================================
+	# attributeChangedのコールバック
+	# ここでは通知を溜めるだけで、同期はexecuteDeferredでアイドル時に1回だけ実行する
+	def attributeChangedCallback(self, msg, plug, otherPlug, clientData):
+		if self.suspendCount > 0:
+			return
+
+		if not msg & om2.MNodeMessage.kAttributeSet:
+			return
+
+		if not isVertexColorPlug(plug):
+			return
+
+		self.notifyCount += 1
+		if clientData is None:
+			self.pendingNodes.add(om2.MFnDependencyNode(plug.node()).name())
+		else:
+			self.pendingNodes.add(clientData)
+
+		if self.isScheduled == False and self.holdCount == 0:
+			self.isScheduled = True
+			maya.utils.executeDeferred(self.flush)
+
+
+	#==============================================================================================
+	# 溜まった通知があれば、アイドル時を待たずにすぐ同期する (同期を止めている間は何もしない)
+	# 予約済みのflushは後で実行されても通知が空なので何もしない
+	def flushPending(self):
+		if len(self.pendingNodes) > 0 and self.holdCount == 0:
+			self.flush()
+
+
+	#==============================================================================================
+	# 溜まった通知をまとめて1回の同期として実行する
+	def flush(self):
+		self.isScheduled = False
+		if len(self.pendingNodes) == 0 or self.holdCount > 0:
+			return
+
+		pendingNodes = self.pendingNodes
+		self.pendingNodes = set()
+
+		self.dispatchCount += 1
+		with self.suspended():
+			self.handler(pendingNodes)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 分割やrevertの比較などの計算だけをスレッドプールで実行し、Mayaへの書き込みはexecuteDeferredでメインスレッドに戻して行う
+# numpyの配列の計算中はGILが解放されるので、その間もMayaのUIは止まらない
+class BackgroundTasks(object):
+
+	def __init__(self, workers=4, progress=None):
+		self.workers = workers
+		self.pool    = None
+
+		# 進捗 (終わった数, 全体の数) を受け取る関数
+		self.progress = progress
+
+		# 実行中のジョブ (計算の結果のリストと、全部終わったら呼ぶ関数)
+		# doneFuncは計算が失敗してapplyFuncを呼ばなかった場合も必ず呼ぶ
+		self.results   = None
+		self.doneCount = 0
+		self.applyFunc = None
+		self.doneFunc  = None
+		self.isFailed  = False
+		self.isClosed  = False
+
+
+	#==============================================================================================
+	def isBusy(self):
+		return not self.applyFunc is None
+
+
+	#==============================================================================================
+	# computeFuncsをスレッドプールで実行し、全部終わったらメインスレッドでapplyFunc(結果のリスト)とdoneFunc()を呼ぶ
+	# computeFuncsの中ではMayaのAPIを呼ばないこと
+	def run(self, computeFuncs, applyFunc, doneFunc=None):
+		if self.pool is None:
+			self.pool = ThreadPool(self.workers)
+
+		self.results   = [None] * len(computeFuncs)
+		self.doneCount = 0
+		self.applyFunc = applyFunc
+		self.doneFunc  = doneFunc
+		self.isFailed  = False
+		self.notifyProgress()
+
+		if len(computeFuncs) == 0:
+			self.finish()
+			return
+
+		for i, computeFunc in enumerate(computeFuncs):
+			self.pool.apply_async(runSafely, (computeFunc,), callback=partial(self.computed, i))
+
+
+	#==============================================================================================
+	# (プールのスレッド) 計算が終わったらメインスレッドに戻す
+	def computed(self, index, resultAndError):
+		maya.utils.executeDeferred(partial(self.taskDone, index, resultAndError))
+
+
+	#==============================================================================================
+	# 計算が1つ終わったときの処理 (全部終わったらapplyFuncを呼ぶ)
+	def taskDone(self, index, resultAndError):
+		if self.isClosed == True or self.applyFunc is None:
+			return
+
+		result, error = resultAndError
+		if not error is None:
+			print(error)
+			self.isFailed = True
+
+		self.results[index] = result
+		self.doneCount += 1
+		self.notifyProgress()
+
+		if self.doneCount == len(self.results):
+			self.finish()
+
+
+	#==============================================================================================
+	def finish(self):
+		applyFunc, doneFunc, results = self.applyFunc, self.doneFunc, self.results
+		self.applyFunc = None
+		self.doneFunc  = None
+		self.results   = None
+
+		try:
+			if self.isFailed == True:
+				mc.warning("kkDisplayVertexColorSeparately : background computation failed (see Script Editor)")
+			else:
+				applyFunc(results)
+		finally:
+			self.notifyProgress()
+			if not doneFunc is None:
+				doneFunc()
+
+
+	#==============================================================================================
+	def notifyProgress(self):
+		if self.progress is None:
+			return
+
+		if self.results is None:
+			self.progress(0, 0)
+		else:
+			self.progress(self.doneCount, len(self.results))
+
+
+	#==============================================================================================
+	# ウィンドウを閉じるときに、実行中の計算の結果を捨ててプールを止める
+	def close(self):
+		self.isClosed  = True
+		self.applyFunc = None
+		self.doneFunc  = None
+		if not self.pool is None:
+			self.pool.terminate()
+			self.pool = None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 例外をスレッドの外に持ち出せるように (結果, エラーのトレースバック) を返す
+def runSafely(func):
+	try:
+		return func(), None
+	except Exception:
+		return None, traceback.format_exc()
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# メッシュのcolorSetかpolyColorPerVertexのvertexColor以下のplugかどうか
+def isVertexColorPlug(plug):
+	plugName = plug.partialName(useFullAttributePath=True, useLongNames=True)
+	return plugName.startswith("colorSet") or plugName.startswith("colorPerVertex") or\
+		plugName.startswith("vertexColor")
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1つのメッシュ分の状態 (ChannelEngine、ベースのcolorSet、ヒストリのpolyColorPerVertexノードなど)
+# 複数のメッシュを選択して実行した場合はメッシュごとに1つ作る
+class MeshSession(object):
+
+	def __init__(self, mDagPath, profiler=None, previewMode=False, faceVertexMode=False, snapshots=None, chunkSize=None,
+			strokeHistory=None):
+		self.targetObj     = om2.MFnTransform(mDagPath)
+		self.targetObjMesh = om2.MFnMesh(mDagPath)
+
+		self.callbackID_nameChanged = None
+
+		# colorSet名をキーにしたnodeDeletedのscriptJob番号
+		self.jobNum_nodeDeleted = {}
+
+		# colorSet名 (ベースは"Base") をキーにしたヒストリのpolyColorPerVertexノードのMObjectHandle
+		# 名前ではなくハンドルで持つので、他のメッシュのノードと名前が重なっても取り違えない
+		self.colorNodes = {}
+
+		meshPath = self.targetObjMesh.fullPathName()
+
+		# displayColorsを取得して残しておきつつ、確認できるようにカラー表示をONにしておく
+		self.attrDispColor = mc.getAttr("%s.displayColors"%meshPath)
+		mc.setAttr("%s.displayColors"%meshPath, 1)
+
+		# 中間オブジェクトがあるか確認
+		historyList = mc.bakePartialHistory(meshPath, q=True, prePostDeformers=True) or []
+		self.hasIntermediateObject = len(historyList) > 0
+
+		# 実行前にアクティブになっていたベースのcolorSetを保存しておく
+		curColorSetList = mc.polyColorSet(meshPath, q=True, currentColorSet=True)
+
+		# colorSerがない場合生成する
+		if curColorSetList == None:
+			curColorSet = mc.polyColorSet(meshPath, create=True, colorSet="colorSet", clamped=True, representation="RGBA")[0]
+		else:
+			curColorSet = curColorSetList[0]
+
+		self.baseColorSet    = curColorSet
+		self.baseColorSerRep = mc.polyColorSet(meshPath, q=True, currentColorSet=True, representation=True)
+
+		# チャンネルの分割・書き戻しはChannelEngineで行い、Mayaへの読み書きはMayaMeshBackendを通す
+		self.engine = ChannelEngine(
+			MayaMeshBackend(self.targetObjMesh, self.hasIntermediateObject, profiler, faceVertexMode, chunkSize),
+			self.baseColorSet, self.baseColorSerRep, previewMode, profiler, snapshots, chunkSize, strokeHistory)
+
+		# revert用に編集前の色を残しておく
+		self.engine.saveBeforeEdit()
+
+
+	#==============================================================================================
+	# このメッシュのベースのcolorSetにチャンネルが含まれるか
+	def hasChannel(self, channel):
+		return channel in self.engine.channels
+
+
+	#==============================================================================================
+	# ヒストリのpolyColorPerVertexノードが存在するか (削除されてundo待ちの場合も存在しないとみなす)
+	def colorNodeExists(self, colorSet):
+		handle = self.colorNodes.get(colorSet)
+		return not handle is None and handle.isValid()
+
+
+	#==============================================================================================
+	# ヒストリのpolyColorPerVertexノードの現在の名前 (存在しない場合はNone)
+	def colorNodeName(self, colorSet):
+		if self.colorNodeExists(colorSet) == False:
+			return None
+		return om2.MFnDependencyNode(self.colorNodes[colorSet].object()).name()
+
+
+	#==============================================================================================
+	# 存在しているpolyColorPerVertexノードのMObjectのリスト
+	def colorNodeObjects(self):
+		return [handle.object() for handle in self.colorNodes.values() if handle.isValid()]
+
+
+	#==============================================================================================
+	# このメッシュのinMeshから上流のヒストリだけをたどって、polyColorPerVertexノードをメッシュに近い順に返す
+	# (シーン全体は検索しないので、処理時間はこのメッシュのヒストリの長さだけで決まる)
+	def historyColorNodes(self):
+		inMeshPlug = self.targetObjMesh.findPlug("inMesh", False)
+		if not inMeshPlug.isDestination:
+			return []
+
+		nodes = []
+		dgIt = om2.MItDependencyGraph(inMeshPlug, om2.MFn.kPolyColorPerVertex,
+			om2.MItDependencyGraph.kUpstream, om2.MItDependencyGraph.kDepthFirst, om2.MItDependencyGraph.kNodeLevel)
+		while not dgIt.isDone():
+			nodes.append(dgIt.currentNode())
+			dgIt.next()
+		return nodes
+
+
+	#==============================================================================================
+	# このメッシュのヒストリにあるpolyColorPerVertexノードを、書き込んだcolorSetが分かる名前に変更してハンドルを残しておく
+	# 他のメッシュと名前が重なった場合はMayaが連番の名前を付ける
+	# (同じcolorSetのノードが複数ある場合はメッシュに一番近いもの)
+	def renameColorNodes(self):
+		foundColorSets = set()
+		for colorNode in self.historyColorNodes():
+			colorNodeFn  = om2.MFnDependencyNode(colorNode)
+			colorSetName = colorNodeFn.findPlug("colorSetName", False).asString()
+
+			tmpColorSetList = [c for c in TMP_COLOR_SET_LIST if c in colorSetName]
+
+			if len(tmpColorSetList) > 0:
+				colorSet = tmpColorSetList[0]
+				nodeName = "%s_Node"%colorSet
+			elif self.baseColorSet in colorSetName:
+				colorSet = "Base"
+				nodeName = "tmpColorSet_Base_Node"
+			else:
+				continue
+
+			if colorSet in foundColorSets:
+				continue
+			foundColorSets.add(colorSet)
+
+			# すでに同じノードを見つけている場合は名前の変更も不要
+			handle = self.colorNodes.get(colorSet)
+			if not handle is None and handle.isValid() and handle.object() == colorNode:
+				continue
+
+			mc.rename(colorNodeFn.name(), nodeName)
+			self.colorNodes[colorSet] = om2.MObjectHandle(colorNode)
+
+
+	#==============================================================================================
+	# ウィンドウを閉じるときに、tmpColorSetを削除してdisplayColorsを元に戻す
+	def restore(self):
+		if self.callbackID_nameChanged:
+			om2.MNodeMessage.removeCallback(self.callbackID_nameChanged)
+			self.callbackID_nameChanged = None
+
+		meshPath = self.targetObjMesh.fullPathName()
+
+		# ターゲットオブジェクトの全colorSetリストを取得
+		allColorSetList = self.targetObjMesh.getColorSetNames()
+
+		# tmpColorSetを削除する
+		for tmpColorSet in TMP_COLOR_SET_LIST:
+			if tmpColorSet in allColorSetList:
+				mc.polyColorSet(meshPath, delete=True, colorSet=tmpColorSet)
+
+		# displayColorsを元に戻しておく
+		mc.setAttr("%s.displayColors"%meshPath, self.attrDispColor)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# チャンネルごとの最小・最大・平均、0と1の頂点数とヒストグラムを表示するパネル
+# ヒストグラムは0や1に頂点が集中していても他のbinが見えるように、頂点数の平方根の高さで描く
+class ChannelStatsPanel(QWidget):
+
+	CHANNEL_COLORS = {"R": (255, 90, 90), "G": (90, 220, 90), "B": (100, 150, 255), "A": (210, 210, 210)}
+
+	TEXT_HEIGHT      = 14
+	HISTOGRAM_HEIGHT = 36
+	ROW_HEIGHT       = TEXT_HEIGHT * 2 + HISTOGRAM_HEIGHT + 8
+
+	def __init__(self, parent=None):
+		super(ChannelStatsPanel, self).__init__(parent, Qt.Tool)
+		self.setWindowTitle("Channel Statistics")
+
+		# チャンネル名をキーにした表示中のChannelStats
+		self.stats = {}
+
+		self.setFixedSize(300, 8)
+
+
+	#==============================================================================================
+	# 表示するチャンネルのChannelStatsを更新する (statsに含まれないチャンネルはそのまま)
+	def setStats(self, stats):
+		self.stats.update(stats)
+		self.setFixedHeight(len(self.stats) * self.ROW_HEIGHT + 8)
+		self.update()
+
+
+	#==============================================================================================
+	def paintEvent(self, event):
+		painter = QPainter(self)
+		painter.fillRect(self.rect(), QColor(43, 43, 43))
+
+		left  = 6
+		width = self.width() - left * 2
+		top   = 4
+		for channel in colorBuffer.CHANNELS:
+			stats = self.stats.get(channel)
+			if stats is None:
+				continue
+
+			color = QColor(*self.CHANNEL_COLORS[channel])
+			painter.setPen(color)
+			for line, text in enumerate(formatChannelStats(channel, stats)):
+				painter.drawText(QRect(left, top + line * self.TEXT_HEIGHT, width, self.TEXT_HEIGHT), Qt.AlignLeft | Qt.AlignVCenter, text)
+
+			histogramTop = top + self.TEXT_HEIGHT * 2
+			painter.fillRect(QRect(left, histogramTop, width, self.HISTOGRAM_HEIGHT), QColor(30, 30, 30))
+
+			peak = max(stats.histogram) ** 0.5 if stats.count > 0 else 0.0
+			if peak > 0.0:
+				for b, count in enumerate(stats.histogram):
+					if count <= 0:
+						continue
+					x0 = left + b * width // channelStats.HISTOGRAM_BINS
+					x1 = left + (b + 1) * width // channelStats.HISTOGRAM_BINS
+					height = max(int(self.HISTOGRAM_HEIGHT * count ** 0.5 / peak), 1)
+					painter.fillRect(QRect(x0, histogramTop + self.HISTOGRAM_HEIGHT - height, max(x1 - x0, 1), height), color)
+
+			top += self.ROW_HEIGHT
+
+		painter.end()
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# パネルに表示するChannelStatsの2行分の文字列
+def formatChannelStats(channel, stats):
+	if stats.count == 0:
+		return ["%s : no vertices"%channel, ""]
+
+	first = "%s : min %.3f  max %.3f  mean %.3f"%(channel, stats.minimum, stats.maximum, stats.mean)
+	second = "0 : %d vtx  1 : %d vtx  / %d vtx"%(stats.zeroCount, stats.oneCount, stats.count)
+	if stats.isConstant == True:
+		second += "  (constant)"
+	return [first, second]
+
+
 #----------------------------------------------------------------------------------------------------------------------
 
 
 class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
-	targetObj           = None
-	targetObjMesh       = None
-	targetObjVtxCount   = None
-	targetObjVtxIdxList = None
-
-	jobNum_attributeChange_R = 0
-	jobNum_attributeChange_G = 0
-	jobNum_attributeChange_B = 0
-	jobNum_attributeChange_A = 0
-	jobNum_attributeChange_Base = 0
-
-	jobNum_nodeDeleted_R = 0
-	jobNum_nodeDeleted_G = 0
-	jobNum_nodeDeleted_B = 0
-	jobNum_nodeDeleted_A = 0
+	# 選択したメッシュごとのMeshSession
+	sessions = None
+
+	# 頂点カラーの変更通知を受けて同期を実行するSyncDispatcher
+	syncDispatcher = None
+
+	# Trueの場合、同期処理の各フェーズの処理時間をprofilerに記録し、ウィンドウに直近の処理時間を表示する
+	# 記録はウィンドウを閉じるときにdumpProfileでJSONに書き出す
+	profileHotPath  = False
+	profileCapacity = 512
+	profiler        = None
+	latencyLabel    = None
+
+	# Trueの場合、tmpColorSetは各チャンネルのボタンが初めて押されたときに生成する
+	lazyChannelColorSet = False
+	# 遅延生成の場合、この秒数以上表示していないチャンネルのtmpColorSetは削除する
+	lazyChannelDropSec  = 300.0
+
+	# Trueの場合、チャンネルごとのtmpColorSetを作らずtmpColorSet_Previewの1つだけを使い、
+	# 表示するチャンネルが切り替わったらメモリ上のキャッシュから書き直す
+	previewColorSetMode = False
+
+	# Trueの場合、頂点カラーではなくフェース頂点カラーとして分割・書き戻しを行う
+	# 頂点ごとに平均されないので、フェース頂点ごとに色が違うハードな境目が残る
+	faceVertexColorMode = False
+
+	# Trueの場合、選択中のコンポーネント (頂点・エッジ・フェース) を作業対象にして、
+	# 分割・同期・チャンネル操作・revertはその頂点だけを読み書きする (コンポーネントを選択していないメッシュは全頂点)
+	componentSelectionMode = False
+	jobNum_selectionChanged = 0
+
+	# Trueの場合、ウィンドウを開いたときの分割とrevertの計算をスレッドプールで行い、
+	# Mayaへの書き込みだけをメインスレッドで行う (計算中はprogressBarに進捗を表示する)
+	backgroundCompute = True
+	backgroundWorkers = 4
+	backgroundTasks   = None
+	progressBar       = None
+
+	# Trueの場合、頂点数がprogressiveMinVertices以上のメッシュはウィンドウを開いたときに全チャンネルを書き込まず、
+	# アイドル時にprogressiveChunkSize頂点ずつ書き込む (表示中のチャンネルを優先し、選択中のコンポーネントがあればその頂点から)
+	# previewColorSetModeと遅延生成の場合は使わない
+	progressiveFill        = False
+	progressiveMinVertices = 1000000
+	progressiveChunkSize   = 200000
+	fillTimer = None
+	fillTotal = 0
+
+	# 分割・同期・書き戻しを区切って処理する頂点数 (Noneの場合は区切らない)
+	# 処理中に一時的に使うメモリをメッシュの大きさに関係なくおおよそ streamChunkSize × 200byte 以下に抑える
+	streamChunkSize = 256 * 1024
+
+	# revert用のチェックポイントをメッシュごとに保持する容量と保存形式 (uint8 / float16 / float32)
+	# 編集前のチェックポイントは元の色に正確に戻せるように、常にfloat32で保存する
+	snapshotBudgetMB = 64
+	snapshotEncoding = "float16"
+
+	# Trueの場合、チャンネルの同期はMayaのundoに記録せず、変更のあった頂点の差分だけをStrokeHistoryに記録する
+	# (Mayaのundoには1回の同期ごとにtmpColorSetとベースの全頂点の色が残り、長時間ペイントするとメモリを圧迫するため)
+	# 記録した差分はundoStroke / redoStrokeで戻す。strokeCoalesceSec以内に続いた同期は1つのストロークにまとめる
+	strokeUndo         = True
+	strokeUndoBudgetMB = 64
+	strokeCoalesceSec  = 0.5
+	strokeHistory      = None
+
+	# 保存したチェックポイント名 (保存した順)
+	checkpointNames = None
+
+	# チャンネル名をキーにした最後に表示した時間
+	channelLastViewedTime = None
+
+	# Trueの場合、ウィンドウを開いたときからチャンネルの統計とヒストグラムのパネルを表示する
+	# (右クリックメニューからも切り替えられる。同期のたびに変更のあった頂点だけで更新する)
+	showChannelStats = False
+	statsPanel       = None
 
 	jobNum_otherSceneOpened = 0
 
-	callbackID_nameChanged = None
+	# バックグラウンドの計算中にMayaのundo/redoがあり、ミラーの読み込み直しを待っている
+	isUndoRefreshPending = False
 
-	baseColorSet        = ""
-	baseColorSerRep     = "RGBA"
-	baseColorBeforeEdit = None
+	# バックグラウンドの計算中に選択が変わり、作業対象の頂点の更新を待っている
+	isWorkingIndicesPending = False
 
-	attrDispColor  = 0
 	pOption_matChl = ""
 	pOption_matBld = ""
 
 	isHistoryDeleted = True
 
-	# 中間オブジェクトを持っているか
-	hasIntermediateObject = False
-
 	mouseCursorPos = QPoint(0, 0)
 	isDragging = False
 
@@ -102,90 +708,218 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 		# すでにウィンドウ開いていた場合閉じておく
 		self.deleteInstances()
 
-		selList = om2.MGlobal.getActiveSelectionList()
-
-		mDagPath, _ = selList.getComponent(0)
+		self.syncDispatcher  = SyncDispatcher(self.vtxColChanged)
+		self.backgroundTasks = BackgroundTasks(self.backgroundWorkers, self.updateProgress)
+		self.profiler = Profiler(self.profileHotPath, self.profileCapacity)
+		self.channelLastViewedTime = {}
+		self.checkpointNames       = []
 
-		self.targetObj     = om2.MFnTransform(mDagPath)
-		self.targetObjMesh = om2.MFnMesh(mDagPath)
+		# 全メッシュで共有するストロークの履歴 (複数のメッシュを同時にペイントしても1回で戻す)
+		if self.strokeUndo == True:
+			self.strokeHistory = StrokeHistory(self.strokeUndoBudgetMB * 1024 * 1024, self.strokeCoalesceSec)
 
-		self.targetObjVtxCount   = self.targetObjMesh.numVertices
-		self.targetObjVtxIdxList = xrange(self.targetObjVtxCount)
+		# 選択されているメッシュごとにMeshSessionを作る
+		self.sessions = []
+		selList = om2.MGlobal.getActiveSelectionList()
+		for i in xrange(selList.length()):
+			snapshots = SnapshotStore(self.snapshotBudgetMB * 1024 * 1024, self.snapshotEncoding)
+			session = MeshSession(selList.getDagPath(i), self.profiler, self.previewColorSetMode, self.faceVertexColorMode, snapshots,
+				self.streamChunkSize, self.strokeHistory)
 
-		mObj = mDagPath.node()
+			# ターゲットのオブジェクト名が変更されたcallbackを受けて実行する関数を登録
+			session.callbackID_nameChanged = om2.MNodeMessage.addNameChangedCallback(
+				session.targetObj.object(), self.targetObjNameChangedCallback)
 
-		# ターゲットのオブジェクト名が変更されたcallbackを受けて実行する関数を登録
-		self.callbackID_nameChanged = om2.MNodeMessage.addNameChangedCallback(mObj, self.targetObjNameChangedCallback)
+			self.sessions.append(session)
 
 
 		super(kkDisplayVertexColorSeparatelyWindow, self).__init__(parent)
 		self.setupUI()
 
 
-		# displayColorsを取得して残しておきつつ、確認できるようにカラー表示をONにしておく
-		self.attrDispColor = mc.getAttr("%s.displayColors"%self.targetObjMesh.fullPathName())
-		mc.setAttr("%s.displayColors"%self.targetObjMesh.fullPathName(), 1)
-
-
 		# colorMaterialChannelとmaterialBlendを取得して残しておきつつ変更する
+		# (選択している全メッシュに対して設定される)
 		self.pOption_matChl = mc.polyOptions(q=True, colorMaterialChannel=True, gl=False)[0]
 		self.pOption_matBld = mc.polyOptions(q=True, materialBlend=True, gl=False)[0]
 		mc.polyOptions(colorMaterialChannel="ambientDiffuse", gl=False)
 		mc.polyOptions(materialBlend="overwrite", gl=False)
 
 
-		# 中間オブジェクトがあるか確認
-		historyList = mc.bakePartialHistory(self.targetObjMesh.fullPathName(), q=True, prePostDeformers=True) or []
-		if len(historyList) > 0:
-			self.hasIntermediateObject = True
+		# 全メッシュのtmpColorSetの生成をまとめて1つのundoChunkで行う
+		self.setupSessions()
 
+		# 別シーンが開かれたらウィンドウを閉じるscriptJobを登録する
+		self.otherSceneOpenedJob()
 
-		# 実行前にアクティブになっていたベースのcolorSetを保存しておく
-		curColorSetList = mc.polyColorSet(q=True, currentColorSet=True)
+		# Mayaのundo/redoでベースのcolorSetが戻った場合にミラーを読み込み直すscriptJobを登録する
+		self.undoRedoJob()
 
+		# 頂点カラーの変更を監視するコールバックを登録する
+		self.watchVertexColorNodes()
 
-		# colorSerがない場合生成する
-		if curColorSetList == None:
-			curColorSet = mc.polyColorSet(create=True, colorSet="colorSet", clamped=True, representation="RGBA")[0]
-		else:
-			curColorSet = curColorSetList[0]
 
-		self.baseColorSet = curColorSet
-		self.baseColorSerRep = mc.polyColorSet(q=True, currentColorSet=True, representation=True)
-		self.baseColorBeforeEdit = self.targetObjMesh.getVertexColors(self.baseColorSet)
+	#==============================================================================================
+	# 全メッシュのtmpColorSetを生成して、ベースのcolorSetの色を入れておく
+	# 色の読み込みまではここで行い、チャンネルへの分割はrunComputeTasksでバックグラウンドで計算する
+	# tmpColorSetの生成は分割の書き込みと同じundoのchunkで行う (applySetupSessions)
+	def setupSessions(self):
+		computeSessions = []
+		computeFuncs    = []
+		for session in self.sessions:
+			if self.isProgressiveSession(session) == True:
+				self.startProgressiveFill(session)
+			else:
+				computeSessions.append(session)
+				computeFuncs.append(self.prepareBaseVertexColorData(session))
+
+		self.runComputeTasks(computeFuncs, partial(self.applySetupSessions, computeSessions))
 
-		# self.baseColorSerRepで得たベースのcolorSetの種類を元に各色を表現するためのtempのcolorSetを追加
-		self.checkColorSet()
+		if self.fillTotal > 0:
+			self.fillTimer.start()
 
 
-		# 現在のcolorSetの色を取得して、各色のcolorSetを編集
-		# 中間オブジェクトある場合、そのcolorSet編集時にpolyColorPerVertexノードが作られる
-		self.getBaseVertexColorData()
+	#==============================================================================================
+	# setupSessionsの分割の計算結果を書き込む
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def applySetupSessions(self, sessions, results):
+		for session, result in zip(sessions, results):
+			# ベースのcolorSetの種類を元に各色を表現するためのtempのcolorSetを追加
+			# 遅延生成の場合は各チャンネルのボタンが押されたときに生成する
+			if self.lazyChannelColorSet == False:
+				self.checkColorSet(session)
 
+			# 各色のcolorSetを編集
+			# 中間オブジェクトある場合、そのcolorSet編集時にpolyColorPerVertexノードが作られる
+			session.engine.applySplit(result)
+			session.engine.flush()
+			self.updateColorNodes(session)
 
-		# 中間オブジェクトある場合、念のため途中でヒストリ削除されてノードが消えた時に復活させるjobを設定
-		if self.hasIntermediateObject == True:
-			self.setDeleteNodeJobs()
+			# 中間オブジェクトある場合、念のため途中でヒストリ削除されてノードが消えた時に復活させるjobを設定
+			if session.hasIntermediateObject == True:
+				self.setDeleteNodeJobs(session)
 
-		# 別シーンが開かれたらウィンドウを閉じるscriptJobを登録する
-		self.otherSceneOpenedJob()
+		if self.showChannelStats == True:
+			self.setStatsPanelVisible(True)
 
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_Base = mc.scriptJob(
-				attributeChange=["tmpColorSet_Base_Node.vertexColor", self.vtxColBase],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+	#==============================================================================================
+	# tmpColorSetをアイドル時に少しずつ書き込むメッシュか
+	def isProgressiveSession(self, session):
+		return (self.progressiveFill == True and self.lazyChannelColorSet == False and self.previewColorSetMode == False
+			and session.engine.backend.vertexCount() >= self.progressiveMinVertices)
 
-		else:
-			self.jobNum_attributeChange_Base = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColBase],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+
+	#==============================================================================================
+	# メッシュの全チャンネルを少しずつ書き込むように準備する (書き込みはfillTimerから呼ばれるprogressiveFillStepで行う)
+	@suspendSync
+	@openCloseChunk
+	def startProgressiveFill(self, session):
+		self.checkColorSet(session)
+
+		# tmpColorSet_Base_Nodeが必要な場合はベースだけ先に書き直しておく
+		if self.needsBaseColorNode(session) == True:
+			session.engine.split([], includeBase=True)
+			self.updateColorNodes(session)
+
+		session.engine.startProgressiveFill(session.engine.channels, session.engine.backend.selectedComponentIndices())
+		self.fillTotal += session.engine.fillRemaining()
+
+		if self.fillTimer is None:
+			self.fillTimer = QTimer(self)
+			self.fillTimer.setInterval(0)
+			self.fillTimer.timeout.connect(self.progressiveFillStep)
+
+
+	#==============================================================================================
+	# アイドル時に1チャンネル分のprogressiveChunkSize頂点を全メッシュに書き込む
+	# 表示中のチャンネルが書き込み途中ならそのチャンネルを、そうでなければR/G/B/Aの順に書き込む
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def progressiveFillStep(self):
+		fillingChannels = [c for c in colorBuffer.CHANNELS if any(c in session.engine.fillQueue for session in self.sessions)]
+		if len(fillingChannels) == 0:
+			self.fillTimer.stop()
+			self.fillTotal = 0
+			self.updateProgress(0, 0)
+			return
+
+		activeChannel = self.getActiveChannel()
+		channel = activeChannel if activeChannel in fillingChannels else fillingChannels[0]
+
+		for session in self.sessions:
+			if not channel in session.engine.fillQueue:
+				continue
+
+			remaining = session.engine.fillStep(channel, self.progressiveChunkSize)
+
+			# 最初の書き込みで作られたtmpColorSet_*_Nodeを登録し、書き込みが終わったら削除されたときのjobを設定
+			if session.hasIntermediateObject == True:
+				self.updateColorNodes(session)
+				if remaining == 0:
+					self.setDeleteNodeJob(session, channel)
+
+		self.updateProgress(self.fillTotal - sum(session.engine.fillRemaining() for session in self.sessions), self.fillTotal)
+
+
+	#==============================================================================================
+	# 計算 (Mayaに触らない関数) を実行し、結果のリストをapplyFuncに渡す
+	# backgroundComputeの場合は計算をスレッドプールで行い、その間は頂点カラーの同期を止めて通知を溜めておく
+	def runComputeTasks(self, computeFuncs, applyFunc):
+		if self.backgroundCompute == False:
+			applyFunc([computeFunc() for computeFunc in computeFuncs])
+			return
+
+		if self.backgroundTasks.isBusy() == True:
+			mc.warning("kkDisplayVertexColorSeparately : previous operation is still running")
+			return
+
+		self.syncDispatcher.hold()
+		self.setOperationButtonsEnabled(False)
+		try:
+			self.backgroundTasks.run(computeFuncs, applyFunc, self.computeTasksDone)
+		except Exception:
+			self.setOperationButtonsEnabled(True)
+			self.syncDispatcher.release()
+			raise
+
+
+	#==============================================================================================
+	# バックグラウンドの計算が終わったら (失敗した場合も) ボタンと同期を戻し、計算中に待たせていた処理を行う
+	def computeTasksDone(self):
+		try:
+			self.setOperationButtonsEnabled(True)
+		finally:
+			self.syncDispatcher.release()
+
+		if self.isUndoRefreshPending == True:
+			self.undoRedoChanged()
+
+		if self.isWorkingIndicesPending == True:
+			self.updateWorkingIndices()
+
+
+	#==============================================================================================
+	# 計算中に別の操作が始まらないように、チャンネルとrevertのボタンを無効化する
+	# (どのメッシュにも含まれないチャンネルのボタンは無効のまま)
+	def setOperationButtonsEnabled(self, enabled):
+		for channel in colorBuffer.CHANNELS:
+			hasChannel = any(session.hasChannel(channel) for session in self.sessions)
+			self.getChannelButton(channel).setEnabled(enabled == True and hasChannel == True)
+		self.uiFIle.btn_Revert.setEnabled(enabled)
+
+
+	#==============================================================================================
+	# バックグラウンドの計算の進捗を表示する (totalが0の場合は隠す)
+	def updateProgress(self, done, total):
+		if self.progressBar is None:
+			return
+
+		self.progressBar.setVisible(total > 0 and done < total)
+		self.progressBar.setMaximum(max(total, 1))
+		self.progressBar.setValue(done)
 
 
 	#==============================================================================================
@@ -212,7 +946,7 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 		self.setSignals()
 
 		# SelectedNameに選択オブジェクト名を表示
-		self.uiFIle.lineEdit_SelObj.setText(self.targetObj.name())
+		self.updateTargetObjName()
 
 		# 内蔵のpaintVertexColourツールアイコンをセットする
 		self.uiFIle.btn_PaintTool.setIcon(QIcon(':/paintVertexColour.png'))
@@ -226,6 +960,29 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 		region = QRegion(path.toFillPolygon().toPolygon())
 		self.setMask(region)
 
+		# プロファイル中はタイトルの下に直近の処理時間を表示する
+		if self.profileHotPath == True:
+			self.latencyLabel = QLabel(self.uiFIle)
+			self.latencyLabel.setGeometry(QRect(6, 18, 188, 14))
+			self.latencyLabel.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+			self.latencyLabel.setStyleSheet("color: rgb(255, 200, 0); font-size: 9px; background: transparent;")
+			self.profiler.listeners.append(self.updateLatencyLabel)
+
+		# バックグラウンドで計算している間だけ表示する進捗
+		self.progressBar = QProgressBar(self.uiFIle)
+		self.progressBar.setGeometry(QRect(6, 59, 190, 4))
+		self.progressBar.setTextVisible(False)
+		self.progressBar.setVisible(False)
+
+		# チャンネルの統計のパネル (最初の表示は分割が終わってからapplySetupSessionsで更新する)
+		self.statsPanel = ChannelStatsPanel(self)
+
+		# ストロークのundo/redo (ウィンドウにフォーカスがあるとき。ビューポートからはundoStroke / redoStrokeをホットキーに割り当てる)
+		if self.strokeUndo == True:
+			QShortcut(QKeySequence("Ctrl+Z"), self, self.undoStroke)
+			QShortcut(QKeySequence("Ctrl+Shift+Z"), self, self.redoStroke)
+			QShortcut(QKeySequence("Ctrl+Y"), self, self.redoStroke)
+
 
 	#==============================================================================================
 	# このウィンドウが閉じたときの処理
@@ -233,42 +990,37 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 		# 他のオブジェクトを選択している可能性もあるのでそのリストを取得しておき、
 		# 選択をターゲットに置き換えておく
 		selList = mc.ls(sl=True)
-		mc.select(self.targetObj.fullPathName(), replace=True)
+		targetObjList = [session.targetObj.fullPathName() for session in self.sessions]
+		mc.select(targetObjList, replace=True)
 
 		# ウィンドウのインスタンスをdeleteすることで登録したscriptJobもまとめて解除しておく
 		self.deleteInstances()
 
-		# ノード名変更のコールバックを削除
-		if self.callbackID_nameChanged:
-			om2.MNodeMessage.removeCallback(self.callbackID_nameChanged)
-			self.callbackID_nameChanged = None
-
-
-		# ターゲットオブジェクトの全colorSetリストを取得
-		allColorSetList = self.targetObjMesh.getColorSetNames()
-
-		# tmpColorSetを削除する
-		if "tmpColorSet_R" in allColorSetList:
-			mc.polyColorSet(delete=True, colorSet="tmpColorSet_R")
+		# 実行中のバックグラウンドの計算は結果を捨て、途中の書き込みも止める
+		self.backgroundTasks.close()
+		if not self.fillTimer is None:
+			self.fillTimer.stop()
 
-		if "tmpColorSet_G" in allColorSetList:
-			mc.polyColorSet(delete=True, colorSet="tmpColorSet_G")
+		self.statsPanel.close()
 
-		if "tmpColorSet_B" in allColorSetList:
-			mc.polyColorSet(delete=True, colorSet="tmpColorSet_B")
+		# 頂点カラーの変更を監視するコールバックを削除
+		self.syncDispatcher.removeCallbacks()
 
-		if "tmpColorSet_A" in allColorSetList:
-			mc.polyColorSet(delete=True, colorSet="tmpColorSet_A")
+		# プロファイルの記録を書き出しておく
+		if self.profileHotPath == True:
+			self.profiler.listeners = []
+			self.dumpProfile()
 
-		# displayColorsを元に戻しておく
-		mc.setAttr("%s.displayColors"%self.targetObjMesh.fullPathName(), self.attrDispColor)
+		# ノード名変更のコールバックとtmpColorSetを削除し、displayColorsを元に戻す
+		for session in self.sessions:
+			session.restore()
 
 		# colorMaterialChannelとmaterialBlendを元に戻しておく
 		mc.polyOptions(colorMaterialChannel=self.pOption_matChl, gl=False)
 		mc.polyOptions(materialBlend=self.pOption_matBld, gl=False)
 
 		# 最後にヒストリもきれいにしておく
-		historyDelete(self.targetObj.fullPathName(), False)
+		historyDelete(targetObjList, False)
 
 		# 選択を戻す
 		mc.select(selList, replace=True)
@@ -290,643 +1042,716 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 
 
 	#==============================================================================================
-	# 別のシーンが開かれたときに自動でこのウィンドウを閉じる
-	def otherSceneOpenedJob(self):
-		self.jobNum_otherSceneOpened = mc.scriptJob(
-			event=["SceneOpened", self.close],
-			parent="kkDisplayVertexColorSeparatelyWindow")
+	# ウィンドウの右クリックメニュー
+	# バックグラウンドの計算中は色を書き換える項目を無効にする
+	def contextMenuEvent(self, event):
+		isIdle = self.backgroundTasks.isBusy() == False
+
+		menu = QMenu(self)
+		menu.addAction("Export Channels...", self.exportChannels)
+		menu.addAction("Import Channels...", self.importChannels).setEnabled(isIdle)
+		menu.addSeparator()
+		channelOpsMenu = menu.addMenu("Channel Ops")
+		self.addChannelOpsMenu(channelOpsMenu)
+		channelOpsMenu.setEnabled(isIdle)
+		menu.addSeparator()
+
+		action = menu.addAction("Restrict to Component Selection")
+		action.setCheckable(True)
+		action.setChecked(self.componentSelectionMode)
+		action.toggled.connect(self.setComponentSelectionMode)
+
+		if self.strokeUndo == True:
+			menu.addAction("Undo Stroke", self.undoStroke).setEnabled(isIdle == True and self.strokeHistory.canUndo())
+			menu.addAction("Redo Stroke", self.redoStroke).setEnabled(isIdle == True and self.strokeHistory.canRedo())
+			menu.addSeparator()
+
+		action = menu.addAction("Show Channel Statistics")
+		action.setCheckable(True)
+		action.setChecked(self.statsPanel.isVisible())
+		action.toggled.connect(self.setStatsPanelVisible)
+
+		menu.exec_(event.globalPos())
 
 
 	#==============================================================================================
-	# ターゲットの名前が変更されたとき、表示名も変更を反映する
-	def targetObjNameChangedCallback(self, node, previous, *args):
-		dagNode = om2.MFnDagNode(node)
-		self.uiFIle.lineEdit_SelObj.setText(dagNode.name())
-		print("Target Name Changed : %s >> %s"%(previous, dagNode.name()))
+	# チャンネルの統計のパネルの表示を切り替える (表示するときに全チャンネルを更新する)
+	def setStatsPanelVisible(self, visible):
+		self.showChannelStats = visible
+		if visible == False:
+			self.statsPanel.hide()
+			return
 
+		self.statsPanel.move(self.frameGeometry().topRight() + QPoint(4, 0))
+		self.statsPanel.show()
+		self.updateStatsPanel()
 
-	#==============================================================================================
-	# シグナルの設定
-	def setSignals(self):
-		# colorSetの種類がRGBかRGBAじゃない場合無効化
-		if self.baseColorSerRep == "RGB" or self.baseColorSerRep == "RGBA":
-			self.uiFIle.btn_R.toggled.connect(self.vtxR_Toggle)
-			self.uiFIle.btn_G.toggled.connect(self.vtxG_Toggle)
-			self.uiFIle.btn_B.toggled.connect(self.vtxB_Toggle)
-		else:
-			self.uiFIle.btn_R.setEnabled(False)
-			self.uiFIle.btn_G.setEnabled(False)
-			self.uiFIle.btn_B.setEnabled(False)
 
-		# colorSetの種類がRGBかRGBAじゃない場合無効化
-		if self.baseColorSerRep == "RGBA" or self.baseColorSerRep == "A":
-			self.uiFIle.btn_A.toggled.connect(self.vtxA_Toggle)
-		else:
-			self.uiFIle.btn_A.setEnabled(False)
+	#==============================================================================================
+	# チャンネルの統計のパネルを更新する (channelsを指定しない場合は全チャンネル)
+	# 分割済みのチャンネルはエンジンがキャッシュしている統計を使うので、全頂点を調べ直すことはない
+	def updateStatsPanel(self, channels=None):
+		if self.statsPanel is None or self.statsPanel.isVisible() == False:
+			return
 
-		self.uiFIle.btn_Revert.clicked.connect(self.revert)
+		stats = {}
+		with self.profiler.phase("updateStatsPanel"):
+			for channel in (colorBuffer.CHANNELS if channels is None else channels):
+				statsList = [session.engine.getChannelStats(channel) for session in self.sessions if session.hasChannel(channel) == True]
+				if len(statsList) == 1:
+					stats[channel] = statsList[0]
+				elif len(statsList) > 1:
+					stats[channel] = channelStats.merged(statsList)
 
-		self.uiFIle.btn_PaintTool.clicked.connect(self.selectPaintTool)
-
-		self.uiFIle.btn_Close.clicked.connect(self.close)
+		self.statsPanel.setStats(stats)
 
 
 	#==============================================================================================
-	# Rのボタンがクリックされたときの処理を設定
-	def vtxR_Toggle(self, checked):
-		if checked:
-			self.uiFIle.btn_R.setGeometry(self.btn_R_checkOnRect)
-
-			self.uiFIle.btn_G.setChecked(False)
-			self.uiFIle.btn_G.setGeometry(self.btn_G_checkOffRect)
-			self.uiFIle.btn_B.setChecked(False)
-			self.uiFIle.btn_B.setGeometry(self.btn_B_checkOffRect)
-			self.uiFIle.btn_A.setChecked(False)
-			self.uiFIle.btn_A.setGeometry(self.btn_A_checkOffRect)
-
-			if self.hasIntermediateObject == True:
-				# もしtmpColorSet_R_Nodeがない場合getBaseVertexColorDataで生成し直す
-				if len(mc.ls("tmpColorSet_R_Node")) == 0:
-					self.getBaseVertexColorData()
-
-				self.jobNum_attributeChange_R = mc.scriptJob(
-					attributeChange=["tmpColorSet_R_Node.vertexColor", self.vtxColSep_R],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
+	# 選択中のコンポーネントだけを作業対象にするかを切り替える
+	# ONの間は選択が変わるたびに作業対象を更新する
+	def setComponentSelectionMode(self, enabled):
+		self.componentSelectionMode = enabled
 
-			else:
-				self.jobNum_attributeChange_R = mc.scriptJob(
-					attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_R],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
+		if self.jobNum_selectionChanged > 0:
+			mc.scriptJob(kill=self.jobNum_selectionChanged, force=True)
+			self.jobNum_selectionChanged = 0
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_R")
+		if enabled == True:
+			self.jobNum_selectionChanged = mc.scriptJob(
+				event=["SelectionChanged", self.updateWorkingIndices],
+				parent="kkDisplayVertexColorSeparatelyWindow")
 
-		else:
-			if self.jobNum_attributeChange_R > 0:
-				mc.scriptJob(kill=self.jobNum_attributeChange_R, force=True)
-				self.jobNum_attributeChange_R = 0
+		self.updateWorkingIndices()
 
-			self.uiFIle.btn_R.setChecked(False)
-			self.uiFIle.btn_R.setGeometry(self.btn_R_checkOffRect)
 
-			# RGBAすべてOFFの場合ベースのcolorSetに戻す
-			if self.uiFIle.btn_R.isChecked() == False and self.uiFIle.btn_G.isChecked() == False and\
-				self.uiFIle.btn_B.isChecked() == False and self.uiFIle.btn_A.isChecked() == False:
-				self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
+	#==============================================================================================
+	# 各メッシュの作業対象の頂点を選択中のコンポーネントに更新する
+	# 作業対象の外で変わっていたベースの頂点があれば、ここでtmpColorSetが書き直される
+	def updateWorkingIndices(self):
+		# バックグラウンドの計算中は、結果を書き込んだ後に更新する
+		if self.backgroundTasks.isBusy() == True:
+			self.isWorkingIndicesPending = True
+			return
+		self.isWorkingIndicesPending = False
+
+		self.applyWorkingIndices()
+
+	@suspendSync
+	@openCloseChunk
+	def applyWorkingIndices(self):
+		for session in self.sessions:
+			if self.componentSelectionMode == True:
+				dirtyIdx = session.engine.setWorkingIndices(session.engine.backend.selectedComponentIndices())
+			else:
+				dirtyIdx = session.engine.setWorkingIndices(None)
+
+			if dirtyIdx is None or len(dirtyIdx) > 0:
+				self.updateColorNodes(session)
 
 
 	#==============================================================================================
-	# Gのボタンがクリックされたときの処理を設定
-	def vtxG_Toggle(self, checked):
-		if checked:
-			self.uiFIle.btn_G.setGeometry(self.btn_G_checkOnRect)
-
-			self.uiFIle.btn_R.setChecked(False)
-			self.uiFIle.btn_R.setGeometry(self.btn_R_checkOffRect)
-			self.uiFIle.btn_B.setChecked(False)
-			self.uiFIle.btn_B.setGeometry(self.btn_B_checkOffRect)
-			self.uiFIle.btn_A.setChecked(False)
-			self.uiFIle.btn_A.setGeometry(self.btn_A_checkOffRect)
-
-			if self.hasIntermediateObject == True:
-				# もしtmpColorSet_G_Nodeがない場合getBaseVertexColorDataで生成し直す
-				if len(mc.ls("tmpColorSet_G_Node")) == 0:
-					self.getBaseVertexColorData()
-
-				self.jobNum_attributeChange_G = mc.scriptJob(
-					attributeChange=["tmpColorSet_G_Node.vertexColor", self.vtxColSep_G],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
+	# チャンネルごとの一括操作のメニュー (いずれかのメッシュのベースに含まれるチャンネルだけ表示する)
+	def addChannelOpsMenu(self, menu):
+		channels = [c for c in colorBuffer.CHANNELS if any(session.hasChannel(c) for session in self.sessions)]
+		for channel in channels:
+			channelMenu = menu.addMenu(channel)
+			channelMenu.addAction("Fill...",   partial(self.askChannelOp, channel, "fill"))
+			channelMenu.addAction("Invert",    partial(self.applyChannelOp, channel, "invert"))
+			channelMenu.addAction("Levels...", partial(self.askChannelOp, channel, "levels"))
+			channelMenu.addAction("Clamp...",  partial(self.askChannelOp, channel, "clamp"))
+			channelMenu.addAction("Remap...",  partial(self.askChannelOp, channel, "remap"))
+
+			others = [c for c in channels if not c == channel]
+			copyMenu = channelMenu.addMenu("Copy to")
+			swapMenu = channelMenu.addMenu("Swap with")
+			for other in others:
+				copyMenu.addAction(other, partial(self.copyChannel, channel, other))
+				swapMenu.addAction(other, partial(self.swapChannels, channel, other))
 
-			else:
-				self.jobNum_attributeChange_G = mc.scriptJob(
-					attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_G],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_G")
+	#==============================================================================================
+	# 操作のパラメータを入力してもらってから実行する (キャンセルされたら何もしない)
+	@skipWhileBusy
+	def askChannelOp(self, channel, operation):
+		title = "%s : %s"%(operation.capitalize(), channel)
+		try:
+			if operation == "fill":
+				value, ok = QInputDialog.getDouble(self, title, "Value", 0.0, 0.0, 1.0, 3)
+				args = [value]
+			elif operation == "levels":
+				text, ok = QInputDialog.getText(self, title, "In Low, In High, Gamma, Out Low, Out High", text="0, 1, 1, 0, 1")
+				args = [float(v) for v in text.split(",")] if ok == True else []
+			elif operation == "clamp":
+				text, ok = QInputDialog.getText(self, title, "Low, High", text="0, 1")
+				args = [float(v) for v in text.split(",")] if ok == True else []
+			else:
+				text, ok = QInputDialog.getText(self, title, "Curve (in:out, ...)", text="0:0, 1:1")
+				args = [channelOps.parseCurve(text)] if ok == True else []
+		except ValueError as e:
+			mc.warning("Invalid parameters : %s"%e)
+			return
 
-		else:
-			if self.jobNum_attributeChange_G > 0:
-				mc.scriptJob(kill=self.jobNum_attributeChange_G, force=True)
-				self.jobNum_attributeChange_G = 0
+		if ok == True:
+			self.applyChannelOp(channel, operation, *args)
 
-			self.uiFIle.btn_G.setChecked(False)
-			self.uiFIle.btn_G.setGeometry(self.btn_G_checkOffRect)
 
-			# RGBAすべてOFFの場合ベースのcolorSetに戻す
-			if self.uiFIle.btn_R.isChecked() == False and self.uiFIle.btn_G.isChecked() == False and\
-				self.uiFIle.btn_B.isChecked() == False and self.uiFIle.btn_A.isChecked() == False:
-				self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
+	#==============================================================================================
+	# ベースのチャンネルに操作をかけ、そのチャンネルのtmpColorSetだけを書き直す (全メッシュで1回のundo)
+	# 例 : window.applyChannelOp("A", "levels", 0.1, 0.9, 1.2)
+	@skipWhileBusy
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def applyChannelOp(self, channel, operation, *args):
+		for session in self.sessions:
+			if session.hasChannel(channel) == True:
+				session.engine.applyChannelOp(channel, operation, *args)
+		self.updateStatsPanel([channel])
 
 
 	#==============================================================================================
-	# Bのボタンがクリックされたときの処理を設定
-	def vtxB_Toggle(self, checked):
-		if checked:
-			self.uiFIle.btn_B.setGeometry(self.btn_B_checkOnRect)
-
-			self.uiFIle.btn_R.setChecked(False)
-			self.uiFIle.btn_R.setGeometry(self.btn_R_checkOffRect)
-			self.uiFIle.btn_G.setChecked(False)
-			self.uiFIle.btn_G.setGeometry(self.btn_G_checkOffRect)
-			self.uiFIle.btn_A.setChecked(False)
-			self.uiFIle.btn_A.setGeometry(self.btn_A_checkOffRect)
-
-			if self.hasIntermediateObject == True:
-				# もしtmpColorSet_B_Nodeがない場合getBaseVertexColorDataで生成し直す
-				if len(mc.ls("tmpColorSet_B_Node")) == 0:
-					self.getBaseVertexColorData()
-
-				self.jobNum_attributeChange_B = mc.scriptJob(
-					attributeChange=["tmpColorSet_B_Node.vertexColor", self.vtxColSep_B],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
-
-			else:
-				self.jobNum_attributeChange_B = mc.scriptJob(
-					attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_B],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
+	# sourceChannelの値をtargetChannelにコピーする
+	@skipWhileBusy
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def copyChannel(self, sourceChannel, targetChannel):
+		for session in self.sessions:
+			if session.hasChannel(sourceChannel) == True and session.hasChannel(targetChannel) == True:
+				session.engine.copyChannel(sourceChannel, targetChannel)
+		self.updateStatsPanel([targetChannel])
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_B")
 
-		else:
-			if self.jobNum_attributeChange_B > 0:
-				mc.scriptJob(kill=self.jobNum_attributeChange_B, force=True)
-				self.jobNum_attributeChange_B = 0
+	#==============================================================================================
+	# 2つのチャンネルの値を入れ替える
+	@skipWhileBusy
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def swapChannels(self, channelA, channelB):
+		for session in self.sessions:
+			if session.hasChannel(channelA) == True and session.hasChannel(channelB) == True:
+				session.engine.swapChannels(channelA, channelB)
+		self.updateStatsPanel([channelA, channelB])
 
-			self.uiFIle.btn_B.setChecked(False)
-			self.uiFIle.btn_B.setGeometry(self.btn_B_checkOffRect)
 
-			# RGBAすべてOFFの場合ベースのcolorSetに戻す
-			if self.uiFIle.btn_R.isChecked() == False and self.uiFIle.btn_G.isChecked() == False and\
-				self.uiFIle.btn_B.isChecked() == False and self.uiFIle.btn_A.isChecked() == False:
-				self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
+	#==============================================================================================
+	# 別のシーンが開かれたときに自動でこのウィンドウを閉じる
+	def otherSceneOpenedJob(self):
+		self.jobNum_otherSceneOpened = mc.scriptJob(
+			event=["SceneOpened", self.close],
+			parent="kkDisplayVertexColorSeparatelyWindow")
 
 
 	#==============================================================================================
-	# Aのボタンがクリックされたときの処理を設定
-	def vtxA_Toggle(self, checked):
-		if checked:
-			self.uiFIle.btn_A.setGeometry(self.btn_A_checkOnRect)
-
-			self.uiFIle.btn_R.setChecked(False)
-			self.uiFIle.btn_R.setGeometry(self.btn_R_checkOffRect)
-			self.uiFIle.btn_G.setChecked(False)
-			self.uiFIle.btn_G.setGeometry(self.btn_G_checkOffRect)
-			self.uiFIle.btn_B.setChecked(False)
-			self.uiFIle.btn_B.setGeometry(self.btn_B_checkOffRect)
-
-			if self.hasIntermediateObject == True:
-				# もしtmpColorSet_A_Nodeがない場合getBaseVertexColorDataで生成し直す
-				if len(mc.ls("tmpColorSet_A_Node")) == 0:
-					self.getBaseVertexColorData()
-
-				self.jobNum_attributeChange_A = mc.scriptJob(
-					attributeChange=["tmpColorSet_A_Node.vertexColor", self.vtxColSep_A],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
+	# Mayaのundo/redoでrevertやチャンネル操作が戻された場合、チャンネルを表示中でもベースのcolorSetが変わるので、
+	# 全メッシュのミラーを読み込み直して変わった頂点だけtmpColorSetを書き直す
+	def undoRedoJob(self):
+		mc.scriptJob(event=["Undo", self.undoRedoChanged], parent="kkDisplayVertexColorSeparatelyWindow")
+		mc.scriptJob(event=["Redo", self.undoRedoChanged], parent="kkDisplayVertexColorSeparatelyWindow")
 
-			else:
-				self.jobNum_attributeChange_A = mc.scriptJob(
-					attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_A],
-					allChildren=True,
-					parent="kkDisplayVertexColorSeparatelyWindow",
-					compressUndo=True,
-					runOnce=True)
 
+	#==============================================================================================
+	# undo/redoで届いたtmpColorSetの変更通知は、ミラーを読み込み直した後に同期する
+	# (先に同期すると古いミラーの行がベースに書き戻されてしまう)
+	# 書き直しはMayaのundoに記録しない (記録するとredoできなくなる)
+	def undoRedoChanged(self):
+		# バックグラウンドの計算中は、結果を書き込んだ後に読み込み直す
+		if self.backgroundTasks.isBusy() == True:
+			self.isUndoRefreshPending = True
+			return
+		self.isUndoRefreshPending = False
+
+		self.syncDispatcher.hold()
+		try:
+			with undoSuspended():
+				for session in self.sessions:
+					self.refreshBase(session)
+		finally:
+			self.syncDispatcher.release()
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_A")
 
-		else:
-			if self.jobNum_attributeChange_A > 0:
-				mc.scriptJob(kill=self.jobNum_attributeChange_A, force=True)
-				self.jobNum_attributeChange_A = 0
+	#==============================================================================================
+	# ターゲットの名前が変更されたとき、表示名も変更を反映する
+	def targetObjNameChangedCallback(self, node, previous, *args):
+		dagNode = om2.MFnDagNode(node)
+		self.updateTargetObjName()
+		print("Target Name Changed : %s >> %s"%(previous, dagNode.name()))
 
-			self.uiFIle.btn_A.setChecked(False)
-			self.uiFIle.btn_A.setGeometry(10, 205, 180, 40)
 
-			# RGBAすべてOFFの場合ベースのcolorSetに戻す
-			if self.uiFIle.btn_R.isChecked() == False and self.uiFIle.btn_G.isChecked() == False and\
-				self.uiFIle.btn_B.isChecked() == False and self.uiFIle.btn_A.isChecked() == False:
-				self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
+	#==============================================================================================
+	# SelectedNameにターゲット名を表示する (複数の場合は先頭の名前と残りの数)
+	def updateTargetObjName(self):
+		targetName = self.sessions[0].targetObj.name()
+		if len(self.sessions) > 1:
+			targetName = "%s (+%d)"%(targetName, len(self.sessions) - 1)
+
+		self.uiFIle.lineEdit_SelObj.setText(targetName)
+		self.uiFIle.lineEdit_SelObj.setToolTip("\n".join(session.targetObj.name() for session in self.sessions))
 
 
 	#==============================================================================================
-	# revertのボタンがクリックされたときの処理を設定
-	def revert(self):
-		vtxCount = self.targetObjMesh.numVertices
-		if not self.targetObjVtxCount == vtxCount:
-			self.targetObjVtxIdxList = xrange(vtxCount)
+	# シグナルの設定
+	def setSignals(self):
+		# どのメッシュのcolorSetの種類にも含まれないチャンネルのボタンは無効化
+		for channel in colorBuffer.CHANNELS:
+			if any(session.hasChannel(channel) for session in self.sessions):
+				self.getChannelButton(channel).toggled.connect(partial(self.vtxChannelToggle, channel))
+			else:
+				self.getChannelButton(channel).setEnabled(False)
 
-		self.targetObjMesh.setVertexColors(self.baseColorBeforeEdit, self.targetObjVtxIdxList)
+		self.uiFIle.btn_Revert.clicked.connect(self.revert)
 
-		self.getBaseVertexColorData()
+		# revertボタンの右クリックでチェックポイントの保存と復元を行う
+		self.uiFIle.btn_Revert.setContextMenuPolicy(Qt.CustomContextMenu)
+		self.uiFIle.btn_Revert.customContextMenuRequested.connect(self.showRevertMenu)
 
+		self.uiFIle.btn_PaintTool.clicked.connect(self.selectPaintTool)
 
-	#==============================================================================================
-	# paintToolのボタンがクリックされたときの処理を設定
-	def selectPaintTool(self):
-		mel.eval("PaintVertexColorTool;")
+		self.uiFIle.btn_Close.clicked.connect(self.close)
 
 
 	#==============================================================================================
-	# tmpColorSet_RのvertexColorのattributeChangeによるscriptJobの処理を設定
+	# R/G/B/Aのボタンがクリックされたときの処理を設定
+	# 全メッシュの表示を切り替える (チャンネルを持たないメッシュはベースのcolorSetを表示)
+	@suspendSync
 	@openCloseChunk
-	def vtxColSep_R(self):
-		if self.uiFIle.btn_R.isChecked() == True:
+	def vtxChannelToggle(self, channel, checked):
+		# 切り替え前のペイントはsuspendSyncで同期済みなので、ここでストロークを区切る
+		self.closeStroke()
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_R")
-			vtxColors_tmpColorSet_R = self.targetObjMesh.getVertexColors("tmpColorSet_R")
+		button = self.getChannelButton(channel)
 
-			baseVtxColors_Edit_R = self.targetObjMesh.getVertexColors(self.baseColorSet)
-
-			vtxCount = self.targetObjMesh.numVertices
-			if not self.targetObjVtxCount == vtxCount:
-				self.targetObjVtxIdxList = xrange(vtxCount)
+		if checked:
+			button.setGeometry(getattr(self, "btn_%s_checkOnRect"%channel))
 
-			for x in xrange(vtxCount):
-				vtxColors_tmpColorSet_R[x].r = vtxColors_tmpColorSet_R[x].r
-				vtxColors_tmpColorSet_R[x].g = vtxColors_tmpColorSet_R[x].r
-				vtxColors_tmpColorSet_R[x].b = vtxColors_tmpColorSet_R[x].r
+			for otherChannel in colorBuffer.CHANNELS:
+				if otherChannel == channel:
+					continue
+				otherButton = self.getChannelButton(otherChannel)
+				otherButton.setChecked(False)
+				otherButton.setGeometry(getattr(self, "btn_%s_checkOffRect"%otherChannel))
 
-				# 変更のあったRをベースに反映するために上書き
-				baseVtxColors_Edit_R[x].r = vtxColors_tmpColorSet_R[x].r
+			for session in self.sessions:
+				if session.hasChannel(channel) == False:
+					session.engine.setActiveChannel(None)
+					continue
 
-			self.targetObjMesh.setVertexColors(vtxColors_tmpColorSet_R, self.targetObjVtxIdxList)
+				# 遅延生成の場合、初めて表示するチャンネルのtmpColorSetをここで生成する
+				if not channel in session.engine.materializedChannels:
+					self.materializeChannel(session, channel)
 
-			# colorSetをベースに変更して、ベースに色を反映する
-			self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
-			self.targetObjMesh.setVertexColors(baseVtxColors_Edit_R, self.targetObjVtxIdxList)
+				elif session.hasIntermediateObject == True and not channel in session.engine.fillQueue:
+					# もしtmpColorSet_*_Nodeがない場合getBaseVertexColorDataで生成し直す
+					# (書き込み途中のチャンネルはノードがまだないこともあるので除く)
+					if session.colorNodeExists(session.engine.channelColorSetName(channel)) == False:
+						self.getBaseVertexColorData(session, [channel])
 
-			# colorSetを戻しておく
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_R")
+				# 共有のtmpColorSet_Previewの場合は、ここでキャッシュから表示するチャンネルの値が書き込まれる
+				session.engine.setActiveChannel(channel)
 
+			self.channelLastViewedTime[channel] = time.time()
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_R = mc.scriptJob(
-				attributeChange=["tmpColorSet_R_Node.vertexColor", self.vtxColSep_R],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+			# しばらく表示していないチャンネルのtmpColorSetは削除しておく
+			self.dropIdleChannels()
 
 		else:
-			self.jobNum_attributeChange_R = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_R],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+			button.setChecked(False)
+			button.setGeometry(getattr(self, "btn_%s_checkOffRect"%channel))
+
+			self.channelLastViewedTime[channel] = time.time()
+
+			# RGBAすべてOFFの場合ベースのcolorSetに戻す
+			if self.getActiveChannel() is None:
+				for session in self.sessions:
+					session.engine.setActiveChannel(None)
 
 
 	#==============================================================================================
-	# tmpColorSet_GのvertexColorのattributeChangeによるscriptJobの処理を設定
-	@openCloseChunk
-	def vtxColSep_G(self):
-		if self.uiFIle.btn_G.isChecked() == True:
+	# チャンネルのtmpColorSetを生成して、ベースのcolorSetの値を入れておく
+	def materializeChannel(self, session, channel):
+		self.checkColorSet(session, [channel])
+		self.getBaseVertexColorData(session, [channel])
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_G")
-			vtxColors_tmpColorSet_G = self.targetObjMesh.getVertexColors("tmpColorSet_G")
+		if session.hasIntermediateObject == True:
+			self.setDeleteNodeJob(session, channel)
 
-			baseVtxColors_Edit_G = self.targetObjMesh.getVertexColors(self.baseColorSet)
 
-			vtxCount = self.targetObjMesh.numVertices
-			if not self.targetObjVtxCount == vtxCount:
-				self.targetObjVtxIdxList = xrange(vtxCount)
+	#==============================================================================================
+	# 遅延生成の場合、lazyChannelDropSec以上表示していないチャンネルのtmpColorSetを削除する
+	# 削除したチャンネルは次にボタンが押されたときにmaterializeChannelで作り直される
+	def dropIdleChannels(self):
+		if self.lazyChannelColorSet == False or self.previewColorSetMode == True:
+			return
 
-			for x in xrange(vtxCount):
-				vtxColors_tmpColorSet_G[x].r = vtxColors_tmpColorSet_G[x].r
-				vtxColors_tmpColorSet_G[x].g = vtxColors_tmpColorSet_G[x].r
-				vtxColors_tmpColorSet_G[x].b = vtxColors_tmpColorSet_G[x].r
+		now = time.time()
+		for channel in colorBuffer.CHANNELS:
+			if self.getChannelButton(channel).isChecked() == True:
+				continue
 
-				# 変更のあったGをベースに反映するために上書き
-				baseVtxColors_Edit_G[x].g = vtxColors_tmpColorSet_G[x].r
+			if now - self.channelLastViewedTime.get(channel, now) < self.lazyChannelDropSec:
+				continue
 
-			self.targetObjMesh.setVertexColors(vtxColors_tmpColorSet_G, self.targetObjVtxIdxList)
+			for session in self.sessions:
+				if not channel in session.engine.materializedChannels:
+					continue
 
-			# colorSetをベースに変更して、ベースに色を反映する
-			self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
-			self.targetObjMesh.setVertexColors(baseVtxColors_Edit_G, self.targetObjVtxIdxList)
+				# tmpColorSet_*_Nodeの削除でgetBaseVertexColorDataが走らないように先にscriptJobを解除
+				tmpColorSet = session.engine.channelColorSetName(channel)
+				if session.jobNum_nodeDeleted.get(tmpColorSet, 0) > 0:
+					mc.scriptJob(kill=session.jobNum_nodeDeleted[tmpColorSet], force=True)
+					session.jobNum_nodeDeleted[tmpColorSet] = 0
 
-			# colorSetを戻しておく
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_G")
+				session.engine.dropChannel(channel)
 
+			self.channelLastViewedTime.pop(channel, None)
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_G = mc.scriptJob(
-				attributeChange=["tmpColorSet_G_Node.vertexColor", self.vtxColSep_G],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
 
-		else:
-			self.jobNum_attributeChange_G = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_G],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+	#==============================================================================================
+	# ボタンがONになっているチャンネルを返す (すべてOFFの場合はNone)
+	def getActiveChannel(self):
+		for channel in colorBuffer.CHANNELS:
+			if self.getChannelButton(channel).isChecked() == True:
+				return channel
+		return None
 
 
 	#==============================================================================================
-	# tmpColorSet_BのvertexColorのattributeChangeによるscriptJobの処理を設定
-	@openCloseChunk
-	def vtxColSep_B(self):
-		if self.uiFIle.btn_B.isChecked() == True:
+	# revertのボタンがクリックされたときの処理を設定 (編集前に戻す)
+	def revert(self):
+		self.revertToCheckpoint(BEFORE_EDIT_SNAPSHOT)
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_B")
-			vtxColors_tmpColorSet_B = self.targetObjMesh.getVertexColors("tmpColorSet_B")
 
-			baseVtxColors_Edit_B = self.targetObjMesh.getVertexColors(self.baseColorSet)
+	#==============================================================================================
+	# チェックポイントに戻す (全メッシュをまとめて1回のundoで戻せるようにする)
+	# チェックポイントとの比較はrunComputeTasksでバックグラウンドで行い、違う頂点だけが書き込まれる
+	@skipWhileBusy
+	def revertToCheckpoint(self, name):
+		# 計算を始める前に、まだ同期していないペイントをベースに書き戻しておく
+		self.syncDispatcher.flushPending()
 
-			vtxCount = self.targetObjMesh.numVertices
-			if not self.targetObjVtxCount == vtxCount:
-				self.targetObjVtxIdxList = xrange(vtxCount)
+		computeFuncs = []
+		for session in self.sessions:
+			session.engine.getBaseMirror()
+			computeFuncs.append(partial(session.engine.computeRevert, name))
 
-			for x in xrange(vtxCount):
-				vtxColors_tmpColorSet_B[x].r = vtxColors_tmpColorSet_B[x].r
-				vtxColors_tmpColorSet_B[x].g = vtxColors_tmpColorSet_B[x].r
-				vtxColors_tmpColorSet_B[x].b = vtxColors_tmpColorSet_B[x].r
+		self.runComputeTasks(computeFuncs, self.applyRevert)
 
-				# 変更のあったBをベースに反映するために上書き
-				baseVtxColors_Edit_B[x].b = vtxColors_tmpColorSet_B[x].r
 
-			self.targetObjMesh.setVertexColors(vtxColors_tmpColorSet_B, self.targetObjVtxIdxList)
+	#==============================================================================================
+	# revertの計算結果を書き込む
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def applyRevert(self, results):
+		for session, result in zip(self.sessions, results):
+			session.engine.applyRevert(result)
+		self.updateStatsPanel()
 
-			# colorSetをベースに変更して、ベースに色を反映する
-			self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
-			self.targetObjMesh.setVertexColors(baseVtxColors_Edit_B, self.targetObjVtxIdxList)
 
-			# colorSetを戻しておく
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_B")
+	#==============================================================================================
+	# 全メッシュの現在の色をチェックポイントとして保存する
+	# バックグラウンドの計算中は、書き込まれる前の色を保存してしまうので実行しない
+	@skipWhileBusy
+	def saveCheckpoint(self):
+		name = "Checkpoint %d (%s)"%(len(self.checkpointNames) + 1, time.strftime("%H:%M:%S"))
+		for session in self.sessions:
+			session.engine.saveCheckpoint(name)
+		self.checkpointNames.append(name)
 
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_B = mc.scriptJob(
-				attributeChange=["tmpColorSet_B_Node.vertexColor", self.vtxColSep_B],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+	#==============================================================================================
+	# revertボタンの右クリックメニュー
+	# 容量オーバーでどのメッシュからも削除されたチェックポイントは表示しない
+	# バックグラウンドの計算中はチェックポイントの保存とrevertの項目を無効にする
+	def showRevertMenu(self, pos):
+		isIdle = self.backgroundTasks.isBusy() == False
 
-		else:
-			self.jobNum_attributeChange_B = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_B],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+		menu = QMenu(self)
+		menu.addAction("Save Checkpoint", self.saveCheckpoint).setEnabled(isIdle)
+		menu.addSeparator()
+
+		self.checkpointNames = [name for name in self.checkpointNames
+			if any(name in session.engine.snapshots for session in self.sessions)]
+		for name in reversed(self.checkpointNames):
+			menu.addAction("Revert to %s"%name, partial(self.revertToCheckpoint, name)).setEnabled(isIdle)
+
+		menu.addAction("Revert to %s"%BEFORE_EDIT_SNAPSHOT, self.revert).setEnabled(isIdle)
+		menu.exec_(self.uiFIle.btn_Revert.mapToGlobal(pos))
+
+
+	#==============================================================================================
+	# paintToolのボタンがクリックされたときの処理を設定
+	def selectPaintTool(self):
+		self.closeStroke()
+		mel.eval("PaintVertexColorTool;")
 
 
 	#==============================================================================================
-	# tmpColorSet_AのvertexColorのattributeChangeによるscriptJobの処理を設定
+	# tmpColorSet_R/G/B/AのvertexColorの変更通知による処理を設定
+	# 前回同期した値と比べて変更のあった頂点だけ、tmpColorSetのRをベースの該当チャンネルへコピーし、
+	# tmpColorSetはRでグレースケールにし直す
 	@openCloseChunk
-	def vtxColSep_A(self):
-		if self.uiFIle.btn_A.isChecked() == True:
+	def vtxColSep(self, session, channel):
+		if session.hasChannel(channel) == True:
+			with self.profiler.operation("vtxColSep_%s"%channel):
+				with undoSuspended(self.strokeUndo):
+					session.engine.syncChannel(channel)
 
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_A")
-			vtxColors_tmpColorSet_A = self.targetObjMesh.getVertexColors("tmpColorSet_A")
 
-			baseVtxColors_Edit_A = self.targetObjMesh.getVertexColors(self.baseColorSet)
+	#==============================================================================================
+	# 直前のストロークを戻す / やり直す (StrokeHistoryに記録した差分を書き戻すだけなので、Mayaのundoには記録しない)
+	@skipWhileBusy
+	@suspendSync
+	@profileOperation
+	def undoStroke(self):
+		if self.strokeHistory is None:
+			return
+		self.applyStrokeValues(self.strokeHistory.undo())
+
+	@skipWhileBusy
+	@suspendSync
+	@profileOperation
+	def redoStroke(self):
+		if self.strokeHistory is None:
+			return
+		self.applyStrokeValues(self.strokeHistory.redo())
+
 
-			vtxCount = self.targetObjMesh.numVertices
-			if not self.targetObjVtxCount == vtxCount:
-				self.targetObjVtxIdxList = xrange(vtxCount)
+	#==============================================================================================
+	# 次の同期を新しいストロークとして記録する (チャンネルの切り替えやペイントツールの選択で呼ぶ)
+	def closeStroke(self):
+		if not self.strokeHistory is None:
+			self.strokeHistory.closeStroke()
 
-			for x in xrange(vtxCount):
-				vtxColors_tmpColorSet_A[x].r = vtxColors_tmpColorSet_A[x].r
-				vtxColors_tmpColorSet_A[x].g = vtxColors_tmpColorSet_A[x].r
-				vtxColors_tmpColorSet_A[x].b = vtxColors_tmpColorSet_A[x].r
 
-				# 変更のあったBをベースに反映するために上書き
-				baseVtxColors_Edit_A[x].a = vtxColors_tmpColorSet_A[x].r
+	#==============================================================================================
+	# StrokeHistoryのundo/redoが返した (ChannelEngine, channel, indices, values) を書き戻す
+	def applyStrokeValues(self, strokeValues):
+		if strokeValues is None:
+			mc.warning("kkDisplayVertexColorSeparately : no stroke to undo / redo")
+			return
 
-			self.targetObjMesh.setVertexColors(vtxColors_tmpColorSet_A, self.targetObjVtxIdxList)
+		with undoSuspended():
+			for engine, channel, indices, values in strokeValues:
+				engine.applyStrokeValues(channel, indices, values)
 
-			# colorSetをベースに変更して、ベースに色を反映する
-			self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
-			self.targetObjMesh.setVertexColors(baseVtxColors_Edit_A, self.targetObjVtxIdxList)
+		self.updateStatsPanel(colorBuffer.uniqueList(channel for _, channel, _, _ in strokeValues))
 
-			# colorSetを戻しておく
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_A")
 
+	#==============================================================================================
+	# SyncDispatcherから呼ばれる頂点カラーの変更通知の処理
+	# 通知のあったメッシュだけ、表示中のチャンネルがあればその同期、すべてOFFの場合はベースの変更として処理する
+	# 表示中のチャンネルはボタンではなくエンジンのものを使う
+	# (チャンネルの切り替え直前にflushPendingで呼ばれた場合も、通知のあった切り替え前のチャンネルを同期する)
+	def vtxColChanged(self, sessionSet):
+		statsChannels = []
+		for session in self.sessions:
+			if not session in sessionSet:
+				continue
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_A = mc.scriptJob(
-				attributeChange=["tmpColorSet_A_Node.vertexColor", self.vtxColSep_A],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+			activeChannel = session.engine.activeChannel
+			operationName = "vtxColBase" if activeChannel is None else "vtxColSep_%s"%activeChannel
 
-		else:
-			self.jobNum_attributeChange_A = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColSep_A],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+			# 監視対象の更新も含めて1回の操作として記録する
+			with self.profiler.operation(operationName):
+				if activeChannel is None:
+					self.vtxColBase(session)
+				else:
+					self.vtxColSep(session, activeChannel)
+
+				# 同期でpolyColorPerVertexノードが作られている場合もあるので監視対象を更新
+				self.watchVertexColorNodes(session)
+
+			statsChannels.extend(colorBuffer.CHANNELS if activeChannel is None else [activeChannel])
+
+		# 同期したチャンネル (ベースの変更の場合は全チャンネル) の統計を更新する
+		if len(statsChannels) > 0:
+			self.updateStatsPanel(colorBuffer.uniqueList(statsChannels))
 
 
 	#==============================================================================================
-	# ベースのvertexColorのattributeChangeによるscriptJobの処理を設定
-	@openCloseChunk
-	def vtxColBase(self):
-		# RGBAすべてOFFの場合ベースのcolorSetに戻す
-		if self.uiFIle.btn_R.isChecked() == False and self.uiFIle.btn_G.isChecked() == False and\
-			self.uiFIle.btn_B.isChecked() == False and self.uiFIle.btn_A.isChecked() == False:
+	# 頂点カラーの変更を監視するノードをSyncDispatcherに登録する (sessionを指定しない場合は全メッシュ)
+	# 中間オブジェクトある場合はtmpColorSet_*_Node、ない場合はメッシュのcolorSetを監視する
+	# 変更通知はMeshSessionごとにまとめられてvtxColChangedに渡される
+	def watchVertexColorNodes(self, session=None):
+		sessions = self.sessions if session is None else [session]
 
-			self.getBaseVertexColorData()
+		with self.profiler.phase("watchVertexColorNodes"):
+			for session in sessions:
+				if session.hasIntermediateObject == True:
+					for colorNode in session.colorNodeObjects():
+						self.syncDispatcher.watch(colorNode, session)
+				else:
+					self.syncDispatcher.watchByName(session.targetObjMesh.fullPathName(), session)
 
-		if self.hasIntermediateObject == True:
-			self.jobNum_attributeChange_Base = mc.scriptJob(
-				attributeChange=["tmpColorSet_Base_Node.vertexColor", self.vtxColBase],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
 
-		else:
-			self.jobNum_attributeChange_Base = mc.scriptJob(
-				attributeChange=["%s.colorSet"%self.targetObjMesh.fullPathName(), self.vtxColBase],
-				allChildren=True,
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True,
-				runOnce=True)
+	#==============================================================================================
+	# チャンネル名から対応するボタンを返す
+	def getChannelButton(self, channel):
+		return getattr(self.uiFIle, "btn_%s"%channel)
 
 
 	#==============================================================================================
-	# colorSetの存在をチェックして、なかったら生成する
+	# ベースのvertexColorの変更通知による処理を設定
 	@openCloseChunk
-	def checkColorSet(self):
-		allColorSetList = self.targetObjMesh.getColorSetNames()
+	@profileOperation
+	def vtxColBase(self, session):
+		# RGBAすべてOFFの場合のみ
+		if session.engine.activeChannel is None:
+			self.refreshBase(session)
 
-		# tmpColorSetがすでに存在するかチェックしてなければ生成
-		if self.baseColorSerRep == "RGB" or self.baseColorSerRep == "RGBA":
-			if not "tmpColorSet_R" in allColorSetList:
-				mc.polyColorSet(create=True, colorSet="tmpColorSet_R", clamped=True, representation="RGB")
 
-			if not "tmpColorSet_G" in allColorSetList:
-				mc.polyColorSet(create=True, colorSet="tmpColorSet_G", clamped=True, representation="RGB")
+	#==============================================================================================
+	# ミラーを読み込み直して、外部で変更のあった頂点だけtmpColorSetを書き直す
+	# (頂点数が変わった場合などはNoneが返ってくるので全頂点)
+	def refreshBase(self, session):
+		dirtyIdx = session.engine.refreshBaseMirror()
+		if dirtyIdx is None or len(dirtyIdx) > 0:
+			self.getBaseVertexColorData(session, dirtyIdx=dirtyIdx)
 
-			if not "tmpColorSet_B" in allColorSetList:
-				mc.polyColorSet(create=True, colorSet="tmpColorSet_B", clamped=True, representation="RGB")
 
-		if self.baseColorSerRep == "RGBA" or self.baseColorSerRep == "A":
-			if not "tmpColorSet_A" in allColorSetList:
-				mc.polyColorSet(create=True, colorSet="tmpColorSet_A", clamped=True, representation="RGB")
+	#==============================================================================================
+	# colorSetの存在をチェックして、なかったら生成する
+	# channelsを指定しない場合はベースのcolorSetの種類に含まれる全チャンネル
+	@openCloseChunk
+	def checkColorSet(self, session, channels=None):
+		session.engine.ensureChannelColorSets(channels)
 
 
 	#==============================================================================================
 	# tmpColorSetNodeがヒストリの削除などでノードが消されてしまった場合のscriptJobを設定
-	def setDeleteNodeJobs(self):
-		if self.baseColorSerRep == "RGB" or self.baseColorSerRep == "RGBA":
-			self.jobNum_nodeDeleted_R = mc.scriptJob(
-				nodeDeleted=["tmpColorSet_R_Node", self.deletedNode_R],
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True)
-
-			self.jobNum_nodeDeleted_G = mc.scriptJob(
-				nodeDeleted=["tmpColorSet_G_Node", self.deletedNode_G],
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True)
+	def setDeleteNodeJobs(self, session):
+		for channel in session.engine.materializedChannels:
+			self.setDeleteNodeJob(session, channel)
 
-			self.jobNum_nodeDeleted_B = mc.scriptJob(
-				nodeDeleted=["tmpColorSet_B_Node", self.deletedNode_B],
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True)
+	def setDeleteNodeJob(self, session, channel):
+		tmpColorSet = session.engine.channelColorSetName(channel)
+		if session.jobNum_nodeDeleted.get(tmpColorSet, 0) > 0 or session.colorNodeExists(tmpColorSet) == False:
+			return
 
-		if self.baseColorSerRep == "RGBA" or self.baseColorSerRep == "A":
-			self.jobNum_nodeDeleted_A = mc.scriptJob(
-				nodeDeleted=["tmpColorSet_A_Node", self.deletedNode_A],
-				parent="kkDisplayVertexColorSeparatelyWindow",
-				compressUndo=True)
+		session.jobNum_nodeDeleted[tmpColorSet] = mc.scriptJob(
+			nodeDeleted=[session.colorNodeName(tmpColorSet), partial(self.deletedNode, session, channel)],
+			parent="kkDisplayVertexColorSeparatelyWindow",
+			compressUndo=True)
 
 
 	#==============================================================================================
 	# ベースのcolorSetに設定されている頂点カラーを取得して、それを元にtmpColorSetを生成する
+	@suspendSync
 	@openCloseChunk
-	def getBaseVertexColorData(self):
-		# 選択しているものが頂点じゃなくメッシュなので、component.getElements()じゃなく
-		# MFnMesh.numVerticesによって得られる頂点数からindexListを作る
-		vtxCount = self.targetObjMesh.numVertices
-		if not self.targetObjVtxCount == vtxCount:
-			self.targetObjVtxIdxList = xrange(vtxCount)
+	@profileOperation
+	def getBaseVertexColorData(self, session, channels=None, dirtyIdx=None):
+		# ベースの色を元に各チャンネルのtmpColorSetをグレースケールで書き直す
+		session.engine.split(channels, dirtyIdx, self.needsBaseColorNode(session))
+		self.updateColorNodes(session)
 
-		baseVtxColors = self.targetObjMesh.getVertexColors(self.baseColorSet)
 
-		# ベースのcolorSetの種類がRGBかRGBAの場合のみRGBの処理を行う
-		if self.baseColorSerRep == "RGB" or self.baseColorSerRep == "RGBA":
+	#==============================================================================================
+	# getBaseVertexColorDataの色の読み込みまでを行い、分割の計算を行う関数を返す (計算は別スレッドで実行できる)
+	# tmpColorSetは計算の後に生成するので、遅延生成でなければ全チャンネルを分割する
+	def prepareBaseVertexColorData(self, session):
+		includeBase = self.needsBaseColorNode(session)
+		session.engine.getBaseMirror()
+		channels, dirtyIdx = session.engine.splitTargets(
+			None if self.lazyChannelColorSet == True else session.engine.channels, None, includeBase)
+		return partial(session.engine.computeSplit, channels, dirtyIdx, includeBase)
 
-			# 一旦baseVtxColorsのMColorArrayをコピーしたリストを作っておく
-			baseVtxColors_R = baseVtxColors[:]
-			baseVtxColors_G = baseVtxColors[:]
-			baseVtxColors_B = baseVtxColors[:]
 
-			# tmpColorSet_RにbaseColorSetのRedを適用する
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_R")
-			for x in range(vtxCount):
-				baseVtxColors_R[x].r = baseVtxColors_R[x].r
-				baseVtxColors_R[x].g = baseVtxColors_R[x].r
-				baseVtxColors_R[x].b = baseVtxColors_R[x].r
-			self.targetObjMesh.setVertexColors(baseVtxColors_R, self.targetObjVtxIdxList)
+	#==============================================================================================
+	# tmpColorSet_Base_Nodeがない場合、baseColor変更感知用のpolyColorPerVertexを作るためにベースも書き直す
+	def needsBaseColorNode(self, session):
+		return session.hasIntermediateObject == True and session.colorNodeExists("Base") == False
 
 
-			# tmpColorSet_GにbaseColorSetのGreenを適用する
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_G")
-			for y in xrange(vtxCount):
-				baseVtxColors_G[y].r = baseVtxColors_G[y].g
-				baseVtxColors_G[y].g = baseVtxColors_G[y].g
-				baseVtxColors_G[y].b = baseVtxColors_G[y].g
-			self.targetObjMesh.setVertexColors(baseVtxColors_G, self.targetObjVtxIdxList)
+	#==============================================================================================
+	# 分割の書き込みで作られたpolyColorPerVertexノードの名前を変更して監視する
+	def updateColorNodes(self, session):
+		if session.hasIntermediateObject == True:
 
+			with self.profiler.phase("renameColorNodes"):
+				session.renameColorNodes()
 
-			# tmpColorSet_BにbaseColorSetのBlueを適用する
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_B")
-			for z in range(vtxCount):
-				baseVtxColors_B[z].r = baseVtxColors_B[z].b
-				baseVtxColors_B[z].g = baseVtxColors_B[z].b
-				baseVtxColors_B[z].b = baseVtxColors_B[z].b
-			self.targetObjMesh.setVertexColors(baseVtxColors_B, self.targetObjVtxIdxList)
+			# 作り直されたtmpColorSet_*_Nodeも監視する
+			self.watchVertexColorNodes(session)
 
 
-		# ベースのcolorSetの種類がRGBAかAの場合のみAlphaの処理を行う
-		if self.baseColorSerRep == "RGBA" or self.baseColorSerRep == "A":
+	#==============================================================================================
+	# メッシュごとのチャンネルファイルのパス (複数メッシュの場合は拡張子の前にオブジェクト名を付ける)
+	def channelFilePath(self, filePath, session):
+		if len(self.sessions) == 1:
+			return filePath
 
-			# 一旦baseVtxColorsのMColorArrayをコピーしたリストを作っておく
-			baseVtxColors_A = baseVtxColors[:]
+		root, ext = os.path.splitext(filePath)
+		return "%s_%s%s"%(root, session.targetObj.name(), ext)
 
-			# tmpColorSet_AにbaseColorSetのAlphaを適用する
-			self.targetObjMesh.setCurrentColorSetName("tmpColorSet_A")
-			for w in range(vtxCount):
-				baseVtxColors_A[w].r = baseVtxColors_A[w].a
-				baseVtxColors_A[w].g = baseVtxColors_A[w].a
-				baseVtxColors_A[w].b = baseVtxColors_A[w].a
-			self.targetObjMesh.setVertexColors(baseVtxColors_A, self.targetObjVtxIdxList)
 
-		# colorSetをベースに戻しておく
-		self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
+	#==============================================================================================
+	# ベースの各チャンネルをファイルに書き出す
+	def exportChannels(self):
+		filePath = QFileDialog.getSaveFileName(self, "Export Channels", "", "Channel File (*.kvc);;NumPy (*.npy)")[0]
+		if not filePath:
+			return
 
+		for session in self.sessions:
+			print("Export Channels : %s"%session.engine.exportChannels(self.channelFilePath(filePath, session)))
 
-		if self.hasIntermediateObject == True:
-			# tmpColorSet_Base_Nodeがない場合、baseColor変更感知用のpolyColorPerVertexを作っておく
-			if len(mc.ls("tmpColorSet_Base_Node", type="polyColorPerVertex")) == 0:
-				self.targetObjMesh.setCurrentColorSetName(self.baseColorSet)
-				self.targetObjMesh.setVertexColors(baseVtxColors, self.targetObjVtxIdxList)
 
+	#==============================================================================================
+	# ファイルのチャンネルをベースに書き込む (変更のあった頂点だけ書き込まれる)
+	@skipWhileBusy
+	@suspendSync
+	@openCloseChunk
+	@profileOperation
+	def importChannels(self):
+		filePath = QFileDialog.getOpenFileName(self, "Import Channels", "", "Channel File (*.kvc *.npy)")[0]
+		if not filePath:
+			return
 
-			polyColorVertexNodeList = mc.ls(type="polyColorPerVertex")
+		for session in self.sessions:
+			sessionFilePath = self.channelFilePath(filePath, session)
+			if not os.path.isfile(sessionFilePath):
+				mc.warning("Channel file not found : %s"%sessionFilePath)
+				continue
 
-			for polyColorVertexNode in polyColorVertexNodeList:
-				colorSetName = mc.getAttr("%s.colorSetName"%polyColorVertexNode)
+			vtxCount = session.engine.importChannels(sessionFilePath)
+			print("Import Channels : %s (%d vertices)"%(sessionFilePath, vtxCount))
 
-				if "tmpColorSet_R" in colorSetName:
-					mc.rename(polyColorVertexNode, "tmpColorSet_R_Node")
+		self.updateStatsPanel()
 
-				elif "tmpColorSet_G" in colorSetName:
-					mc.rename(polyColorVertexNode, "tmpColorSet_G_Node")
 
-				elif "tmpColorSet_B" in colorSetName:
-					mc.rename(polyColorVertexNode, "tmpColorSet_B_Node")
+	#==============================================================================================
+	# 直近の操作の処理時間をウィンドウに表示する
+	def updateLatencyLabel(self, record):
+		if self.latencyLabel is None:
+			return
 
-				elif "tmpColorSet_A" in colorSetName:
-					mc.rename(polyColorVertexNode, "tmpColorSet_A_Node")
+		self.latencyLabel.setText("%s %s / avg %s (%d vtx)"%(
+			record.name, formatDuration(record.duration), formatDuration(self.profiler.averageDuration()), record.vertices))
 
-				elif self.baseColorSet in colorSetName:
-					mc.rename(polyColorVertexNode, "tmpColorSet_Base_Node")
+		# フェーズごとの内訳はツールチップで確認できるようにする
+		phaseTotals = record.phaseTotals()
+		self.latencyLabel.setToolTip("\n".join("%s : %s"%(name, formatDuration(phaseTotals[name])) for name in sorted(phaseTotals)))
 
 
 	#==============================================================================================
-	# 各tmpColorSetNodeが消えてしまったら生成し直す
-	def deletedNode_R(self):
-		self.getBaseVertexColorData()
+	# profilerの記録をJSONに書き出す (chrome://tracingで開ける)
+	# filePathを指定しない場合はMayaのtempフォルダに書き出す
+	def dumpProfile(self, filePath=None):
+		if filePath is None:
+			filePath = os.path.join(mc.internalVar(userTmpDir=True), "kkDisplayVertexColorSeparately_profile.json")
 
-	def deletedNode_G(self):
-		self.getBaseVertexColorData()
+		self.profiler.dump(filePath)
+		print("kkDisplayVertexColorSeparately profile : %s"%filePath)
+		return filePath
 
-	def deletedNode_B(self):
-		self.getBaseVertexColorData()
 
-	def deletedNode_A(self):
-		self.getBaseVertexColorData()
+	#==============================================================================================
+	# 各tmpColorSetNodeが消えてしまったら生成し直す
+	def deletedNode(self, session, channel):
+		session.jobNum_nodeDeleted[session.engine.channelColorSetName(channel)] = 0
+		self.getBaseVertexColorData(session, [channel])
+		self.setDeleteNodeJob(session, channel)
 
 
 	#==============================================================================================
@@ -938,10 +1763,33 @@ class kkDisplayVertexColorSeparatelyWindow(MayaQWidgetBaseMixin, QMainWindow):
 				obj.deleteLater()
 
 
+#----------------------------------------------------------------------------------------------------------------------
+# 開いているウィンドウを返す (開いていない場合はNone)
+def findWindow():
+	for obj in getMayaWindow().children():
+		if obj.objectName() == "kkDisplayVertexColorSeparatelyWindow":
+			return obj
+	return None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 開いているウィンドウのストロークのundo/redo (ビューポートでペイント中にも使えるようにホットキーに割り当てる用)
+def undoStroke():
+	window = findWindow()
+	if not window is None:
+		window.undoStroke()
+
+def redoStroke():
+	window = findWindow()
+	if not window is None:
+		window.redoStroke()
+
+
 #----------------------------------------------------------------------------------------------------------------------
 # デフォーマがついているとコンポーネントエディタから頂点カラーを変更した際に
 # ヒストリを削除しないときちんと反映されずscriptJobが反応しないための対処
-def historyDelete(targetObj, isStart):
+# targetObjListに複数のオブジェクトを渡した場合も確認ダイアログは1回だけ表示する
+def historyDelete(targetObjList, isStart):
 	if isStart == True:
 		dialogMessage = ""
 		lang = mc.about(uiLanguage=True)
@@ -964,7 +1812,7 @@ def historyDelete(targetObj, isStart):
 			return False
 
 	# デフォーマ以外のヒストリの削除実行
-	mc.bakePartialHistory(targetObj, prePostDeformers=True)
+	mc.bakePartialHistory(targetObjList, prePostDeformers=True)
 
 	return True
 
@@ -985,15 +1833,16 @@ def main():
 		mc.warning("No Select..."),
 		return
 
-	selMeshList = mc.listRelatives(selList[0], shapes=True, type="mesh")
-	if len(selMeshList) == 0:
+	# メッシュを持つオブジェクトだけを対象にする
+	targetObjList = [obj for obj in selList if mc.listRelatives(obj, shapes=True, type="mesh")]
+	if len(targetObjList) == 0:
 		mc.warning("Mesh is not selected..."),
 		return
 
-	# 選択を１つだけに絞っておく
-	mc.select(selList[0], replace=True)
+	# 選択を対象のメッシュだけに絞っておく
+	mc.select(targetObjList, replace=True)
 
-	isHistoryDeleted = historyDelete(selList[0], True)
+	isHistoryDeleted = historyDelete(targetObjList, True)
 
 	if isHistoryDeleted == True:
 		app = QApplication.instance()
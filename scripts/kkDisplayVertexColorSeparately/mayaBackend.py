@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+
+# MFnMeshを使ってChannelEngineの頂点カラーの読み書きを行うバックエンド
+# faceVertexModeの場合はフェース頂点カラーを、フェース頂点の並び (getFaceVertexColorsの順) のまま読み書きする
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from . import colorBuffer
+from .engine import MeshColorBackend, DEFAULT_CHUNK_SIZE
+from .profiler import Profiler
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# colorBufferのバッファからsetVertexColorsに渡すMColorArrayを作る
+def toMColorArray(buf):
+	return om2.MColorArray(colorBuffer.toRows(buf))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# colorSet名を指定した頂点カラーの書き込みを溜めておき、1回の同期分をまとめて書き込む
+# setCurrentColorSetNameの切り替えは最小限にし、書き込み中はビューポートの更新を止めて最後に1回だけ再描画させる
+class ColorSetWriter(object):
+
+	def __init__(self, mfnMesh, hasHistory=False, profiler=None, faceVertexMode=False, chunkSize=DEFAULT_CHUNK_SIZE):
+		self.mesh           = mfnMesh
+		self.hasHistory     = hasHistory
+		self.profiler       = profiler or Profiler()
+		self.faceVertexMode = faceVertexMode
+
+		# MColorArrayを作る頂点数の上限 (これより多い書き込みは区切って行う。Noneの場合は区切らない)
+		self.chunkSize = chunkSize
+
+		# (colorSet名, バッファ, 頂点番号のリスト or None(全頂点)) のリスト
+		self.pendingWrites = []
+
+		# フェース頂点ごとのフェース番号と頂点番号
+		# assignColorsとsetFaceVertexColorsで使うのでトポロジーが変わるまでキャッシュしておく
+		self.faceVertexFaceIds = None
+		self.faceVertexVtxIds  = None
+
+		# デバッグ用 : 直前のflushでのsetCurrentColorSetNameの回数
+		self.lastSwitchCount = 0
+
+
+	#==============================================================================================
+	# 書き込みを溜める
+	def write(self, colorSet, buf, indices=None):
+		self.pendingWrites.append((colorSet, buf, indices))
+
+
+	#==============================================================================================
+	# 溜めた書き込みを実行し、最後にactiveColorSetを現在のcolorSetにする
+	# activeColorSetがNoneの場合はflush前の現在のcolorSetに戻す
+	def flush(self, activeColorSet=None):
+		pendingWrites = self.pendingWrites
+		self.pendingWrites = []
+		self.lastSwitchCount = 0
+
+		currentColorSet = self.mesh.currentColorSetName()
+		if activeColorSet is None:
+			activeColorSet = currentColorSet
+
+		if len(pendingWrites) == 0:
+			self.setCurrent(currentColorSet, activeColorSet)
+			return
+
+		# 現在のcolorSetへの書き込みを先に、残りはcolorSetごとにまとめて書き込む
+		# 最後に切り替えるcolorSetは最後に書き込めば戻す必要がなくなる
+		order = [currentColorSet] + [w[0] for w in pendingWrites if not w[0] in (currentColorSet, activeColorSet)] + [activeColorSet]
+
+		isSuspended = not mc.about(batch=True)
+		if isSuspended == True:
+			mc.refresh(suspend=True)
+		try:
+			for colorSet in colorBuffer.uniqueList(order):
+				writes = [w for w in pendingWrites if w[0] == colorSet]
+				if len(writes) == 0:
+					continue
+
+				for _, buf, indices in writes:
+					# 中間オブジェクトがない場合、全頂点の書き込みはcolorSet名を指定して切り替えずに行う
+					# setColorsは全頂点のMColorArrayが必要なので、chunkSizeを超える場合は区切ってsetVertexColorsで書き込む
+					if indices is None and self.hasHistory == False and self.isChunked(colorBuffer.vertexCount(buf)) == False:
+						self.setColorsByName(colorSet, buf)
+					else:
+						currentColorSet = self.setCurrent(currentColorSet, colorSet)
+
+						for start, stop in colorBuffer.chunkRanges(colorBuffer.vertexCount(buf), self.chunkSize):
+							chunkBuf     = colorBuffer.rowSlice(buf, start, stop)
+							chunkIndices = xrange(start, stop) if indices is None else indices[start:stop]
+
+							if self.faceVertexMode == True:
+								self.setFaceVertexColors(chunkBuf, chunkIndices)
+							else:
+								with self.profiler.phase("setVertexColors", len(chunkIndices)):
+									self.mesh.setVertexColors(toMColorArray(chunkBuf), chunkIndices)
+
+			self.setCurrent(currentColorSet, activeColorSet)
+
+		finally:
+			if isSuspended == True:
+				mc.refresh(suspend=False)
+
+
+	#==============================================================================================
+	# vtxCount頂点の書き込みを区切って行うか
+	def isChunked(self, vtxCount):
+		return not self.chunkSize is None and vtxCount > self.chunkSize
+
+
+	#==============================================================================================
+	# 現在のcolorSetが違う場合だけ切り替える
+	def setCurrent(self, currentColorSet, colorSet):
+		if not currentColorSet == colorSet:
+			with self.profiler.phase("setCurrentColorSetName"):
+				self.mesh.setCurrentColorSetName(colorSet)
+			self.lastSwitchCount += 1
+		return colorSet
+
+
+	#==============================================================================================
+	# フェース頂点ごとのフェース番号と頂点番号を返す
+	def getFaceVertexIds(self):
+		if self.faceVertexVtxIds is None or not len(self.faceVertexVtxIds) == self.mesh.numFaceVertices:
+			vtxCountList, vtxIdList = self.mesh.getVertices()
+			self.faceVertexFaceIds = colorBuffer.repeatIndices(vtxCountList)
+			self.faceVertexVtxIds  = list(vtxIdList)
+
+		return self.faceVertexFaceIds, self.faceVertexVtxIds
+
+
+	#==============================================================================================
+	# 全頂点の色をcolorSet名を指定して書き込む
+	# 色のindexを頂点番号と同じにしておけばsetColorsで頂点カラーとして書き込める
+	# faceVertexModeの場合は色のindexをフェース頂点の番号にして、フェース頂点ごとに別の色を割り当てる
+	def setColorsByName(self, colorSet, buf):
+		if self.faceVertexMode == True:
+			colorIds = colorBuffer.indexList(colorBuffer.allIndices(self.mesh.numFaceVertices))
+		else:
+			colorIds = self.getFaceVertexIds()[1]
+
+		with self.profiler.phase("setColors", colorBuffer.vertexCount(buf)):
+			self.mesh.setColors(toMColorArray(buf), colorSet)
+			self.mesh.assignColors(colorIds, colorSet)
+
+
+	#==============================================================================================
+	# 指定したフェース頂点の色を現在のcolorSetに書き込む (indicesはフェース頂点の番号)
+	def setFaceVertexColors(self, buf, indices):
+		faceIds, vtxIds = self.getFaceVertexIds()
+
+		with self.profiler.phase("setFaceVertexColors", len(indices)):
+			self.mesh.setFaceVertexColors(toMColorArray(buf), colorBuffer.takeItems(faceIds, indices), colorBuffer.takeItems(vtxIds, indices))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# MFnMeshの頂点カラーをChannelEngineから読み書きする
+# faceVertexModeの場合、ChannelEngineの頂点番号はフェース頂点の番号になる
+class MayaMeshBackend(MeshColorBackend):
+
+	def __init__(self, mfnMesh, hasHistory=False, profiler=None, faceVertexMode=False, chunkSize=DEFAULT_CHUNK_SIZE):
+		self.mesh           = mfnMesh
+		self.faceVertexMode = faceVertexMode
+		self.chunkSize      = chunkSize
+		self.writer         = ColorSetWriter(mfnMesh, hasHistory, profiler, faceVertexMode, chunkSize)
+		self.profiler       = self.writer.profiler
+
+
+	def vertexCount(self):
+		if self.faceVertexMode == True:
+			return self.mesh.numFaceVertices
+		return self.mesh.numVertices
+
+	def colorSetNames(self):
+		return list(self.mesh.getColorSetNames())
+
+	def createColorSet(self, colorSet, representation="RGB"):
+		mc.polyColorSet(self.mesh.fullPathName(), create=True, colorSet=colorSet, clamped=True, representation=representation)
+
+	def deleteColorSet(self, colorSet):
+		mc.polyColorSet(self.mesh.fullPathName(), delete=True, colorSet=colorSet)
+
+	def currentColorSet(self):
+		return self.mesh.currentColorSetName()
+
+
+	#==============================================================================================
+	# MColorArrayは一度だけN×4のfloatバッファに取り出す
+	# 変換はchunkSizeずつ行い、全頂点分のPythonのリストを一度に作らない
+	def readColors(self, colorSet):
+		return colorBuffer.fromColorsChunked(self.getColors(colorSet), self.chunkSize)
+
+
+	#==============================================================================================
+	# MColorArrayを一度だけ取得し、chunkSizeずつバッファに変換して返す
+	def readColorChunks(self, colorSet, chunkSize):
+		colors = self.getColors(colorSet)
+		for start, stop in colorBuffer.chunkRanges(len(colors), chunkSize):
+			yield start, colorBuffer.fromColors([colors[i] for i in xrange(start, stop)])
+
+
+	#==============================================================================================
+	# MFnMeshからは全頂点でしか取得できないので、MColorArrayから指定した頂点の色だけを取り出す
+	# (全頂点をPythonのバッファに変換しない)
+	def readColorsAt(self, colorSet, indices):
+		colors = self.getColors(colorSet)
+		return colorBuffer.fromColors([colors[i] for i in colorBuffer.indexList(indices)])
+
+
+	#==============================================================================================
+	def getColors(self, colorSet):
+		if self.faceVertexMode == True:
+			with self.profiler.phase("getFaceVertexColors"):
+				return self.mesh.getFaceVertexColors(colorSet)
+
+		with self.profiler.phase("getVertexColors"):
+			return self.mesh.getVertexColors(colorSet)
+
+
+	#==============================================================================================
+	# 現在選択されているこのメッシュのコンポーネント (頂点・エッジ・フェース・頂点フェース) の頂点番号を返す
+	# faceVertexModeの場合はフェース頂点の番号。コンポーネントが選択されていない場合はNone
+	def selectedComponentIndices(self):
+		meshPath = self.mesh.fullPathName()
+		vtxIds   = set()
+		faceIds  = set()
+		vtxFaceIds = set()
+		isSelected = False
+
+		selList = om2.MGlobal.getActiveSelectionList()
+		for i in xrange(selList.length()):
+			try:
+				dagPath, component = selList.getComponent(i)
+				dagPath.extendToShape()
+			except RuntimeError:
+				continue
+
+			if component.isNull() or not dagPath.fullPathName() == meshPath:
+				continue
+
+			isSelected = True
+			apiType = component.apiType()
+			if apiType == om2.MFn.kMeshVertComponent:
+				vtxIds.update(om2.MFnSingleIndexedComponent(component).getElements())
+
+			elif apiType == om2.MFn.kMeshEdgeComponent:
+				edgeIt = om2.MItMeshEdge(dagPath, component)
+				while not edgeIt.isDone():
+					vtxIds.update((edgeIt.vertexId(0), edgeIt.vertexId(1)))
+					edgeIt.next()
+
+			elif apiType == om2.MFn.kMeshPolygonComponent:
+				faceIds.update(om2.MFnSingleIndexedComponent(component).getElements())
+
+			elif apiType == om2.MFn.kMeshVtxFaceComponent:
+				for vtxId, faceId in om2.MFnDoubleIndexedComponent(component).getElements():
+					vtxFaceIds.add((faceId, vtxId))
+
+		if isSelected == False:
+			return None
+
+		faceVertexFaceIds, faceVertexVtxIds = self.writer.getFaceVertexIds()
+
+		# 頂点カラーの場合は、フェースと頂点フェースはその頂点にする
+		if self.faceVertexMode == False:
+			vtxIds.update(colorBuffer.takeItems(faceVertexVtxIds, colorBuffer.memberPositions(faceVertexFaceIds, list(faceIds))))
+			vtxIds.update(v for f, v in vtxFaceIds)
+			return colorBuffer.uniqueIndices(list(vtxIds))
+
+		# フェース頂点カラーの場合は、頂点とフェースに含まれるフェース頂点と、選択した頂点フェースのフェース頂点
+		positions = list(colorBuffer.memberPositions(faceVertexVtxIds, list(vtxIds)))
+		positions.extend(colorBuffer.memberPositions(faceVertexFaceIds, list(faceIds)))
+		if len(vtxFaceIds) > 0:
+			positions.extend(i for i, key in enumerate(zip(faceVertexFaceIds, faceVertexVtxIds)) if key in vtxFaceIds)
+		return colorBuffer.uniqueIndices(positions)
+
+
+	#==============================================================================================
+	def write(self, colorSet, buf, indices=None):
+		self.writer.write(colorSet, buf, indices)
+
+	def flush(self, activeColorSet=None):
+		self.writer.flush(activeColorSet)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# Maya無しでChannelEngineを動かすためのメモリ上のメッシュ
+# ベンチマークやMayaのない環境での動作確認に使う
+
+from . import colorBuffer
+from .engine import MeshColorBackend
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# colorSet名をキーにしたバッファで頂点カラーを持つだけのバックエンド
+class MemoryMeshBackend(MeshColorBackend):
+
+	def __init__(self, vertexCount, baseColors=None, baseColorSet="colorSet", representation="RGBA"):
+		self.numVertices = vertexCount
+
+		if baseColors is None:
+			baseColors = colorBuffer.filled(vertexCount)
+
+		self.colorSets       = {baseColorSet: colorBuffer.copy(baseColors)}
+		self.representations = {baseColorSet: representation}
+		self.current         = baseColorSet
+
+		self.pendingWrites = []
+
+		# 読み書きの回数 (ベンチマーク用)
+		self.readCount       = 0
+		self.writeCount      = 0
+		self.writtenVtxCount = 0
+		self.switchCount     = 0
+
+
+	def vertexCount(self):
+		return self.numVertices
+
+	def colorSetNames(self):
+		return list(self.colorSets.keys())
+
+	def createColorSet(self, colorSet, representation="RGB"):
+		self.colorSets[colorSet]       = colorBuffer.filled(self.numVertices)
+		self.representations[colorSet] = representation
+
+	def deleteColorSet(self, colorSet):
+		self.colorSets.pop(colorSet, None)
+		self.representations.pop(colorSet, None)
+
+	def currentColorSet(self):
+		return self.current
+
+
+	#==============================================================================================
+	# MFnMesh.getVertexColorsと同じく毎回新しいバッファを返す
+	def readColors(self, colorSet):
+		self.readCount += 1
+		return colorBuffer.copy(self.colorSets[colorSet])
+
+	def readColorsAt(self, colorSet, indices):
+		self.readCount += 1
+		return colorBuffer.takeRows(self.colorSets[colorSet], indices)
+
+	def readColorChunks(self, colorSet, chunkSize):
+		self.readCount += 1
+		buf = self.colorSets[colorSet]
+		for start, stop in colorBuffer.chunkRanges(self.numVertices, chunkSize):
+			yield start, colorBuffer.rowSlice(buf, start, stop)
+
+
+	#==============================================================================================
+	def write(self, colorSet, buf, indices=None):
+		self.pendingWrites.append((colorSet, buf, indices))
+
+	def flush(self, activeColorSet=None):
+		pendingWrites = self.pendingWrites
+		self.pendingWrites = []
+
+		for colorSet, buf, indices in pendingWrites:
+			self.writeCount += 1
+			if indices is None:
+				self.colorSets[colorSet] = colorBuffer.copy(buf)
+				self.writtenVtxCount += colorBuffer.vertexCount(buf)
+			else:
+				colorBuffer.putRows(self.colorSets[colorSet], indices, buf)
+				self.writtenVtxCount += len(indices)
+
+		if not activeColorSet is None and not activeColorSet == self.current:
+			self.current = activeColorSet
+			self.switchCount += 1
+
+
+	#==============================================================================================
+	# ペイントツールの代わりに、指定した頂点のRGBをvalueで塗る (書き込み回数には含めない)
+	def paint(self, colorSet, indices, value):
+		buf = self.colorSets[colorSet]
+
+		painted = colorBuffer.filled(len(indices), (value, value, value, 1.0))
+		colorBuffer.setChannel(painted, "A", colorBuffer.channelValues(colorBuffer.takeRows(buf, indices), "A"))
+		colorBuffer.putRows(buf, indices, painted)
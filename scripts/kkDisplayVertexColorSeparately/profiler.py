@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# 同期処理の各フェーズの処理時間と頂点数を記録するプロファイラ
+# 記録は直近のものだけをリングバッファに残し、chrome://tracingで開けるJSONに書き出せる
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# py2にはperf_counterがないのでtime.timeで代用する
+perfCounter = getattr(time, "perf_counter", time.time)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1回の操作 (getBaseVertexColorData、vtxColSepなど) の記録
+class OperationRecord(object):
+
+	def __init__(self, name, start):
+		self.name     = name
+		self.start    = start
+		self.duration = 0.0
+		self.vertices = 0
+
+		# (フェーズ名, 開始時間, 処理時間, 頂点数) のリスト
+		self.phases = []
+
+
+	#==============================================================================================
+	# フェーズ名ごとの合計時間
+	def phaseTotals(self):
+		totals = {}
+		for name, _, duration, _ in self.phases:
+			totals[name] = totals.get(name, 0.0) + duration
+		return totals
+
+
+	#==============================================================================================
+	def toDict(self):
+		return {
+			"name"    : self.name,
+			"start"   : self.start,
+			"duration": self.duration,
+			"vertices": self.vertices,
+			"phases"  : [{"name": n, "start": s, "duration": d, "vertices": v} for n, s, d, v in self.phases],
+		}
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# enabledがFalseの間は何も記録しない (operation、phaseはそのままyieldするだけ)
+class Profiler(object):
+
+	def __init__(self, enabled=False, capacity=512):
+		self.enabled = enabled
+		self.records = deque(maxlen=capacity)
+
+		# 記録中の操作 (入れ子になった場合は一番外側の操作にまとめる)
+		self.current = None
+		self.depth   = 0
+
+		# 操作の記録が終わるたびに呼ばれる関数 (ウィンドウの表示更新用)
+		self.listeners = []
+
+
+	#==============================================================================================
+	# 操作全体の時間を記録する
+	@contextmanager
+	def operation(self, name):
+		if self.enabled == False:
+			yield
+			return
+
+		self.depth += 1
+		if self.depth == 1:
+			self.current = OperationRecord(name, perfCounter())
+
+		try:
+			yield
+		finally:
+			self.depth -= 1
+			if self.depth == 0:
+				record = self.current
+				self.current = None
+				record.duration = perfCounter() - record.start
+				self.records.append(record)
+
+				for listener in self.listeners:
+					listener(record)
+
+
+	#==============================================================================================
+	# 操作の中のフェーズの時間を記録する (操作の外で呼ばれた場合は記録しない)
+	@contextmanager
+	def phase(self, name, vertices=0):
+		if self.enabled == False or self.current is None:
+			yield
+			return
+
+		record = self.current
+		start = perfCounter()
+		try:
+			yield
+		finally:
+			record.phases.append((name, start, perfCounter() - start, vertices))
+
+
+	#==============================================================================================
+	# 記録中の操作で扱った頂点数を加算する
+	def addVertices(self, count):
+		if self.enabled == True and not self.current is None:
+			self.current.vertices += count
+
+
+	#==============================================================================================
+	def lastRecord(self):
+		if len(self.records) == 0:
+			return None
+		return self.records[-1]
+
+
+	#==============================================================================================
+	# 直近count回の操作の平均時間 (秒)
+	def averageDuration(self, count=10):
+		records = list(self.records)[-count:]
+		if len(records) == 0:
+			return 0.0
+		return sum(r.duration for r in records) / len(records)
+
+
+	#==============================================================================================
+	def clear(self):
+		self.records.clear()
+
+
+	#==============================================================================================
+	# Chrome Trace Event Formatで書き出す (操作とフェーズを入れ子の"X"イベントにする)
+	def traceEvents(self):
+		pid = os.getpid()
+		tid = threading.current_thread().ident or 0
+
+		events = []
+		for record in self.records:
+			events.append({
+				"name": record.name, "cat": "operation", "ph": "X", "pid": pid, "tid": tid,
+				"ts": record.start * 1e6, "dur": record.duration * 1e6,
+				"args": {"vertices": record.vertices}})
+
+			for name, start, duration, vertices in record.phases:
+				events.append({
+					"name": name, "cat": "phase", "ph": "X", "pid": pid, "tid": tid,
+					"ts": start * 1e6, "dur": duration * 1e6,
+					"args": {"vertices": vertices, "operation": record.name}})
+		return events
+
+
+	#==============================================================================================
+	def dump(self, filePath):
+		data = {
+			"traceEvents"    : self.traceEvents(),
+			"displayTimeUnit": "ms",
+			"records"        : [r.toDict() for r in self.records],
+		}
+		with open(filePath, "w") as f:
+			json.dump(data, f, indent=1)
+		return filePath
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 表示用に「12.3 ms」のような文字列にする
+def formatDuration(seconds):
+	if seconds >= 1.0:
+		return "%.2f s"%seconds
+	return "%.1f ms"%(seconds * 1000.0)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# ベースのcolorSetのチェックポイントを圧縮して複数保持するストア
+# uint8 / float16で保存し、前のチェックポイントとの差分 (変更のあった頂点の行だけ) でも保存できる
+# 合計サイズがbudgetBytesを超えた場合は、最近使われていないチェックポイントから削除する
+
+from array import array
+from collections import OrderedDict
+
+from . import colorBuffer
+from .colorBuffer import np
+
+
+ENCODINGS = ("uint8", "float16", "float32")
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# colorBufferのバッファを保存用の型に変換する
+# numpyがない場合、uint8はarray('B')、float16はarray('f')のまま (圧縮しない) になる
+def encode(buf, encoding):
+	if np is not None and isinstance(buf, np.ndarray):
+		if encoding == "uint8":
+			return np.rint(np.clip(buf, 0.0, 1.0) * 255.0).astype(np.uint8)
+		elif encoding == "float16":
+			return buf.astype(np.float16)
+		return buf.astype(np.float32)
+
+	if encoding == "uint8":
+		return array(str("B"), [int(round(min(max(v, 0.0), 1.0) * 255.0)) for v in buf])
+	return array(colorBuffer.TYPECODE, buf)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# encodeしたデータをcolorBufferのバッファに戻す
+def decode(data, encoding):
+	if np is not None and isinstance(data, np.ndarray):
+		if encoding == "uint8":
+			return data.astype(np.float32) / 255.0
+		return data.astype(np.float32)
+
+	if encoding == "uint8":
+		return array(colorBuffer.TYPECODE, [v / 255.0 for v in data])
+	return array(colorBuffer.TYPECODE, data)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# encodeしたデータの指定した行だけを取り出す (型はそのまま)
+def takeEncodedRows(data, indices):
+	if np is not None and isinstance(data, np.ndarray):
+		return data[indices]
+
+	out = array(data.typecode)
+	for i in indices:
+		out.extend(data[i * 4:i * 4 + 4])
+	return out
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def copyEncoded(data):
+	if np is not None and isinstance(data, np.ndarray):
+		return data.copy()
+	return array(data.typecode, data)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def encodedBytes(data):
+	if np is not None and isinstance(data, np.ndarray):
+		return data.nbytes
+	return len(data) * data.itemsize
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1つのチェックポイント
+# parentNameがNoneの場合はdataに全頂点、それ以外はparentNameのチェックポイントから変わった行のindicesとdataを持つ
+# (差分の元のチェックポイントは同じencodingのものだけ)
+class Snapshot(object):
+
+	def __init__(self, name, vertexCount, data, parentName=None, indices=None, pinned=False, encoding="float32"):
+		self.name        = name
+		self.vertexCount = vertexCount
+		self.data        = data
+		self.parentName  = parentName
+		self.indices     = indices
+		self.pinned      = pinned
+		self.encoding    = encoding
+
+
+	#==============================================================================================
+	def nbytes(self):
+		size = encodedBytes(self.data)
+		if not self.indices is None:
+			size += len(self.indices) * 4
+		return size
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 名前を付けたチェックポイントを保持するストア
+class SnapshotStore(object):
+
+	def __init__(self, budgetBytes=64 * 1024 * 1024, encoding="float16", useDelta=True, maxDeltaRatio=0.5):
+		if not encoding in ENCODINGS:
+			raise ValueError("unknown snapshot encoding : %s"%encoding)
+
+		self.budgetBytes = budgetBytes
+		self.encoding    = encoding
+
+		# Trueの場合、直前に保存したチェックポイントとの差分で保存する
+		# 変更のあった頂点がmaxDeltaRatioを超える場合は全頂点で保存する
+		self.useDelta      = useDelta
+		self.maxDeltaRatio = maxDeltaRatio
+
+		# 使われた順 (最後が最近) に並べたチェックポイント
+		self.snapshots = OrderedDict()
+
+		# 直前に保存したチェックポイント名 (差分の元にする)
+		self.lastSavedName = None
+
+		# デバッグ用 : 容量オーバーで削除したチェックポイントの数
+		self.evictCount = 0
+
+
+	#==============================================================================================
+	def names(self):
+		return list(self.snapshots.keys())
+
+	def __contains__(self, name):
+		return name in self.snapshots
+
+	def nbytes(self):
+		return sum(s.nbytes() for s in self.snapshots.values())
+
+
+	#==============================================================================================
+	# bufをnameのチェックポイントとして保存する (同じ名前があれば置き換える)
+	# pinnedをTrueにしたチェックポイントは容量オーバーでも削除せず、元の色に正確に戻せるようにfloat32で保存する
+	# (uint8 / float16で保存するのはそれ以外のチェックポイントだけ)
+	def save(self, name, buf, pinned=False):
+		if name in self.snapshots:
+			self.remove(name)
+
+		encoding    = "float32" if pinned == True else self.encoding
+		vertexCount = colorBuffer.vertexCount(buf)
+		data = encode(buf, encoding)
+		snapshot = None
+
+		parent = self.snapshots.get(self.lastSavedName)
+		if (self.useDelta == True and not parent is None and parent.vertexCount == vertexCount
+				and parent.encoding == encoding):
+			parentData = self.loadEncoded(parent.name, touch=False)
+			indices = colorBuffer.changedRowIndices(data, parentData)
+
+			if len(indices) <= vertexCount * self.maxDeltaRatio:
+				snapshot = Snapshot(name, vertexCount, takeEncodedRows(data, indices), parent.name, indices, pinned, encoding)
+
+		if snapshot is None:
+			snapshot = Snapshot(name, vertexCount, data, pinned=pinned, encoding=encoding)
+
+		self.snapshots[name] = snapshot
+		self.lastSavedName = name
+		self.evict()
+		return snapshot
+
+
+	#==============================================================================================
+	# nameのチェックポイントをcolorBufferのバッファで返す
+	def load(self, name):
+		return decode(self.loadEncoded(name), self.snapshots[name].encoding)
+
+
+	#==============================================================================================
+	# 差分をたどって全頂点のencodeしたデータを組み立てる
+	def loadEncoded(self, name, touch=True):
+		if touch == True:
+			self.touch(name)
+
+		chain = []
+		snapshot = self.snapshots[name]
+		while not snapshot.parentName is None:
+			chain.append(snapshot)
+			snapshot = self.snapshots[snapshot.parentName]
+
+		data = copyEncoded(snapshot.data)
+		for delta in reversed(chain):
+			colorBuffer.putRows(data, delta.indices, delta.data)
+		return data
+
+
+	#==============================================================================================
+	# nameのチェックポイントに戻すために書き込む必要のある頂点と色を返す
+	# currentと保存した精度で比べて違う頂点だけを返す
+	def restoreRows(self, name, current):
+		data     = self.loadEncoded(name)
+		encoding = self.snapshots[name].encoding
+
+		if not self.snapshots[name].vertexCount == colorBuffer.vertexCount(current):
+			return None, decode(data, encoding)
+
+		indices = colorBuffer.changedRowIndices(data, encode(current, encoding))
+		return indices, decode(takeEncodedRows(data, indices), encoding)
+
+
+	#==============================================================================================
+	# チェックポイントを削除する
+	# 差分の元になっているチェックポイントを消す場合は、先にその差分を全頂点で保存し直す
+	def remove(self, name):
+		for child in list(self.snapshots.values()):
+			if child.parentName == name:
+				child.data        = self.loadEncoded(child.name, touch=False)
+				child.parentName  = None
+				child.indices     = None
+
+		del self.snapshots[name]
+		if self.lastSavedName == name:
+			self.lastSavedName = None
+
+
+	#==============================================================================================
+	def clear(self):
+		self.snapshots.clear()
+		self.lastSavedName = None
+
+
+	#==============================================================================================
+	# 最近使ったものとして並べ替える
+	def touch(self, name):
+		snapshot = self.snapshots.pop(name)
+		self.snapshots[name] = snapshot
+
+
+	#==============================================================================================
+	# budgetBytesに収まるまで、最近使われていないチェックポイントから削除する
+	def evict(self):
+		while self.nbytes() > self.budgetBytes:
+			candidates = [s.name for s in self.snapshots.values() if s.pinned == False and not s.name == self.lastSavedName]
+			if len(candidates) == 0:
+				break
+
+			self.remove(candidates[0])
+			self.evictCount += 1
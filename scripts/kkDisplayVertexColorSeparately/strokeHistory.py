@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# ペイントのストロークごとに、同期で書き戻したチャンネルの差分 (頂点番号と前後の値) を残すundo/redoの履歴
+# Mayaのundoのように全頂点の色を残さないので、長時間ペイントしても変更のあった頂点の分しか使わない
+# 同じチャンネルへの同期がcoalesceSec以内に続いた場合は、1つのストロークとしてまとめて1回で戻す
+
+import time
+
+from .colorBuffer import np
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def bufferBytes(data):
+	if data is None:
+		return 0
+	if np is not None and isinstance(data, np.ndarray):
+		return data.nbytes
+	if hasattr(data, "itemsize"):
+		return len(data) * data.itemsize
+	return len(data) * 8
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1回の同期で1つのメッシュの1チャンネルに書き戻した差分
+# targetは書き戻し先 (ChannelEngine)、indicesがNoneの場合は全頂点
+class StrokeSegment(object):
+
+	def __init__(self, target, channel, indices, oldValues, newValues):
+		self.target    = target
+		self.channel   = channel
+		self.indices   = indices
+		self.oldValues = oldValues
+		self.newValues = newValues
+
+	@property
+	def nbytes(self):
+		return bufferBytes(self.indices) + bufferBytes(self.oldValues) + bufferBytes(self.newValues)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1回のundoで戻すストローク (連続した同期のStrokeSegmentの並び)
+class Stroke(object):
+
+	def __init__(self, channel, now):
+		self.channel  = channel
+		self.segments = []
+		self.lastTime = now
+		self.nbytes   = 0
+
+	def append(self, segment, now):
+		self.segments.append(segment)
+		self.lastTime = now
+		self.nbytes  += segment.nbytes
+
+	# targetへの差分を取り除き、変わった場合はTrueを返す
+	def discard(self, target):
+		segments = [s for s in self.segments if not s.target is target]
+		if len(segments) == len(self.segments):
+			return False
+
+		self.segments = segments
+		self.nbytes   = sum(s.nbytes for s in segments)
+		return True
+
+
+#----------------------------------------------------------------------------------------------------------------------
+class StrokeHistory(object):
+
+	def __init__(self, budgetBytes=64 * 1024 * 1024, coalesceSec=0.5, clock=time.time):
+		# 合計サイズの上限 (超えた場合は古いストロークから捨てる)
+		self.budgetBytes = budgetBytes
+
+		# 同じチャンネルへの同期がこの秒数以内に続いた場合は同じストロークにまとめる
+		self.coalesceSec = coalesceSec
+		self.clock       = clock
+
+		self.undoStack = []
+		self.redoStack = []
+
+		# 次のrecordを直前のストロークにまとめてよいか (undo/redoやcloseStrokeの後はまとめない)
+		self.isStrokeOpen = False
+
+
+	#==============================================================================================
+	# 同期で書き戻した差分を記録する (新しい記録があるとredoはできなくなる)
+	def record(self, target, channel, indices, oldValues, newValues, now=None):
+		if now is None:
+			now = self.clock()
+
+		stroke = self.undoStack[-1] if len(self.undoStack) > 0 else None
+		if (stroke is None or self.isStrokeOpen == False or not stroke.channel == channel
+				or now - stroke.lastTime > self.coalesceSec):
+			stroke = Stroke(channel, now)
+			self.undoStack.append(stroke)
+
+		stroke.append(StrokeSegment(target, channel, indices, oldValues, newValues), now)
+		self.isStrokeOpen = True
+		self.redoStack = []
+		self.evict()
+
+
+	#==============================================================================================
+	# 次のrecordを新しいストロークにする
+	def closeStroke(self):
+		self.isStrokeOpen = False
+
+
+	#==============================================================================================
+	def canUndo(self):
+		return len(self.undoStack) > 0
+
+	def canRedo(self):
+		return len(self.redoStack) > 0
+
+
+	#==============================================================================================
+	# 直前のストロークを戻すための (target, channel, indices, values) のリストを返す (記録と逆の順)
+	def undo(self):
+		if self.canUndo() == False:
+			return None
+
+		stroke = self.undoStack.pop()
+		self.redoStack.append(stroke)
+		self.isStrokeOpen = False
+		return [(s.target, s.channel, s.indices, s.oldValues) for s in reversed(stroke.segments)]
+
+
+	#==============================================================================================
+	# 戻したストロークをやり直すための (target, channel, indices, values) のリストを返す (記録した順)
+	def redo(self):
+		if self.canRedo() == False:
+			return None
+
+		stroke = self.redoStack.pop()
+		self.undoStack.append(stroke)
+		self.isStrokeOpen = False
+		return [(s.target, s.channel, s.indices, s.newValues) for s in stroke.segments]
+
+
+	#==============================================================================================
+	# 記録をすべて削除する
+	def clear(self):
+		self.undoStack = []
+		self.redoStack = []
+		self.isStrokeOpen = False
+
+
+	#==============================================================================================
+	# targetへの差分だけを削除する (ほかのメッシュのストロークは残し、空になったストロークは捨てる)
+	def discard(self, target):
+		lastStroke = self.undoStack[-1] if len(self.undoStack) > 0 else None
+		lastChanged = False
+
+		for stack in (self.undoStack, self.redoStack):
+			for stroke in stack:
+				if stroke.discard(target) == True and stroke is lastStroke:
+					lastChanged = True
+			stack[:] = [stroke for stroke in stack if len(stroke.segments) > 0]
+
+		if lastChanged == True:
+			self.isStrokeOpen = False
+
+
+	#==============================================================================================
+	def nbytes(self):
+		return sum(s.nbytes for s in self.undoStack) + sum(s.nbytes for s in self.redoStack)
+
+
+	#==============================================================================================
+	# 合計サイズがbudgetBytesを超えている間、古いストロークから捨てる (直前のストロークは残す)
+	def evict(self):
+		total = self.nbytes()
+		while total > self.budgetBytes and len(self.undoStack) > 1:
+			total -= self.undoStack.pop(0).nbytes
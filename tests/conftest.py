@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+# Maya無しで実行できるモジュール (ChannelEngineとMemoryMeshBackendなど) のテスト
+# すべてのテストをnumpyあり (ndarray) となし (array('f')) の両方で実行する
+#
+# リポジトリのルートで以下のように実行する
+#   python -m pytest -q tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from kkDisplayVertexColorSeparately import colorBuffer
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 読み込み済みのkkDisplayVertexColorSeparately以下のモジュールのうち、npを持っているもの
+def numpyModules():
+	for name, module in list(sys.modules.items()):
+		if module is None or not name.startswith("kkDisplayVertexColorSeparately."):
+			continue
+		if hasattr(module, "np"):
+			yield module
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# "numpy"の場合はそのまま、"array"の場合は各モジュールのnpをNoneにしてarray('f')で動かす
+@pytest.fixture(autouse=True, params=["numpy", "array"])
+def bufferType(request, monkeypatch):
+	if request.param == "numpy":
+		if colorBuffer.np is None:
+			pytest.skip("numpy is not installed")
+	else:
+		for module in numpyModules():
+			monkeypatch.setattr(module, "np", None)
+
+	return request.param
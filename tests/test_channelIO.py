@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+import pytest
+
+from kkDisplayVertexColorSeparately import channelIO, colorBuffer
+from kkDisplayVertexColorSeparately.engine import ChannelEngine
+from kkDisplayVertexColorSeparately.memoryBackend import MemoryMeshBackend
+
+
+VERTEX_COUNT = 12
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def colors(count=VERTEX_COUNT):
+	return colorBuffer.fromColors([(i / 12.0, 1.0 - i / 12.0, 0.5, 1.5 - i / 8.0) for i in range(count)])
+
+def makeEngine(buf, representation="RGBA"):
+	backend = MemoryMeshBackend(colorBuffer.vertexCount(buf), buf, "colorSet", representation)
+	engine  = ChannelEngine(backend, "colorSet", representation)
+	engine.ensureChannelColorSets()
+	engine.split()
+	return backend, engine
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 書き出したファイルを読み込むと、representationのチャンネルだけがfloat32のまま戻る
+@pytest.mark.parametrize("representation", ["RGBA", "RGB", "A"])
+def test_kvcRoundTrip(tmpdir, representation):
+	buf = colors()
+	filePath = channelIO.exportChannels(str(tmpdir.join("channels.kvc")), buf, representation)
+
+	channelFile = channelIO.importChannels(filePath)
+
+	assert channelFile.representation == representation
+	assert channelFile.vertexCount == VERTEX_COUNT
+	assert channelFile.channels == colorBuffer.channelsOfRepresentation(representation)
+	for channel in channelFile.channels:
+		assert list(channelFile.planes[channel]) == list(colorBuffer.channelValues(buf, channel))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+@pytest.mark.parametrize("representation", ["RGBA", "RGB", "A"])
+def test_npyRoundTrip(tmpdir, bufferType, representation):
+	if bufferType == "array":
+		pytest.skip(".npy needs numpy")
+
+	buf = colors()
+	channelFile = channelIO.importChannels(channelIO.exportChannels(str(tmpdir.join("channels.npy")), buf, representation))
+
+	assert channelFile.representation == representation
+	assert channelFile.vertexCount == VERTEX_COUNT
+	for channel in channelFile.channels:
+		assert list(channelFile.planes[channel]) == list(colorBuffer.channelValues(buf, channel))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_npyNeedsNumpy(tmpdir, bufferType):
+	if bufferType == "numpy":
+		pytest.skip("numpy is available")
+
+	with pytest.raises(RuntimeError):
+		channelIO.exportChannels(str(tmpdir.join("channels.npy")), colors(), "RGBA")
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_importRejectsOtherFiles(tmpdir):
+	filePath = tmpdir.join("other.kvc")
+	filePath.write_binary(b"NOPE" + b"\0" * 60)
+
+	with pytest.raises(ValueError):
+		channelIO.importChannels(str(filePath))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 別のメッシュに読み込むと、値の違う頂点だけがベースとtmpColorSetに書き込まれる
+def test_engineImportWritesChangedVertices(tmpdir):
+	source = colors()
+	filePath = str(tmpdir.join("channels.kvc"))
+	makeEngine(source)[1].exportChannels(filePath)
+
+	target = colorBuffer.copy(source)
+	colorBuffer.putRows(target, [4, 9], colorBuffer.filled(2, (0.0, 0.0, 0.0, 0.0)))
+	backend, engine = makeEngine(target)
+
+	assert engine.importChannels(filePath) == 2
+	assert list(colorBuffer.channelValues(backend.colorSets["colorSet"], "A")) == list(colorBuffer.channelValues(source, "A"))
+	assert list(colorBuffer.channelValues(backend.colorSets[engine.channelColorSetName("R")], "R")) == \
+		list(colorBuffer.channelValues(source, "R"))
+
+	# チャンネルを指定した場合はそのチャンネルだけ
+	colorBuffer.putRows(backend.colorSets["colorSet"], [0], colorBuffer.filled(1, (0.0, 0.0, 0.0, 0.0)))
+	engine.baseChanged()
+	assert engine.importChannels(filePath, ["A"]) == 1
+	assert colorBuffer.toRows(backend.colorSets["colorSet"])[0] == pytest.approx([0.0, 0.0, 0.0, 1.5])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_engineImportRejectsVertexCountMismatch(tmpdir):
+	filePath = str(tmpdir.join("channels.kvc"))
+	channelIO.exportChannels(filePath, colors(), "RGBA")
+	backend, engine = makeEngine(colors(VERTEX_COUNT + 1))
+
+	with pytest.raises(ValueError):
+		engine.importChannels(filePath)
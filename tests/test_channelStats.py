@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+import random
+
+import pytest
+
+from kkDisplayVertexColorSeparately import colorBuffer
+from kkDisplayVertexColorSeparately.channelStats import ChannelStats, merged
+from kkDisplayVertexColorSeparately.engine import ChannelEngine
+from kkDisplayVertexColorSeparately.memoryBackend import MemoryMeshBackend
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def randomValues(rand, count):
+	return colorBuffer.channelValues(colorBuffer.fromColors([(rand.choice([0.0, 1.0, rand.random()]), 0.0, 0.0, 1.0)
+		for _ in range(count)]), "R")
+
+def assertSameStats(stats, expected, values):
+	assert stats.count == expected.count
+	assert stats.total == pytest.approx(expected.total, abs=1e-4)
+	assert stats.zeroCount == expected.zeroCount
+	assert stats.oneCount == expected.oneCount
+	assert stats.histogram == expected.histogram
+	assert stats.range(values) == pytest.approx(expected.range(values))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 変更のあった頂点の前後の値だけで更新した統計が、全頂点から計算し直したものと一致する
+def test_incrementalUpdateMatchesFullRecompute():
+	rand   = random.Random(1)
+	values = colorBuffer.copy(randomValues(rand, 200))
+	stats  = ChannelStats(values)
+
+	for _ in range(30):
+		indices   = sorted(rand.sample(range(200), rand.randint(1, 20)))
+		newValues = randomValues(rand, len(indices))
+		stats.update(colorBuffer.takeValues(values, indices), newValues)
+		colorBuffer.putValues(values, indices, newValues)
+
+		assertSameStats(stats, ChannelStats(values), values)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 最小・最大の頂点が変わった場合は、rangeを呼んだときに求め直す
+def test_rangeRecomputedWhenExtremeChanges():
+	values = colorBuffer.channelValues(colorBuffer.fromColors([(v, 0.0, 0.0, 1.0) for v in (0.1, 0.5, 0.9)]), "R")
+	values = colorBuffer.copy(values)
+	stats  = ChannelStats(values)
+
+	stats.update(colorBuffer.takeValues(values, [2]), colorBuffer.takeValues(values, [1]))
+	colorBuffer.putValues(values, [2], colorBuffer.takeValues(values, [1]))
+
+	assert stats.isRangeDirty == True
+	assert stats.range(values) == pytest.approx((0.1, 0.5))
+	assert stats.isConstant == False
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_mergedCombinesMeshes():
+	a = ChannelStats(colorBuffer.channelValues(colorBuffer.filled(3, (0.0, 0.0, 0.0, 1.0)), "R"))
+	b = ChannelStats(colorBuffer.channelValues(colorBuffer.filled(2, (1.0, 0.0, 0.0, 1.0)), "R"))
+
+	result = merged([a, b, ChannelStats()])
+
+	assert result.count == 5
+	assert result.zeroCount == 3
+	assert result.oneCount == 2
+	assert (result.minimum, result.maximum) == (0.0, 1.0)
+	assert result.mean == pytest.approx(0.4)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ChannelEngineの同期で更新した統計が、同期後の値から計算し直したものと一致する
+@pytest.mark.parametrize("chunkSize", [None, 7])
+def test_engineStatsFollowSync(chunkSize):
+	rand    = random.Random(2)
+	backend = MemoryMeshBackend(50, colorBuffer.fromColors([(rand.random(), 0.5, 0.5, 1.0) for _ in range(50)]), "colorSet", "RGBA")
+	engine  = ChannelEngine(backend, "colorSet", "RGBA", chunkSize=chunkSize)
+	engine.ensureChannelColorSets()
+	engine.split()
+	engine.getChannelStats("R")
+
+	for value in (0.0, 1.0, 0.3):
+		backend.paint(engine.channelColorSetName("R"), sorted(rand.sample(range(50), 10)), value)
+		engine.syncChannel("R")
+
+		values = engine.syncedChannelValues["R"]
+		assertSameStats(engine.getChannelStats("R"), ChannelStats(values), values)
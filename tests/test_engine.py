@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+import pytest
+
+from kkDisplayVertexColorSeparately import colorBuffer
+from kkDisplayVertexColorSeparately.engine import ChannelEngine
+from kkDisplayVertexColorSeparately.memoryBackend import MemoryMeshBackend
+
+
+VERTEX_COUNT = 10
+BASE_COLOR_SET = "colorSet"
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def baseColors(count=VERTEX_COUNT):
+	return colorBuffer.fromColors([(i / 20.0, 0.5 + i / 40.0, 0.25, 1.0 - i / 20.0) for i in range(count)])
+
+def makeEngine(count=VERTEX_COUNT, chunkSize=None, **kargs):
+	backend = MemoryMeshBackend(count, baseColors(count), BASE_COLOR_SET, "RGBA")
+	engine  = ChannelEngine(backend, BASE_COLOR_SET, "RGBA", chunkSize=chunkSize, **kargs)
+	engine.saveBeforeEdit()
+	engine.ensureChannelColorSets()
+	engine.split()
+	return backend, engine
+
+def rows(buf):
+	return [list(row) for row in colorBuffer.toRows(buf)]
+
+def flat(rowList):
+	return [v for row in rowList for v in row]
+
+def channel(buf, name):
+	return list(colorBuffer.channelValues(buf, name))
+
+def greyValues(backend, engine, name):
+	tmpRows = rows(backend.colorSets[engine.channelColorSetName(name)])
+	assert all(r == g == b for r, g, b, _ in tmpRows)
+	return [r for r, _, _, _ in tmpRows]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 分割すると各チャンネルのtmpColorSetにそのチャンネルの値がグレースケールで書き込まれる
+@pytest.mark.parametrize("chunkSize", [None, 3])
+def test_splitWritesGreyscaleChannels(chunkSize):
+	backend, engine = makeEngine(chunkSize=chunkSize)
+	base = backend.colorSets[BASE_COLOR_SET]
+
+	for name in colorBuffer.CHANNELS:
+		assert greyValues(backend, engine, name) == pytest.approx(channel(base, name))
+		assert list(engine.syncedChannelValues[name]) == pytest.approx(channel(base, name))
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ペイントした頂点だけがベースの該当チャンネルに書き戻される
+@pytest.mark.parametrize("chunkSize", [None, 3])
+def test_syncWritesPaintedVerticesOnly(chunkSize):
+	backend, engine = makeEngine(chunkSize=chunkSize)
+	expected = rows(backend.colorSets[BASE_COLOR_SET])
+
+	backend.paint(engine.channelColorSetName("G"), [1, 7], 0.125)
+	assert engine.syncChannel("G") == 2
+
+	expected[1][1] = expected[7][1] = 0.125
+	assert flat(rows(backend.colorSets[BASE_COLOR_SET])) == pytest.approx(flat(expected))
+	assert flat(rows(engine.baseMirror)) == pytest.approx(flat(expected))
+
+	# 変更がなければ何も書き戻さない
+	assert engine.syncChannel("G") == 0
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_mergeChannelReplacesChannelAndTmpColorSet():
+	backend, engine = makeEngine(chunkSize=4)
+	values = colorBuffer.channelValues(colorBuffer.filled(VERTEX_COUNT, (0.0, 0.0, 0.0, 0.75)), "A")
+
+	engine.mergeChannel("A", values)
+
+	assert channel(backend.colorSets[BASE_COLOR_SET], "A") == pytest.approx([0.75] * VERTEX_COUNT)
+	assert channel(backend.colorSets[BASE_COLOR_SET], "R") == pytest.approx([i / 20.0 for i in range(VERTEX_COUNT)])
+	assert greyValues(backend, engine, "A") == pytest.approx([0.75] * VERTEX_COUNT)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# revertは編集前と違う頂点だけを書き込み、tmpColorSetも元に戻す
+def test_revertRestoresBeforeEdit():
+	backend, engine = makeEngine()
+	original = rows(backend.colorSets[BASE_COLOR_SET])
+
+	backend.paint(engine.channelColorSetName("R"), [2, 3, 4], 0.9)
+	engine.syncChannel("R")
+	assert not flat(rows(backend.colorSets[BASE_COLOR_SET])) == pytest.approx(flat(original))
+
+	assert engine.revert() == 3
+	assert flat(rows(backend.colorSets[BASE_COLOR_SET])) == pytest.approx(flat(original))
+	assert greyValues(backend, engine, "R") == pytest.approx([row[0] for row in original])
+	assert engine.revert() == 0
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 作業対象の頂点がある場合、revertはその頂点だけを戻す
+def test_revertOnlyWorkingIndices():
+	backend, engine = makeEngine()
+	original = rows(backend.colorSets[BASE_COLOR_SET])
+
+	backend.paint(engine.channelColorSetName("R"), [2, 5], 0.9)
+	engine.syncChannel("R")
+	engine.setWorkingIndices([5, 6])
+
+	assert engine.revert() == 1
+	base = rows(backend.colorSets[BASE_COLOR_SET])
+	assert base[5] == pytest.approx(original[5])
+	assert base[2][0] == pytest.approx(0.9)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 外部でベースが変わった場合、変わった頂点だけtmpColorSetを書き直す
+@pytest.mark.parametrize("chunkSize", [None, 3])
+def test_baseChangedResplitsChangedVertices(chunkSize):
+	backend, engine = makeEngine(chunkSize=chunkSize)
+
+	backend.paint(BASE_COLOR_SET, [4, 8], 0.6)
+	dirtyIdx = engine.baseChanged()
+
+	assert sorted(colorBuffer.indexList(dirtyIdx)) == [4, 8]
+	assert flat(rows(engine.baseMirror)) == pytest.approx(flat(rows(backend.colorSets[BASE_COLOR_SET])))
+	for name in ("R", "G", "B"):
+		values = greyValues(backend, engine, name)
+		assert values[4] == pytest.approx(0.6)
+		assert values[8] == pytest.approx(0.6)
+
+	assert len(engine.baseChanged()) == 0
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 作業対象の頂点だけミラーを読み込み直した後でも、作業対象を外したときに外側の変更が反映される
+def test_workingIndicesChangeRefreshesWholeMirror():
+	backend, engine = makeEngine()
+	engine.setWorkingIndices([0, 1])
+
+	backend.paint(BASE_COLOR_SET, [5], 0.7)
+	assert len(engine.baseChanged()) == 0
+
+	assert colorBuffer.indexList(engine.setWorkingIndices(None)) == [5]
+	assert greyValues(backend, engine, "R")[5] == pytest.approx(0.7)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# チャンネル操作は変わった頂点だけを書き込み、作業対象の頂点がある場合はその頂点だけにかける
+@pytest.mark.parametrize("chunkSize", [None, 4])
+def test_applyChannelOp(chunkSize):
+	backend, engine = makeEngine(chunkSize=chunkSize)
+	before = channel(backend.colorSets[BASE_COLOR_SET], "B")
+
+	assert engine.applyChannelOp("B", "invert") == VERTEX_COUNT
+	assert channel(backend.colorSets[BASE_COLOR_SET], "B") == pytest.approx([1.0 - v for v in before])
+	assert greyValues(backend, engine, "B") == pytest.approx([1.0 - v for v in before])
+
+	engine.setWorkingIndices([3])
+	assert engine.applyChannelOp("R", "fill", 1.0) == 1
+	assert channel(backend.colorSets[BASE_COLOR_SET], "R")[2:5] == pytest.approx([0.1, 1.0, 0.2])
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_swapChannels():
+	backend, engine = makeEngine()
+	base = backend.colorSets[BASE_COLOR_SET]
+	r, g = channel(base, "R"), channel(base, "G")
+
+	engine.swapChannels("R", "G")
+
+	assert channel(backend.colorSets[BASE_COLOR_SET], "R") == pytest.approx(g)
+	assert channel(backend.colorSets[BASE_COLOR_SET], "G") == pytest.approx(r)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# numpyなしのパラメータでは本当にarray('f')で動いているか
+def test_bufferTypeFollowsNumpyParam(bufferType):
+	backend, engine = makeEngine()
+	assert colorBuffer.isNdarray(engine.baseMirror) == (bufferType == "numpy")
+	assert colorBuffer.isNdarray(engine.syncedChannelValues["R"]) == (bufferType == "numpy")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+import pytest
+
+from kkDisplayVertexColorSeparately import colorBuffer
+from kkDisplayVertexColorSeparately.snapshotStore import SnapshotStore
+
+
+VERTEX_COUNT = 20
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def colors(value=0.5, count=VERTEX_COUNT):
+	return colorBuffer.fromColors([(value, i / 40.0, 0.25, 1.0) for i in range(count)])
+
+def flat(buf):
+	return [v for row in colorBuffer.toRows(buf) for v in row]
+
+def changedColors(buf, indices, value):
+	buf = colorBuffer.copy(buf)
+	colorBuffer.putRows(buf, indices, colorBuffer.filled(len(indices), (value, value, value, 1.0)))
+	return buf
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 直前のチェックポイントからの変更が少なければ、変わった行だけを差分として保存する
+def test_saveStoresDeltaAgainstPreviousSnapshot():
+	store = SnapshotStore(encoding="float16")
+	first  = colors()
+	second = changedColors(first, [3, 11], 0.75)
+
+	store.save("first", first)
+	snapshot = store.save("second", second)
+
+	assert snapshot.parentName == "first"
+	assert colorBuffer.indexList(snapshot.indices) == [3, 11]
+	assert flat(store.load("second")) == pytest.approx(flat(second), abs=1e-3)
+	assert flat(store.load("first")) == pytest.approx(flat(first), abs=1e-3)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 変更がmaxDeltaRatioを超える場合は全頂点で保存する
+def test_saveStoresFullSnapshotWhenMostRowsChanged():
+	store = SnapshotStore(encoding="float16", maxDeltaRatio=0.5)
+	store.save("first", colors())
+	snapshot = store.save("second", changedColors(colors(), range(15), 0.75))
+
+	assert snapshot.parentName is None
+	assert snapshot.indices is None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 差分の元のチェックポイントを削除しても、差分側は全頂点で保存し直されて読み込める
+def test_removeParentKeepsDeltaLoadable():
+	store = SnapshotStore(encoding="uint8")
+	second = changedColors(colors(), [0], 1.0)
+	store.save("first", colors())
+	store.save("second", second)
+
+	store.remove("first")
+
+	assert store.snapshots["second"].parentName is None
+	assert flat(store.load("second")) == pytest.approx(flat(second), abs=1.0 / 255)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 容量を超えたら最近使われていないものから削除し、pinnedと直前に保存したものは残す
+def test_evictDropsLeastRecentlyUsed():
+	store = SnapshotStore(encoding="float32", useDelta=False)
+	store.save("pinned", colors(0.1), pinned=True)
+	store.save("a", colors(0.2))
+	store.save("b", colors(0.3))
+	store.load("a")
+
+	store.budgetBytes = store.nbytes() - 1
+	store.save("c", colors(0.4))
+
+	assert store.names() == ["pinned", "c"]
+	assert store.evictCount == 2
+
+	store.budgetBytes = 0
+	store.evict()
+	assert store.names() == ["pinned", "c"]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# pinnedのチェックポイントはストアの型に関係なくfloat32で保存され、0～1の範囲外の値も正確に戻る
+def test_pinnedSnapshotKeepsFloat32():
+	store = SnapshotStore(encoding="uint8")
+	hdr = colorBuffer.fromColors([(1.7, -0.2, 0.123456, 1.0)] * 4)
+
+	snapshot = store.save("before", hdr, pinned=True)
+	assert snapshot.encoding == "float32"
+	assert flat(store.load("before")) == flat(hdr)
+
+	# 違う型のチェックポイントは差分の元にしない
+	assert store.save("after", hdr).parentName is None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# restoreRowsは現在の色と違う頂点だけを返す
+def test_restoreRowsReturnsChangedRowsOnly():
+	store = SnapshotStore(encoding="float16")
+	saved = colors()
+	store.save("saved", saved)
+
+	indices, rows = store.restoreRows("saved", changedColors(saved, [2, 9], 0.9))
+
+	assert colorBuffer.indexList(indices) == [2, 9]
+	assert flat(rows) == pytest.approx(flat(colorBuffer.takeRows(saved, [2, 9])), abs=1e-3)
+
+	# 頂点数が違う場合は全頂点
+	indices, rows = store.restoreRows("saved", colors(count=VERTEX_COUNT + 1))
+	assert indices is None
+	assert colorBuffer.vertexCount(rows) == VERTEX_COUNT
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def test_unknownEncodingRaises():
+	with pytest.raises(ValueError):
+		SnapshotStore(encoding="int16")
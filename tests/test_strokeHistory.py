@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals, division
+
+import pytest
+
+from kkDisplayVertexColorSeparately import colorBuffer
+from kkDisplayVertexColorSeparately.engine import ChannelEngine
+from kkDisplayVertexColorSeparately.memoryBackend import MemoryMeshBackend
+from kkDisplayVertexColorSeparately.strokeHistory import StrokeHistory
+
+
+#----------------------------------------------------------------------------------------------------------------------
+def values(*items):
+	return colorBuffer.channelValues(colorBuffer.fromColors([(v, 0.0, 0.0, 1.0) for v in items]), "R")
+
+def record(history, channel, indices, now, old=0.0, new=1.0):
+	history.record("target", channel, indices, values(*[old] * len(indices)), values(*[new] * len(indices)), now=now)
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# coalesceSec以内に続いた同じチャンネルの記録は1つのストロークにまとめ、undoは記録と逆の順で返す
+def test_recordsWithinCoalesceSecFormOneStroke():
+	history = StrokeHistory(coalesceSec=0.5)
+	record(history, "R", [0], now=0.0)
+	record(history, "R", [1], now=0.3)
+	record(history, "R", [2], now=0.7)
+
+	assert len(history.undoStack) == 1
+	assert [indices for _, _, indices, _ in history.undo()] == [[2], [1], [0]]
+	assert history.canUndo() == False
+	assert [indices for _, _, indices, _ in history.redo()] == [[0], [1], [2]]
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 時間が空いた場合、チャンネルが変わった場合、closeStrokeの後は新しいストロークになる
+def test_strokeBoundaries():
+	history = StrokeHistory(coalesceSec=0.5)
+	record(history, "R", [0], now=0.0)
+	record(history, "R", [1], now=1.0)
+	record(history, "G", [2], now=1.1)
+	history.closeStroke()
+	record(history, "G", [3], now=1.2)
+
+	assert len(history.undoStack) == 4
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# undoの後に新しい記録があるとredoはできなくなり、undoの後の記録は戻したストロークにまとめない
+def test_recordAfterUndoClearsRedo():
+	history = StrokeHistory(coalesceSec=0.5)
+	record(history, "R", [0], now=0.0)
+	record(history, "R", [1], now=0.1)
+	history.undo()
+	record(history, "R", [2], now=0.2)
+
+	assert history.canRedo() == False
+	assert len(history.undoStack) == 1
+	assert [indices for _, _, indices, _ in history.undo()] == [[2]]
+	assert history.undo() is None
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 合計サイズがbudgetBytesを超えたら古いストロークから捨てる (直前のストロークは残す)
+def test_evictKeepsNewestStroke():
+	history = StrokeHistory(coalesceSec=0.0)
+	record(history, "R", list(range(10)), now=0.0)
+	strokeBytes = history.nbytes()
+	assert strokeBytes > 0
+
+	history.budgetBytes = strokeBytes * 2
+	record(history, "R", list(range(10)), now=1.0)
+	record(history, "R", list(range(10)), now=2.0)
+	assert len(history.undoStack) == 2
+
+	history.budgetBytes = 0
+	record(history, "R", list(range(10)), now=3.0)
+	assert len(history.undoStack) == 1
+	assert history.nbytes() == strokeBytes
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# ChannelEngineの同期を記録し、undo/redoでベースとtmpColorSetを戻す
+def test_engineStrokeUndoRedo():
+	clock = [0.0]
+	history = StrokeHistory(coalesceSec=0.5, clock=lambda: clock[0])
+	backend = MemoryMeshBackend(6, colorBuffer.filled(6, (0.2, 0.4, 0.6, 1.0)), "colorSet", "RGBA")
+	engine  = ChannelEngine(backend, "colorSet", "RGBA", strokeHistory=history)
+	engine.ensureChannelColorSets()
+	engine.split()
+	tmpColorSet = engine.channelColorSetName("R")
+
+	backend.paint(tmpColorSet, [1, 2], 0.9)
+	engine.syncChannel("R")
+	clock[0] = 0.2
+	backend.paint(tmpColorSet, [2, 3], 0.5)
+	engine.syncChannel("R")
+	painted = list(colorBuffer.channelValues(backend.colorSets["colorSet"], "R"))
+	assert painted == pytest.approx([0.2, 0.9, 0.5, 0.5, 0.2, 0.2])
+
+	for target, channel, indices, stroke in history.undo():
+		target.applyStrokeValues(channel, indices, stroke)
+	assert list(colorBuffer.channelValues(backend.colorSets["colorSet"], "R")) == pytest.approx([0.2] * 6)
+	assert list(colorBuffer.channelValues(backend.colorSets[tmpColorSet], "G")) == pytest.approx([0.2] * 6)
+
+	for target, channel, indices, stroke in history.redo():
+		target.applyStrokeValues(channel, indices, stroke)
+	assert list(colorBuffer.channelValues(backend.colorSets["colorSet"], "R")) == pytest.approx(painted)
+
+	# ストローク以外でベースが変わったら記録を捨てる
+	engine.applyChannelOp("R", "invert")
+	assert history.canUndo() == False
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 複数のメッシュで共有している場合、discardは指定したメッシュの差分だけを削除し、空になったストロークを捨てる
+def test_discardKeepsOtherTargets():
+	history = StrokeHistory(coalesceSec=0.5)
+	history.record("a", "R", [0], values(0.0), values(1.0), now=0.0)
+	history.record("b", "R", [1], values(0.0), values(1.0), now=0.1)
+	history.record("a", "G", [2], values(0.0), values(1.0), now=0.2)
+	history.record("b", "B", [3], values(0.0), values(1.0), now=0.3)
+	history.undo()
+	segmentBytes = history.nbytes() // 4
+
+	history.discard("b")
+
+	assert len(history.undoStack) == 2
+	assert history.canRedo() == False
+	assert [target for target, _, _, _ in history.undo()] == ["a"]
+	assert [target for target, _, _, _ in history.undo()] == ["a"]
+	assert history.nbytes() == segmentBytes * 2
+
+	# 直前のストロークが変わった場合は、次の記録をまとめない
+	history.redo()
+	history.redo()
+	history.record("b", "G", [4], values(0.0), values(1.0), now=0.25)
+	history.discard("b")
+	history.record("a", "G", [5], values(0.0), values(1.0), now=0.3)
+	assert len(history.undoStack) == 3
+
+
+#----------------------------------------------------------------------------------------------------------------------
+# 1つのメッシュでチャンネル操作をしても、ほかのメッシュのストロークは戻せる
+def test_engineDiscardKeepsOtherMeshStrokes():
+	history = StrokeHistory(coalesceSec=0.5, clock=lambda: 0.0)
+	backends, engines = [], []
+	for _ in range(2):
+		backend = MemoryMeshBackend(4, colorBuffer.filled(4, (0.2, 0.4, 0.6, 1.0)), "colorSet", "RGBA")
+		engine  = ChannelEngine(backend, "colorSet", "RGBA", strokeHistory=history)
+		engine.ensureChannelColorSets()
+		engine.split()
+		backends.append(backend)
+		engines.append(engine)
+
+	for backend, engine in zip(backends, engines):
+		backend.paint(engine.channelColorSetName("R"), [1], 0.9)
+		engine.syncChannel("R")
+
+	engines[0].applyChannelOp("G", "invert")
+
+	for target, channel, indices, stroke in history.undo():
+		assert target is engines[1]
+		target.applyStrokeValues(channel, indices, stroke)
+	assert list(colorBuffer.channelValues(backends[1].colorSets["colorSet"], "R")) == pytest.approx([0.2] * 4)
+	assert list(colorBuffer.channelValues(backends[0].colorSets["colorSet"], "R"))[1] == pytest.approx(0.9)